@@ -0,0 +1,297 @@
+import os
+import io
+import sys
+import json
+import time
+import tarfile
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from ProcessBasic import *
+import FreewayVD
+from FreewayTDCS import read_tdcs
+
+# 以固定亂數種子產生的模擬資料測量各處理階段的速度與記憶體，不需要網路，可用於比較修改前後是否變慢
+
+CODEFOLDER = os.path.dirname(os.path.abspath(__file__))
+VEHICLETYPES = [31, 32, 41, 42, 5]
+
+# 1. 模擬資料
+
+def make_vd_ids(nvd):
+    """產生 nvd 個 VDID，格式同 VD-N1-N-12.345-M-LOOP"""
+    roads = ['N1', 'N3', 'N5']
+    return [f"VD-{roads[i % 3]}-{'NS'[i // 3 % 2]}-{i * 0.5:.3f}-M-LOOP" for i in range(nvd)]
+
+def make_vdlive_xml(vdids, updatetime, seed=0):
+    """
+    產生一份 VDLive XML (結構同高公局 VDLive.xml)。
+
+    Args:
+        vdids (list): VDID 清單。
+        updatetime (datetime): 資料時間。
+        seed (int): 亂數種子，相同參數產生相同內容。
+
+    Returns:
+        bytes: XML 內容。
+    """
+    rng = np.random.default_rng(seed)
+    stamp = updatetime.strftime('%Y-%m-%dT%H:%M:%S+08:00')
+    parts = ['<?xml version="1.0" encoding="utf-8"?><VDLiveList xmlns="http://traffic.transportdata.tw/standard/traffic/schema/">',
+             f'<UpdateTime>{stamp}</UpdateTime><UpdateInterval>60</UpdateInterval><AuthorityCode>NFB</AuthorityCode><VDLives>']
+    for vdid in vdids:
+        parts.append(f'<VDLive><VDID>{vdid}</VDID><LinkFlows><LinkFlow><LinkID>{rng.integers(10**14):015d}</LinkID><Lanes>')
+        for lane in range(int(rng.integers(2, 5))):
+            parts.append(f'<Lane><LaneID>{lane}</LaneID><LaneType>1</LaneType><Speed>{rng.integers(0, 120)}</Speed>'
+                         f'<Occupancy>{rng.integers(0, 40)}</Occupancy><Vehicles>')
+            for vehicletype, volume, speed in zip('SLT', rng.integers(-5, 30, 3), rng.integers(0, 120, 3)):
+                parts.append(f'<Vehicle><VehicleType>{vehicletype}</VehicleType><Volume>{volume if volume >= 0 else -99}</Volume>'
+                             f'<Speed>{speed}</Speed></Vehicle>')
+            parts.append('</Vehicles></Lane>')
+        status = 0 if rng.random() > 0.02 else 1
+        parts.append(f'</Lanes></LinkFlow></LinkFlows><Status>{status}</Status><DataCollectTime>{stamp}</DataCollectTime></VDLive>')
+    parts.append('</VDLives></VDLiveList>')
+    return ''.join(parts).encode('utf-8')
+
+def make_gantry_ids(ngantry):
+    """產生 ngantry 個門架 (南北向成對)，格式同 01F0017N"""
+    return [f"01F{i // 2 * 10:04d}{'NS'[i % 2]}" for i in range(ngantry)]
+
+def make_tdcs_csv(datatype, gantries, timestamp, rng, trips=0):
+    """
+    產生一個 TDCS csv 分檔 (沒有標題列) 的內容。M03A/M05A 為 5 分鐘一檔，M06A 為 1 小時一檔 (trips 筆旅次)。
+
+    Returns:
+        bytes: csv 內容。
+    """
+    stamp = timestamp.strftime('%Y-%m-%d %H:%M:%S')
+    northbound = [gantry for gantry in gantries if gantry.endswith('N')]
+    if datatype == 'M03A':
+        index = pd.MultiIndex.from_product([gantries, VEHICLETYPES], names=['GantryID', 'VehicleType']).to_frame(index=False)
+        df = pd.DataFrame({'TimeStamp': stamp, 'GantryID': index['GantryID'], 'Direction': index['GantryID'].str[-1],
+                           'VehicleType': index['VehicleType'], 'Volume': rng.integers(0, 80, len(index))})
+    elif datatype == 'M05A':
+        pairs = list(zip(northbound[:-1], northbound[1:]))
+        index = pd.MultiIndex.from_product([range(len(pairs)), VEHICLETYPES], names=['pair', 'VehicleType']).to_frame(index=False)
+        df = pd.DataFrame({'TimeStamp': stamp, 'GantryFrom': [pairs[i][0] for i in index['pair']], 'GantryTo': [pairs[i][1] for i in index['pair']],
+                           'VehicleType': index['VehicleType'], 'Speed': rng.integers(40, 110, len(index)), 'Volume': rng.integers(0, 80, len(index))})
+    elif datatype == 'M06A':
+        rows = []
+        for _ in range(trips):
+            start = int(rng.integers(0, len(northbound)))
+            length = int(rng.integers(1, 8))
+            current = timestamp + timedelta(seconds=int(rng.integers(0, 3600)))
+            path = []
+            for gantry in northbound[start:start + length]:
+                path.append((current, gantry))
+                current += timedelta(seconds=int(rng.integers(60, 600)))  # 旅次可能跨到下一個小時
+            rows.append((int(rng.choice(VEHICLETYPES)), path[0][0].strftime('%Y-%m-%d %H:%M:%S'), path[0][1],
+                         path[-1][0].strftime('%Y-%m-%d %H:%M:%S'), path[-1][1], round(len(path) * 1.0, 1), 'Y',
+                         '; '.join(f"{t:%Y-%m-%d %H:%M:%S}+{gantry}" for t, gantry in path)))
+        df = pd.DataFrame(rows)
+    else:
+        raise ValueError(f"未知的資料類型：{datatype}")
+    return df.to_csv(header=False, index=False).encode('utf-8')
+
+def make_tdcs_archive(folder, datatype, date, gantries, trips=0, seed=0):
+    """
+    產生一日的 TDCS 壓縮檔 {datatype}_{date}.tar.gz，成員路徑同高公局 (M03A/20250619/00/TDCS_M03A_20250619_000000.csv)。
+
+    Returns:
+        str: 壓縮檔路徑。
+    """
+    rng = np.random.default_rng(seed)
+    day = datetime.strptime(date, '%Y%m%d')
+    step = timedelta(hours=1) if datatype == 'M06A' else timedelta(minutes=5)
+    tarpath = os.path.join(folder, f"{datatype}_{date}.tar.gz")
+    with tarfile.open(tarpath, 'w:gz') as tar:
+        timestamp = day
+        while timestamp < day + timedelta(days=1):
+            data = make_tdcs_csv(datatype, gantries, timestamp, rng, trips=trips)
+            info = tarfile.TarInfo(f"{datatype}/{date}/{timestamp:%H}/TDCS_{datatype}_{date}_{timestamp:%H%M%S}.csv")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+            timestamp += step
+    return tarpath
+
+def make_ramp_table(gantries, nramp):
+    """產生匝道規則表：經過北向門架 i、沒有經過前一個北向門架"""
+    northbound = [gantry for gantry in gantries if gantry.endswith('N')]
+    rules = [(f"R{i:03d}", '北' if i % 2 else '南', northbound[i + 1], northbound[i]) for i in range(min(nramp, len(northbound) - 1))]
+    return pd.DataFrame(rules, columns=['Ramp', 'Direction', 'PassGantryID', 'UnpassGantryID'])
+
+def load_notebook(path):
+    """執行 notebook 的程式碼儲存格 (不執行 main)，回傳其中定義的函數與變數"""
+    with open(path, encoding='utf-8') as f:
+        cells = json.load(f)['cells']
+    namespace = {'__name__': 'notebook'}
+    for cell in cells:
+        if cell['cell_type'] == 'code':
+            exec(compile(''.join(cell['source']), path, 'exec'), namespace)
+    return namespace
+
+# 2. 測量
+
+def measure(name, setup, func, memory=True, rows=None):
+    """
+    測量單一階段：setup() 準備輸入 (不計時)，func(輸入) 為受測的處理。
+    計時的同時取樣常駐記憶體的增加量 (rss_mb)；memory=True 時另以 tracemalloc 再執行一次取得 Python 配置的峰值 (peak_mb)，
+    tracemalloc 會拖慢速度，因此不與計時同一次。
+
+    Args:
+        rows (callable, optional): rows(輸入, 結果) 回傳處理的資料列數，預設為輸入的長度。
+
+    Returns:
+        tuple: (結果紀錄 dict, func 的回傳值)
+    """
+    data = setup()
+    with RSSSampler() as sampler:
+        start = time.perf_counter()
+        result = func(data)
+        seconds = time.perf_counter() - start
+    count = rows(data, result) if rows else len(data)
+    record = {'stage': name, 'rows': count, 'seconds': round(seconds, 4),
+              'rows_per_second': round(count / seconds) if count and seconds > 0 else None,
+              'rss_mb': sampler.increase_mb, 'peak_mb': None}
+
+    if memory:
+        data = setup()
+        tracemalloc.start()
+        try:
+            func(data)
+            record['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        finally:
+            tracemalloc.stop()
+    print(f"{name:<24} rows={count} {record['seconds']:.3f}s rss=+{record['rss_mb']} MB peak={record['peak_mb']} MB")
+    return record, result
+
+def run_benchmarks(vds=300, gantries=100, days=1, vdlive_files=12, trips=2000, ramps=20, memory=True, seed=0, workfolder=None):
+    """
+    產生模擬資料並依序測量各階段。
+
+    Args:
+        vds (int): VD 數量。
+        gantries (int): 門架數量 (南北向合計)。
+        days (int): 天數。
+        vdlive_files (int): 每天的 VDLive 檔案數 (實際為每分鐘一檔)。
+        trips (int): M06A 每小時的旅次數。
+        ramps (int): 匝道規則數。
+        memory (bool): 是否測量記憶體峰值。
+        seed (int): 亂數種子。
+        workfolder (str, optional): 模擬壓縮檔與 Excel 的存放位置，預設為暫存資料夾 (結束後刪除)。
+
+    Returns:
+        pd.DataFrame: 每個階段一列 (stage、rows、seconds、rows_per_second、rss_mb、peak_mb)。
+    """
+    if workfolder is None:
+        with tempfile.TemporaryDirectory() as folder:
+            return run_benchmarks(vds, gantries, days, vdlive_files, trips, ramps, memory, seed, folder)
+
+    notebook = load_notebook(os.path.join(CODEFOLDER, '01_高速公路路段通過量下載.ipynb'))
+    dates = [(datetime(2025, 6, 19) + timedelta(days=i)).strftime('%Y%m%d') for i in range(days)]
+    records = []
+
+    # VDLive
+    vdids = make_vd_ids(vds)
+    xmls = [make_vdlive_xml(vdids, datetime.strptime(date, '%Y%m%d') + timedelta(minutes=i * 1440 // vdlive_files), seed=seed + n)
+            for n, (date, i) in enumerate((date, i) for date in dates for i in range(vdlive_files))]
+
+    def parse(contents):
+        return concat_categorical([FreewayVD.parse_vdlive_xml(io.BytesIO(content)) for content in contents])
+    record, vdlive = measure('parse_vdlive_xml', lambda: xmls, parse, memory, rows=lambda data, result: len(result))
+    records.append(record)
+
+    vdlive = FreewayVD.vdlive_preliminary_process(vdlive)
+    record, volume = measure('VD_volume', vdlive.copy, FreewayVD.VD_volume, memory)
+    records.append(record)
+    FreewayVD.logfile = os.path.join(workfolder, 'benchmark_log.txt')  # calculate_peak_hour 的進度訊息寫入 log，不干擾報告
+    record, _ = measure('calculate_peak_hour', volume.copy, FreewayVD.calculate_peak_hour, memory)
+    FreewayVD.logfile = None
+    records.append(record)
+
+    # TDCS
+    gantryids = make_gantry_ids(gantries)
+    archives = {datatype: [make_tdcs_archive(workfolder, datatype, date, gantryids, trips=trips, seed=seed + n) for n, date in enumerate(dates)]
+                for datatype in ['M03A', 'M05A', 'M06A']}
+    frames = {}
+    for datatype, paths in archives.items():
+        record, frames[datatype] = measure(f'read_tdcs({datatype})', lambda paths=paths: paths, lambda paths, datatype=datatype: read_tdcs(paths, datatype),
+                                          memory, rows=lambda data, result: len(result))
+        records.append(record)
+
+    record, thi = measure('THI_M03A', frames['M03A'].copy, notebook['THI_M03A'], memory)
+    records.append(record)
+
+    ramp = make_ramp_table(gantryids, ramps)
+    def thi_m06a(df):
+        return notebook['THI_M06A_step3'](notebook['THI_M06A_step2'](notebook['THI_M06A_step1'](df), ramp))
+    record, _ = measure('THI_M06A', frames['M06A'].copy, thi_m06a, memory)
+    records.append(record)
+    record, _ = measure('THI_M06A(stream)', lambda: archives['M06A'], lambda paths: notebook['THI_M06A_step3'](notebook['count_ramp_trips_by_shard'](paths, ramp)),
+                        memory, rows=lambda data, result: len(frames['M06A']))
+    records.append(record)
+
+    # Excel
+    excelpath = os.path.join(workfolder, 'benchmark.xlsx')
+    record, _ = measure('to_excel_formatted', thi.copy, lambda df: to_excel_formatted(df, excelpath), memory)
+    records.append(record)
+    record, _ = measure('find_data_extent', lambda: excelpath, find_data_extent, memory, rows=lambda data, result: len(thi))
+    records.append(record)
+
+    return pd.DataFrame(records)
+
+def compare_with_baseline(report, baseline, tolerance=0.2):
+    """
+    與先前的報告比較，回傳耗時超過基準 (1 + tolerance) 倍的階段。
+
+    Args:
+        report (pd.DataFrame): run_benchmarks 的結果。
+        baseline (pd.DataFrame): 基準報告 (相同規模參數下產生)。
+        tolerance (float): 容許變慢的比例。
+
+    Returns:
+        pd.DataFrame: 變慢的階段，欄位含 seconds、baseline_seconds 與 ratio。
+    """
+    merged = report.merge(baseline[['stage', 'seconds']].rename(columns={'seconds': 'baseline_seconds'}), on='stage')
+    merged['ratio'] = (merged['seconds'] / merged['baseline_seconds']).round(3)
+    return merged[merged['ratio'] > 1 + tolerance].reset_index(drop=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='以模擬資料測量 VDLive / TDCS / Excel 各處理階段的速度與記憶體')
+    parser.add_argument('--vds', type=int, default=300, help='VD 數量')
+    parser.add_argument('--gantries', type=int, default=100, help='門架數量')
+    parser.add_argument('--days', type=int, default=1, help='天數')
+    parser.add_argument('--vdlive-files', type=int, default=12, help='每天的 VDLive 檔案數')
+    parser.add_argument('--trips', type=int, default=2000, help='M06A 每小時的旅次數')
+    parser.add_argument('--ramps', type=int, default=20, help='匝道規則數')
+    parser.add_argument('--seed', type=int, default=0, help='亂數種子')
+    parser.add_argument('--no-memory', action='store_true', help='不測量記憶體峰值 (執行時間減半)')
+    parser.add_argument('--output', help='報告輸出路徑 (.json)')
+    parser.add_argument('--baseline', help='基準報告 (.json)，有階段變慢超過 --tolerance 時以代碼 1 結束')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='容許變慢的比例')
+    args = parser.parse_args()
+
+    config = {key: value for key, value in vars(args).items() if key not in ('output', 'baseline', 'tolerance')}
+    report = run_benchmarks(vds=args.vds, gantries=args.gantries, days=args.days, vdlive_files=args.vdlive_files,
+                            trips=args.trips, ramps=args.ramps, memory=not args.no_memory, seed=args.seed)
+    print(report.to_string(index=False))
+
+    if args.output:
+        write_atomic(args.output, json.dumps({'config': config, 'stages': report.to_dict(orient='records')}, ensure_ascii=False, indent=1).encode('utf-8'))
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('config') != config:
+            print(f"WARN: 基準報告的規模參數不同：{baseline.get('config')}")
+        slower = compare_with_baseline(report, pd.DataFrame(baseline['stages']), tolerance=args.tolerance)
+        if len(slower):
+            print(f"ERROR: 以下階段比基準慢超過 {args.tolerance:.0%}：")
+            print(slower[['stage', 'seconds', 'baseline_seconds', 'ratio']].to_string(index=False))
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
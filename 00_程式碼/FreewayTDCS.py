@@ -0,0 +1,246 @@
+import os
+import re
+import tarfile
+import numpy as np
+import pandas as pd
+from ProcessBasic import *
+
+# 各資料類型 csv (沒有標題列) 的欄位名稱
+TDCS_COLUMNS = {
+    'M03A': ['TimeStamp', 'GantryID', 'Direction', 'VehicleType', 'Volume'],
+    'M04A': ['TimeStamp', 'GantryFrom', 'GantryTo', 'VehicleType', 'TravelTime', 'Volume'],
+    'M05A': ['TimeStamp', 'GantryFrom', 'GantryTo', 'VehicleType', 'Speed', 'Volume'],
+    'M06A': ['VehicleType', 'DetectionTimeO', 'GantryO', 'DetectionTimeD', 'GantryD', 'TripLength', 'TripEnd', 'TripInformation'],
+    'M07A': ['TimeStamp', 'GantryO', 'VehicleType', 'AverageTripLength', 'Volume'],
+    'M08A': ['TimeStamp', 'GantryO', 'GantryD', 'VehicleType', 'Trips']
+}
+
+# 固定欄位型別：車種 int8、門架代碼與方向 category、數量 int32
+TDCS_DTYPES = {
+    'M03A': {'TimeStamp': 'str', 'GantryID': 'category', 'Direction': 'category', 'VehicleType': 'int8', 'Volume': 'int32'},
+    'M04A': {'TimeStamp': 'str', 'GantryFrom': 'category', 'GantryTo': 'category', 'VehicleType': 'int8', 'TravelTime': 'int32', 'Volume': 'int32'},
+    'M05A': {'TimeStamp': 'str', 'GantryFrom': 'category', 'GantryTo': 'category', 'VehicleType': 'int8', 'Speed': 'int16', 'Volume': 'int32'},
+    'M06A': {'VehicleType': 'int8', 'DetectionTimeO': 'str', 'GantryO': 'category', 'DetectionTimeD': 'str', 'GantryD': 'category',
+             'TripLength': 'float32', 'TripEnd': 'category', 'TripInformation': 'str'},
+    'M07A': {'TimeStamp': 'str', 'GantryO': 'category', 'VehicleType': 'int8', 'AverageTripLength': 'float32', 'Volume': 'int32'},
+    'M08A': {'TimeStamp': 'str', 'GantryO': 'category', 'GantryD': 'category', 'VehicleType': 'int8', 'Trips': 'int32'}
+}
+
+# 依門架過濾時比對的欄位
+TDCS_GANTRY_COLUMNS = {
+    'M03A': ['GantryID'],
+    'M04A': ['GantryFrom', 'GantryTo'],
+    'M05A': ['GantryFrom', 'GantryTo'],
+    'M06A': ['GantryO', 'GantryD'],
+    'M07A': ['GantryO'],
+    'M08A': ['GantryO', 'GantryD']
+}
+
+def tdcs_columns(datatype):
+    """回傳資料類型的欄位名稱，未知的類型拋出 ValueError"""
+    columns = TDCS_COLUMNS.get(datatype)
+    if columns is None:
+        raise ValueError(f"未知的資料類型：{datatype}")
+    return columns
+
+def read_tdcs_csv(source, datatype, gantries=None):
+    """
+    讀取單一 TDCS csv (沒有標題列)，以固定的欄位型別讀取，並可只保留指定門架的資料。
+
+    Args:
+        source (str or file): csv 路徑，或壓縮檔成員等可讀取的檔案物件。
+        datatype (str): 資料類型 (M03A, M05A, M06A, M08A...)。
+        gantries (list, optional): 只保留門架欄位 (見 TDCS_GANTRY_COLUMNS) 任一個在清單中的資料。
+
+    Returns:
+        pandas.DataFrame
+    """
+    columns = tdcs_columns(datatype)
+    dtypes = TDCS_DTYPES[datatype]
+    try:
+        df = pd.read_csv(source, header=None, names=columns, dtype=dtypes)
+    except ValueError:
+        # 數值欄位有空值時無法直接讀成整數，改讀取後再轉換 (有空值的整數欄位改用可為空值的整數型別)
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        textcols = {column: dtype for column, dtype in dtypes.items() if dtype in ('str', 'category')}
+        df = apply_schema(pd.read_csv(source, header=None, names=columns, dtype=textcols), dtypes)
+
+    if gantries is not None:
+        gantries = set(gantries)
+        mask = df[TDCS_GANTRY_COLUMNS[datatype]].apply(lambda column: column.isin(gantries)).any(axis=1)
+        df = df[mask].reset_index(drop=True)
+        for column in TDCS_GANTRY_COLUMNS[datatype]:
+            df[column] = df[column].cat.remove_unused_categories()
+    return df
+
+def iter_tdcs_frames(source, datatype, gantries=None):
+    """
+    依序逐檔讀取 TDCS 資料，每次只有一個檔案的資料在記憶體中。
+
+    Args:
+        source (str or list): 資料夾 (讀取其下所有 csv)、.tar.gz 壓縮檔 (直接讀取壓縮檔中的 csv，不解壓到磁碟)、
+                              csv 路徑，或以上路徑組成的清單。
+        datatype (str): 資料類型。
+        gantries (list, optional): 只保留指定門架的資料。
+
+    Yields:
+        pandas.DataFrame: 每個 csv 的資料。
+    """
+    if isinstance(source, (list, tuple)):
+        for path in source:
+            yield from iter_tdcs_frames(path, datatype, gantries)
+    elif os.path.isdir(source):
+        for path in sorted(findfiles(source, filetype='.csv')):
+            yield read_tdcs_csv(path, datatype, gantries)
+    elif source.endswith(('.tar.gz', '.tgz')):
+        with tarfile.open(source, 'r:gz') as tar:
+            for member in tar:  # 依壓縮檔中的順序串流讀取
+                if member.isfile() and member.name.endswith('.csv'):
+                    with tar.extractfile(member) as f:
+                        yield read_tdcs_csv(f, datatype, gantries)
+    else:
+        yield read_tdcs_csv(source, datatype, gantries)
+
+def concat_tdcs_frames(frames, datatype):
+    """合併多個 TDCS DataFrame，類別欄位合併類別後仍維持 category (pd.concat 遇到不同類別會轉成 object)"""
+    columns = tdcs_columns(datatype)
+    frames = [df for df in frames if len(df)]
+    if not frames:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in TDCS_DTYPES[datatype].items()})
+    return concat_categorical([df[columns] for df in frames])
+
+def read_tdcs(source, datatype, gantries=None):
+    """
+    讀取並合併 TDCS 資料 (參數見 iter_tdcs_frames)，車種為 int8、門架代碼為 category、數量為 int32。
+
+    Returns:
+        pandas.DataFrame: 合併後的資料，欄位順序同 TDCS_COLUMNS。
+    """
+    return concat_tdcs_frames(list(iter_tdcs_frames(source, datatype, gantries)), datatype)
+
+def explode_trips(df):
+    """
+    把 M06A 每一筆旅次的 TripInformation 拆成逐門架的通過紀錄，每個旅次只拆一次，不再把整條路徑合併回每一列。
+
+    Args:
+        df (pandas.DataFrame): M06A 資料 (需有 VehicleType 與 TripInformation)。
+
+    Returns:
+        pandas.DataFrame: 欄位為 index (旅次在原資料的 index)、VehicleType、DetectionDate (datetime64，時間為 00:00)、
+                          DetectionHour、GantryID (category)。
+    """
+    df = df.reset_index()
+    trips = pd.Series(df['TripInformation'].str.split('; ').to_numpy(), index=np.arange(len(df)))
+    passages = trips.explode().dropna()
+    position = passages.index.to_numpy()  # 每一筆通過紀錄所屬旅次在 df 的位置
+
+    parts = passages.str.split('+', n=1, expand=True).reindex(columns=[0, 1])
+    detectiontime = pd.to_datetime(parts[0].to_numpy())
+    return pd.DataFrame({
+        'index': df['index'].to_numpy()[position],
+        'VehicleType': df['VehicleType'].to_numpy()[position],
+        'DetectionDate': detectiontime.normalize(),
+        'DetectionHour': detectiontime.hour.astype('int8'),
+        'GantryID': pd.Categorical(parts[1].to_numpy())
+    })
+
+RAMP_COLUMNS = ['Ramp', 'Direction', 'PassGantryID', 'UnpassGantryID']
+RAMP_COUNT_KEYS = ['rule', 'DetectionDate', 'DetectionHour', 'VehicleType']
+
+def _ramp_table(ramp):
+    """取匝道表的前四欄並統一欄位名稱"""
+    return ramp.iloc[:, :4].set_axis(RAMP_COLUMNS, axis=1).reset_index(drop=True)
+
+def _ramp_rule_counts(passages, ramp):
+    """依規則編號 (ramp 的列位置) 計算各日期、時段、車種的旅次數，ramp 需先經 _ramp_table 整理"""
+    gantries = passages['GantryID'].astype('category')
+    categories = gantries.cat.categories
+    gantrycode = gantries.cat.codes.to_numpy().astype('int64')
+    tripcode = pd.factorize(passages['index'])[0].astype('int64')
+    ngantry = max(len(categories), 1)
+
+    # 旅次經過的門架：(旅次, 門架) 編碼成單一整數後排序
+    visited = np.unique(tripcode * ngantry + gantrycode)
+
+    # 倒排索引：依門架排序，每個門架的通過紀錄是連續的一段
+    order = np.argsort(gantrycode, kind='stable')
+    sortedcode = gantrycode[order]
+    passcode = categories.get_indexer(ramp['PassGantryID'])
+    unpasscode = categories.get_indexer(ramp['UnpassGantryID'])
+    starts = np.searchsorted(sortedcode, passcode, side='left')
+    lengths = np.where(passcode >= 0, np.searchsorted(sortedcode, passcode, side='right') - starts, 0)
+
+    # 展開每條規則的候選紀錄
+    rule = np.repeat(np.arange(len(ramp)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    rows = order[np.repeat(starts, lengths) + offsets]
+
+    # 排除有經過 UnpassGantryID 的旅次
+    unpass = unpasscode[rule]
+    key = tripcode[rows] * ngantry + unpass
+    found = np.searchsorted(visited, key)
+    passedunpass = (unpass >= 0) & (visited[np.minimum(found, max(len(visited) - 1, 0))] == key)
+    rule, rows = rule[~passedunpass], rows[~passedunpass]
+
+    matched = passages.iloc[rows][['DetectionDate', 'DetectionHour', 'VehicleType', 'index']].assign(rule=rule)
+    return matched.groupby(RAMP_COUNT_KEYS)['index'].nunique().reset_index(name='Count')
+
+def _ramp_summary(counts, ramp):
+    """把規則編號換回匝道資訊，日期轉回 date"""
+    summary = counts.join(ramp, on='rule').drop(columns='rule')
+    if pd.api.types.is_datetime64_any_dtype(summary['DetectionDate']):
+        summary['DetectionDate'] = summary['DetectionDate'].dt.date
+    return summary
+
+def count_ramp_trips(passages, ramp):
+    """
+    一次計算所有匝道規則：有經過 PassGantryID 但沒有經過 UnpassGantryID 的旅次，
+    以通過 PassGantryID 的時段計算各車種的旅次數。
+
+    門架→通過紀錄的倒排索引 (依門架排序後的區段) 取出每條規則的候選紀錄，
+    (旅次, 門架) 編碼後的排序陣列判斷旅次是否經過 UnpassGantryID，不需逐條規則掃描全部資料。
+
+    Args:
+        passages (pandas.DataFrame): explode_trips 的結果。
+        ramp (pandas.DataFrame): 前四欄依序為 Ramp、Direction、PassGantryID、UnpassGantryID。
+
+    Returns:
+        pandas.DataFrame: 欄位為 DetectionDate、DetectionHour、VehicleType、Count、Ramp、Direction、PassGantryID、UnpassGantryID，
+                          依規則的順序排列。
+    """
+    ramp = _ramp_table(ramp)
+    return _ramp_summary(_ramp_rule_counts(passages, ramp), ramp)
+
+def count_ramp_trips_by_shard(source, ramp):
+    """
+    逐一處理 M06A 的每小時檔案，每個檔案各自拆解旅次並計算匝道規則，最後只合併各規則的小型彙總，
+    不需要把整日資料同時放在記憶體中。結果同 count_ramp_trips(explode_trips(整日資料), ramp)。
+
+    每個旅次只會出現在一個小時檔中，旅次數以通過 PassGantryID 的日期與時段計算，
+    跨小時 (或跨日) 的旅次在各檔案的彙總中已落在正確的時段，合併時相同鍵值相加即可。
+    只有 TripInformation 包含任一 PassGantryID 的旅次才會被拆解。
+
+    Args:
+        source (str or list): M06A 資料來源，同 iter_tdcs_frames (資料夾、.tar.gz 或 csv 清單)。
+        ramp (pandas.DataFrame): 同 count_ramp_trips。
+
+    Returns:
+        pandas.DataFrame: 同 count_ramp_trips。
+    """
+    ramp = _ramp_table(ramp)
+    passids = ramp['PassGantryID'].dropna().astype(str).unique()
+    pattern = '|'.join(re.escape(gantry) for gantry in passids)
+
+    counts = []
+    for df in iter_tdcs_frames(source, 'M06A'):
+        if pattern:
+            df = df[df['TripInformation'].str.contains(pattern, na=False)]
+        else:
+            df = df.iloc[:0]
+        counts.append(_ramp_rule_counts(explode_trips(df), ramp))
+
+    if not counts:
+        counts = [pd.DataFrame(columns=RAMP_COUNT_KEYS + ['Count'])]
+    counts = pd.concat(counts, ignore_index=True).groupby(RAMP_COUNT_KEYS)['Count'].sum().reset_index()
+    return _ramp_summary(counts, ramp)
@@ -8,9 +8,23 @@ import shutil
 import tarfile
 import xml.etree.ElementTree as ET
 import re
+import io
 import gzip
+import json
+import hashlib
+import time
+import threading
+import argparse
+from urllib.parse import urlparse
+from itertools import repeat
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from ProcessBasic import * 
 
+try:
+    from lxml import etree as lxml_etree  # 有安裝 lxml 時使用較快的解析器
+except ImportError:
+    lxml_etree = None
+
 # logfile = os.path.join(os.getcwd(), 'VD_logfile.txt')
 logfile = None  # 預設為 None，在 main() 裡設定
 
@@ -135,60 +149,220 @@ def get_text(element, tag, namespace):
     found = element.find(tag, namespace)
     return found.text if found is not None else None
 
-def parse_vdlive_xml(xml_path):
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
+VDLIVE_NAMESPACE = '{http://traffic.transportdata.tw/standard/traffic/schema/}'
+VDLIVE_COLUMNS = [
+    "UpdateTime", "UpdateInterval", "AuthorityCode", "VDID", "LinkID", 
+    "LaneID", "LaneType", "Speed", "Occupancy", "VehicleType", "Volume", 
+    "SpeedAvg", "Status", "DataCollectTime"
+]
+# VDLive 的時間 (原始資料為 ISO 8601 字串，例如 2025-06-19T00:00:00+08:00) 解析後的型別
+VDLIVE_TIMEZONE = 'Asia/Taipei'
+VDLIVE_TIME = f'datetime64[ns, {VDLIVE_TIMEZONE}]'
+# VDLive 每一列在記憶體中的型別：重複的字串 (VDID、車道種類、車種等) 與整份檔案共用的欄位
+# (UpdateTime、AuthorityCode，每個檔案只有一個值) 以 category 儲存，每列只佔 1~2 byte 的代碼；
+# 更新週期、車道、流量、狀態用小整數，速度、佔有率用 float32 (原始資料的 -99 等代碼仍保留)
+VDLIVE_DTYPES = {
+    'UpdateTime': 'category', 'UpdateInterval': 'int16', 'AuthorityCode': 'category', 'VDID': 'category', 'LinkID': 'category',
+    'LaneID': 'int8', 'LaneType': 'category', 'Speed': 'float32', 'Occupancy': 'float32', 'VehicleType': 'category',
+    'Volume': 'int16', 'SpeedAvg': 'float32', 'Status': 'int8', 'DataCollectTime': VDLIVE_TIME
+}
+
+def iter_vdlive_elements(xml_path):
+    """
+    串流讀取 VDLive XML，只回傳表頭欄位 (UpdateTime 等) 與已讀取完成的 VDLive 節點。
+    呼叫端處理完一個 VDLive 後即釋放該節點，記憶體用量不隨 VD 數量增加；有安裝 lxml 時以 tag 過濾加速。
 
-    # 命名空間
-    namespace = {'ns': 'http://traffic.transportdata.tw/standard/traffic/schema/'}
+    Args:
+        xml_path (str 或 file-like): XML 檔案路徑，或已解壓縮的 XML 位元組串流。
 
-    # 解析全局欄位
-    update_time = get_text(root, 'ns:UpdateTime', namespace)
-    update_interval = get_text(root, 'ns:UpdateInterval', namespace)
-    authority_code = get_text(root, 'ns:AuthorityCode', namespace)
+    Yields:
+        Element: 表頭欄位或 VDLive 節點。
+    """
+    ns = VDLIVE_NAMESPACE
+    tag_vdlive = ns + 'VDLive'
+    wanted = (ns + 'UpdateTime', ns + 'UpdateInterval', ns + 'AuthorityCode', tag_vdlive)
+
+    if lxml_etree is not None:
+        for _, elem in lxml_etree.iterparse(xml_path, events=('end',), tag=wanted):
+            yield elem
+            if elem.tag == tag_vdlive:
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+    else:
+        container = None
+        for event, elem in ET.iterparse(xml_path, events=('start', 'end')):
+            if event == 'start':
+                if elem.tag == ns + 'VDLives':
+                    container = elem
+            elif elem.tag in wanted:
+                yield elem
+                if elem.tag == tag_vdlive:
+                    (container if container is not None else elem).clear()
+
+def iter_vdlive_batches(xml_path, batch_size = 100000, vdlist = None, valid_only = False):
+    """
+    以 iter_vdlive_elements 逐一處理 VDLive 節點，每累積 batch_size 列輸出一批欄位式資料。
+    過濾條件在解析時即套用，不在清單內的 VD 不會展開成資料列。
 
-    # 存放資料的列表
-    data = []
+    Args:
+        xml_path (str 或 file-like): XML 檔案路徑，或已解壓縮的 XML 位元組串流。
+        batch_size (int): 每一批最多的資料列數。
+        vdlist (list, optional): 只保留清單內的 VDID。
+        valid_only (bool): 是否只保留 Status == 0 且 Volume > 0 的資料 (與 vdlive_preliminary_process 相同條件)。
 
-    # 遍歷 VDLive
-    for vd in root.findall(".//ns:VDLive", namespace):
-        vdid = get_text(vd, "ns:VDID", namespace)
-        status = get_text(vd, "ns:Status", namespace)
-        data_collect_time = get_text(vd, "ns:DataCollectTime", namespace)
-
-        for link_flow in vd.findall(".//ns:LinkFlow", namespace):
-            link_id = get_text(link_flow, "ns:LinkID", namespace)
-
-            for lane in link_flow.findall(".//ns:Lane", namespace):
-                lane_id = get_text(lane, "ns:LaneID", namespace)
-                lane_type = get_text(lane, "ns:LaneType", namespace)
-                speed = get_text(lane, "ns:Speed", namespace)
-                occupancy = get_text(lane, "ns:Occupancy", namespace)
-
-                for vehicle in lane.findall(".//ns:Vehicle", namespace):
-                    vehicle_type = get_text(vehicle, "ns:VehicleType", namespace)
-                    volume = get_text(vehicle, "ns:Volume", namespace)
-                    speed_2 = get_text(vehicle, "ns:Speed", namespace)
-
-                    # 加入記錄
-                    data.append([
-                        update_time, update_interval, authority_code, vdid, link_id, 
-                        lane_id, lane_type, speed, occupancy, vehicle_type, volume, 
-                        speed_2, status, data_collect_time
-                    ])
-
-    # 建立 DataFrame
-    columns = [
-        "UpdateTime", "UpdateInterval", "AuthorityCode", "VDID", "LinkID", 
-        "LaneID", "LaneType", "Speed", "Occupancy", "VehicleType", "Volume", 
-        "SpeedAvg", "Status", "DataCollectTime"
-    ]
-    df = pd.DataFrame(data, columns=columns)
-    return df
+    Yields:
+        dict: {欄位名稱: np.ndarray}，UpdateTime、UpdateInterval、AuthorityCode 等整份檔案共用的欄位為純量。
+    """
+    ns = VDLIVE_NAMESPACE
+    tag_vdlive, tag_vdid, tag_status, tag_collect = ns + 'VDLive', ns + 'VDID', ns + 'Status', ns + 'DataCollectTime'
+    tag_linkflow, tag_linkid, tag_lane, tag_vehicle = ns + 'LinkFlow', ns + 'LinkID', ns + 'Lane', ns + 'Vehicle'
+    tag_laneid, tag_lanetype, tag_speed, tag_occupancy = ns + 'LaneID', ns + 'LaneType', ns + 'Speed', ns + 'Occupancy'
+    tag_vehicletype, tag_volume = ns + 'VehicleType', ns + 'Volume'
+    header = {'UpdateTime': None, 'UpdateInterval': None, 'AuthorityCode': None}
+    row_columns = VDLIVE_COLUMNS[3:]
+    vdset = set(vdlist) if vdlist else None
+
+    def to_batch(buffer):
+        batch = dict(header)
+        batch.update({col: np.array(values, dtype=object) for col, values in zip(row_columns, buffer)})
+        return batch
+
+    buffer = [[] for _ in row_columns]
+    (vdids, linkids, laneids, lanetypes, speeds, occupancies,
+     vehicletypes, volumes, speedavgs, statuses, collecttimes) = buffer
+    yielded = False
+
+    for elem in iter_vdlive_elements(xml_path):
+        if elem.tag != tag_vdlive:
+            header[elem.tag[len(ns):]] = elem.text
+            continue
+
+        vdid = status = data_collect_time = None
+        for child in elem:
+            if child.tag == tag_vdid:
+                vdid = child.text
+            elif child.tag == tag_status:
+                status = child.text
+            elif child.tag == tag_collect:
+                data_collect_time = child.text
+
+        if vdset is not None and vdid not in vdset:
+            continue
+        if valid_only and (status is None or int(status) != 0):
+            continue
+
+        for link_flow in elem.iter(tag_linkflow):
+            link_id = get_text(link_flow, tag_linkid, None)
+            for lane in link_flow.iter(tag_lane):
+                lane_id = lane_type = speed = occupancy = None
+                vehicles = []
+                n = 0
+                for child in lane:
+                    t = child.tag
+                    if t == tag_laneid:
+                        lane_id = child.text
+                    elif t == tag_lanetype:
+                        lane_type = child.text
+                    elif t == tag_speed:
+                        speed = child.text
+                    elif t == tag_occupancy:
+                        occupancy = child.text
+                    else:
+                        vehicles.extend(child.iter(tag_vehicle))
+
+                for vehicle in vehicles:
+                    vehicle_type = volume = speed_2 = None
+                    for child in vehicle:
+                        t = child.tag
+                        if t == tag_vehicletype:
+                            vehicle_type = child.text
+                        elif t == tag_volume:
+                            volume = child.text
+                        elif t == tag_speed:
+                            speed_2 = child.text
+                    if valid_only and (volume is None or int(volume) <= 0):
+                        continue
+                    vehicletypes.append(vehicle_type)
+                    volumes.append(volume)
+                    speedavgs.append(speed_2)
+                    n += 1
+
+                vdids.extend([vdid] * n)
+                linkids.extend([link_id] * n)
+                laneids.extend([lane_id] * n)
+                lanetypes.extend([lane_type] * n)
+                speeds.extend([speed] * n)
+                occupancies.extend([occupancy] * n)
+                statuses.extend([status] * n)
+                collecttimes.extend([data_collect_time] * n)
+
+        if len(vdids) >= batch_size:
+            yield to_batch(buffer)
+            buffer = [[] for _ in row_columns]
+            (vdids, linkids, laneids, lanetypes, speeds, occupancies,
+             vehicletypes, volumes, speedavgs, statuses, collecttimes) = buffer
+            yielded = True
+
+    if vdids or not yielded:
+        yield to_batch(buffer)
+
+def parse_vdlive_xml(xml_path, batch_size = 100000, vdlist = None, valid_only = False):
+    """
+    解析 VDLive XML 資料並轉換為 DataFrame。
+
+    Args:
+        xml_path (str 或 file-like): XML 檔案路徑，或已解壓縮的 XML 位元組串流 (如 io.BytesIO)。
+        batch_size (int): iter_vdlive_batches 每一批最多的資料列數。
+        vdlist (list, optional): 只保留清單內的 VDID，於解析時即過濾。
+        valid_only (bool): 是否於解析時即排除 Status != 0 或 Volume <= 0 的資料。
+
+    Returns:
+        pd.DataFrame: 每一列為一個 VD/車道/車種 的資料。
+    """
+    frames = [vdlive_frame(batch) for batch in iter_vdlive_batches(xml_path, batch_size=batch_size, vdlist=vdlist, valid_only=valid_only)]
+    if len(frames) == 1:
+        return frames[0]
+    return concat_categorical(frames)
+
+def vdlive_times(values):
+    """
+    解析 VDLive 的時間字串 (可含 None)，回傳型別為 VDLIVE_TIME 的 pd.DatetimeIndex，無法解析的值為 NaT。
+    """
+    times = pd.DatetimeIndex(pd.to_datetime(pd.Index(values, dtype=object), errors='coerce'))
+    times = times.tz_localize(VDLIVE_TIMEZONE) if times.tz is None else times.tz_convert(VDLIVE_TIMEZONE)
+    return times.astype(VDLIVE_TIME)
+
+def vdlive_frame(batch):
+    """
+    把 iter_vdlive_batches 的一批資料轉成 VDLIVE_DTYPES 型別的 DataFrame。
+    每個欄位重複的值很多 (整份檔案共用的欄位只有一個值)，先 factorize 再只轉換不重複的值。
+
+    Args:
+        batch (dict): iter_vdlive_batches 輸出的一批資料。
+
+    Returns:
+        pd.DataFrame: 欄位順序同 VDLIVE_COLUMNS。
+    """
+    rows = len(batch['VDID'])
+    columns = {}
+    for column in VDLIVE_COLUMNS:
+        values = batch[column]
+        if np.ndim(values) == 0:
+            codes, uniques = pd.factorize(np.array([values], dtype=object))
+            codes = np.repeat(codes, rows)
+        else:
+            codes, uniques = pd.factorize(values, sort=True)
+        if column in ['UpdateTime', 'DataCollectTime']:
+            columns[column] = vdlive_times(uniques).take(codes, allow_fill=True, fill_value=pd.NaT)
+        elif VDLIVE_DTYPES[column] != 'category':
+            columns[column] = np.append(pd.to_numeric(uniques, errors='coerce').astype('float64'), np.nan)[codes]
+        else:
+            columns[column] = pd.Categorical.from_codes(codes, categories=uniques)
+    return apply_schema(pd.DataFrame(columns, columns=VDLIVE_COLUMNS), VDLIVE_DTYPES)
 
 def vdlive_preliminary_process(df, vdlist = None):
-    df['Volume'] = df['Volume'].astype('int64')
-    df['Status'] = df['Status'].astype('int64')
+    df = apply_schema(df, {column: VDLIVE_DTYPES[column] for column in ['Volume', 'Status']})
     df = df[(df['Volume'] > 0) & (df['Status'] == 0)]
 
     if vdlist:
@@ -196,6 +370,56 @@ def vdlive_preliminary_process(df, vdlist = None):
 
     return df.reset_index(drop = True)
 
+def parse_vdlive_file(filepath, vdlist = None):
+    '''
+    解析單一 VDLive 檔案並進行初步處理，供 process pool 呼叫 (錯誤不拋出，交由主程序寫入 log)。
+
+    Returns:
+        tuple: (檔案路徑, DataFrame 或 None, 錯誤訊息或 None)
+    '''
+    try:
+        df = parse_vdlive_xml(filepath, vdlist=vdlist, valid_only=True)
+        df = vdlive_preliminary_process(df, vdlist=vdlist)
+        return filepath, df, None
+    except Exception as e:
+        return filepath, None, str(e)
+
+def parse_vdlive_files(filelist, vdlist = None, parse_workers = None):
+    '''
+    以 process pool 平行解析一天的 VDLive xml 檔案，並依檔名順序回傳結果。
+
+    Args:
+        filelist (list): xml 檔案路徑清單。
+        vdlist (list, optional): 需要過濾的 VD 清單。
+        parse_workers (int, optional): 平行處理的程序數，預設為 CPU 核心數；1 表示不開 process pool。
+
+    Returns:
+        list: 解析成功的 DataFrame 清單，失敗的檔案會寫入 log。
+    '''
+    filelist = sorted(filelist)
+    if parse_workers is None:
+        parse_workers = os.cpu_count() or 1
+
+    if parse_workers <= 1 or len(filelist) <= 1:
+        results = map(parse_vdlive_file, filelist, repeat(vdlist))
+        return collect_parse_results(results)
+
+    chunksize = max(1, len(filelist) // (parse_workers * 4))
+    with ProcessPoolExecutor(max_workers=parse_workers) as executor:
+        results = executor.map(parse_vdlive_file, filelist, repeat(vdlist), chunksize=chunksize)
+        return collect_parse_results(results)
+
+def collect_parse_results(results):
+    '''把 parse_vdlive_file 的結果寫入 log，並回傳成功的 DataFrame'''
+    frames = []
+    for filepath, df, error in results:
+        if error is None:
+            updatelog(file=logfile, text = f"INFO: 已讀取{filepath}的xml資料")
+            frames.append(df)
+        else:
+            updatelog(file=logfile, text = f"ERROR: {filepath}原始xml資料出現失誤, {error}")
+    return frames
+
 def VDfolder(datatype = 'VDlive'):
     savelocation = create_folder(os.path.join(os.getcwd(), datatype))
     rawdatafolder = create_folder(os.path.join(savelocation, '0_rawdata'))
@@ -203,6 +427,151 @@ def VDfolder(datatype = 'VDlive'):
     excelfolder = create_folder(os.path.join(savelocation, '2_excel'))
     return rawdatafolder, mergefolder, excelfolder
 
+def VDstore(datatype = 'VDlive', table = 'vdlive'):
+    '''欄式儲存 (parquet) 資料表的根目錄：datatype/3_store/table'''
+    return create_folder(os.path.join(os.getcwd(), datatype, '3_store', table))
+
+# 3_store 中各資料表的欄位型別
+# vdlive      : 合併後的原始資料，依 date、road 分區 (取代 1_merge/{date}.csv)
+# vdlive_5min : 符合原本五分鐘格式的資料，依 date 分區 (取代 1_merge/符合原本五分鐘格式/{date}.csv)
+# vd_volume   : 正規化分時PCU，依 date 分區 (取代 2_excel/正規化分時PCU/YYYY/MM/{date}.xlsx)
+VDLIVE_SCHEMA = VDLIVE_DTYPES # 與記憶體中的型別相同 (parquet 以字典編碼儲存類別欄位)
+VDLIVE_5MIN_SCHEMA = {
+    'vdid': 'str', 'status': 'int64', 'datacollecttime': 'str', 'vsrdir': 'str', 'vsrid': 'int64',
+    'speed': 'int64', 'laneoccupy': 'int64', 'carid': 'str', 'volume': 'int64'
+}
+VD_VOLUME_SCHEMA = {
+    '設備代碼': 'str', '日期': 'str', '小時': 'str', '車道方向': 'str',
+    '小型車': 'float64', '聯結車': 'float64', '大型車': 'float64',
+    '小型車分時PCU': 'float64', '聯結車分時PCU': 'float64', '大型車分時PCU': 'float64'
+}
+
+def diff_static_tables(old, new, keys, ignore=('UpdateTime',)):
+    """
+    比較兩個版本的靜態資料表 (例如 VD、ETag 設備清單)，回傳新增、刪除與修改的資料列
+
+    Parameters:
+        old, new (pd.DataFrame): 舊版與新版資料
+        keys (list): 用來對應同一筆資料的欄位 (例如 ['VDID', 'LinkID'])
+        ignore (tuple): 不列入比較的欄位 (例如每個版本都不同的 UpdateTime)
+
+    Returns:
+        pd.DataFrame: 新版欄位加上「變更」(新增/刪除/修改) 與「變更欄位」，沒有差異時為空表
+    """
+    old = old.drop_duplicates(keys).set_index(keys)
+    new = new.drop_duplicates(keys).set_index(keys)
+    compare = [column for column in new.columns if column in old.columns and column not in ignore]
+
+    added = new.index.difference(old.index)
+    removed = old.index.difference(new.index)
+    common = new.index.intersection(old.index)
+    # 空值一律視為空字串，避免 None / NaN 被當成不同的值
+    changed = (old.loc[common, compare].fillna('').astype(str) != new.loc[common, compare].fillna('').astype(str))
+    changed = changed[changed.any(axis=1)]
+
+    diff = pd.concat([
+        new.loc[added].assign(變更='新增', 變更欄位=''),
+        old.loc[removed].reindex(columns=new.columns).assign(變更='刪除', 變更欄位=''),
+        new.loc[changed.index].assign(變更='修改', 變更欄位=[','.join(row.index[row]) for _, row in changed.iterrows()]),
+    ])
+    return diff.reset_index()
+
+def load_static_table(url, parser, cachefolder, keys, name=None, rawpath=None, max_age=None, timeout=60, logfile=None):
+    """
+    以本機快取取得靜態資料表 (VD.xml、ETag.xml 等)。快取以資料的 UpdateTime 區分版本，每個版本解析後存成 parquet。
+
+    有快取時以 ETag / Last-Modified 送出條件式請求，伺服器回覆 304 (或最近 max_age 秒內已檢查過) 時直接讀取快取，
+    不需重新下載與解析；取得新版本時與前一版比較差異，並將差異表存成 csv。無法連線時改用快取並記錄 WARNING。
+
+    Parameters:
+        url (str): 靜態資料網址
+        parser (callable): 將下載內容 (bytes) 轉成 DataFrame 的函式
+        cachefolder (str): 快取資料夾
+        keys (list): 比較版本差異時用來對應同一筆資料的欄位
+        name (str, optional): 快取檔名，預設為網址的檔名 (不含副檔名)
+        rawpath (str, optional): 下載到新內容時一併存下原始檔的路徑
+        max_age (float, optional): 距離上次檢查未超過此秒數時不連線，直接讀取快取
+        timeout (float): 連線逾時秒數
+        logfile (str, optional): 記錄檔路徑
+
+    Returns:
+        tuple: (資料表, 差異表)。差異表為 None 表示沒有前一版可比較 (第一次下載)，
+               沒有變更時為空表。
+    """
+    name = name or os.path.basename(url).split('.')[0]
+    os.makedirs(cachefolder, exist_ok=True)
+    metapath = os.path.join(cachefolder, f'{name}_meta.json')
+    meta = {}
+    if os.path.exists(metapath):
+        with open(metapath, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    cachepath = os.path.join(cachefolder, meta['file']) if meta.get('file') else None
+    if cachepath is not None and not os.path.exists(cachepath):
+        cachepath = None
+    unchanged = pd.DataFrame(columns=list(keys) + ['變更', '變更欄位'])
+
+    if cachepath is not None and max_age is not None and time.time() - meta.get('checked', 0) < max_age:
+        return pd.read_parquet(cachepath), unchanged
+
+    headers = {}
+    if cachepath is not None:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+    try:
+        response = requests.get(url, headers=headers, timeout=timeout)
+        if response.status_code != 304:
+            response.raise_for_status()
+    except requests.RequestException as e:
+        if cachepath is None:
+            raise
+        updatelog(file=logfile, text=f"WARNING: {name} 無法下載 ({e})，改用快取版本 {meta.get('version')}")
+        return pd.read_parquet(cachepath), unchanged
+
+    meta['checked'] = time.time()
+    if response.status_code == 304:
+        df, diff = pd.read_parquet(cachepath), unchanged
+        updatelog(file=logfile, text=f"INFO: {name} 沒有更新，使用快取版本 {meta.get('version')}")
+    else:
+        content = response.content
+        if rawpath:
+            with open(rawpath, 'wb') as f:
+                f.write(content)
+        df = parser(content)
+
+        # 版本以資料的 UpdateTime 為準，找不到時以內容的雜湊值代替
+        match = re.search(rb'<UpdateTime>([^<]+)</UpdateTime>', content[:4096])
+        if 'UpdateTime' in df.columns and len(df):
+            version = str(df['UpdateTime'].iloc[0])
+        elif match:
+            version = match.group(1).decode('utf-8')
+        else:
+            version = hashlib.sha256(content).hexdigest()[:16]
+
+        if cachepath is not None and meta.get('version') == version:
+            diff = unchanged
+            updatelog(file=logfile, text=f"INFO: {name} 版本 {version} 沒有變更")
+        else:
+            diff = None
+            if cachepath is not None:
+                diff = diff_static_tables(pd.read_parquet(cachepath), df, keys)
+                counts = diff['變更'].value_counts()
+                updatelog(file=logfile, text=f"INFO: {name} 由版本 {meta.get('version')} 更新為 {version}，"
+                                             f"新增 {counts.get('新增', 0)} 筆、刪除 {counts.get('刪除', 0)} 筆、修改 {counts.get('修改', 0)} 筆")
+            filename = f"{name}_{re.sub(r'[^0-9A-Za-z]', '', version)}.parquet"
+            df.to_parquet(os.path.join(cachefolder, filename), index=False)
+            if diff is not None:
+                diff.to_csv(os.path.join(cachefolder, f"{get_filename(filename)}_diff.csv"), index=False, encoding='utf-8-sig')
+            meta['version'], meta['file'] = version, filename
+
+        meta['etag'] = response.headers.get('ETag')
+        meta['last_modified'] = response.headers.get('Last-Modified')
+
+    with open(metapath, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return df, diff
+
 # def get_vd():
 #     vdfolder = create_folder(os.path.join(os.getcwd(), 'VD'))
 #     vdxmlfolder = create_folder(os.path.join(vdfolder, 'xml'))
@@ -214,33 +583,36 @@ def VDfolder(datatype = 'VDlive'):
 #     return VD
 
 def get_vd(date = None):
+    """
+    取得 VD 靜態資料。解析後的資料以 UpdateTime 為版本快取於 VD/cache，靜態資料沒有更新時直接讀取快取，
+    不重新下載解析，也不重新輸出 VD.xlsx；有新版本時記錄與前一版的差異 (見 load_static_table)。
+
+    Args:
+        date (str, optional): 指定日期 (例如 '20250619') 時取得當日的歷史版本。
+    """
     vdfolder = create_folder(os.path.join(os.getcwd(), 'VD'))
     vdxmlfolder = create_folder(os.path.join(vdfolder, 'xml'))
-    vdpath = os.path.join(os.path.join(vdxmlfolder, 'VD.xml'))
+    cachefolder = os.path.join(vdfolder, 'cache')
 
     if date:
-        create_folder(os.path.join(vdxmlfolder,date))
-        vdpath = os.path.join(vdxmlfolder,date,'VD_0000.xml.gz')
         url = f'https://tisvcloud.freeway.gov.tw/history/motc20/VD/{date}/VD_0000.xml.gz'
-
-        response = requests.get(url)
-        if response.status_code == 200:
-            with open(vdpath, 'wb') as file:
-                file.write(response.content)
-            extract_gz(vdpath, create_folder(os.path.join(vdpath, '..', 'temp')))
-            vdpath = os.path.abspath(os.path.join(vdpath, '..', 'temp', 'VD_0000.xml'))
-        else:
-            error_message = f"ERROR: {vdpath} 檔案無法下載，狀態碼: {response.status_code}，回應內容: {response.text}"
-    else:
-        download_VD(url = 'https://tisvcloud.freeway.gov.tw/history/motc20/VD.xml', downloadpath = vdpath)
-    VD = read_xml(vdpath, return_raw=True)
-    VD = parse_vd_xml(VD)
-
-    if date:
+        vdpath = os.path.join(create_folder(os.path.join(vdxmlfolder, date)), 'VD_0000.xml.gz')
+        parser = lambda content: parse_vd_xml(gzip.decompress(content))
         outputname = os.path.join(vdfolder, f'VD_{date}.xlsx')
+        name = f'VD_{date}'
+        max_age = float('inf')  # 歷史版本不會再變動，有快取就不再連線
     else:
+        url = 'https://tisvcloud.freeway.gov.tw/history/motc20/VD.xml'
+        vdpath = os.path.join(vdxmlfolder, 'VD.xml')
+        parser = parse_vd_xml
         outputname = os.path.join(vdfolder, 'VD.xlsx')
-    VD.to_excel(outputname, index = False, sheet_name= 'VD靜態資料')
+        name = 'VD'
+        max_age = None
+
+    VD, diff = load_static_table(url, parser, cachefolder, keys=['VDID', 'LinkID'], name=name, rawpath=vdpath, max_age=max_age, logfile=logfile)
+    # 只有第一次下載或版本有變更時才重新輸出 Excel
+    if diff is None or len(diff) or not check_pathexist(outputname):
+        to_excel_formatted(VD, outputname, sheet_name= 'VD靜態資料')
     return VD
 
 def extract_gz(destfile, downloadfolder):
@@ -251,10 +623,11 @@ def extract_gz(destfile, downloadfolder):
         # 取得解壓後的檔名
         extracted_file = os.path.join(downloadfolder, os.path.basename(destfile).replace('.gz', ''))
         
-        # 解壓檔案
+        # 解壓檔案 (先寫入暫存檔再改名，中斷時不會留下不完整的檔案)
         with gzip.open(destfile, 'rb') as f_in:
-            with open(extracted_file, 'wb') as f_out:
+            with open(extracted_file + '.part', 'wb') as f_out:
                 shutil.copyfileobj(f_in, f_out)
+        os.replace(extracted_file + '.part', extracted_file)
         
         return extracted_file
 
@@ -262,63 +635,322 @@ def extract_gz(destfile, downloadfolder):
         updatelog(file=logfile, text = f"ERROR: 解壓失敗：{e}")
         return None
     
-def download_and_extract_VD(url, datatype, date, downloadfolder, keep = False):
-    '''針對高公局交通資料庫的格式進行下載'''
+class HostRateLimiter:
+    """
+    依主機 (host) 控制請求頻率的節流器，供多執行緒下載共用。
+
+    Args:
+        rate (float, optional): 每個主機每秒最多送出的請求數，None 或 0 表示不限制。
+    """
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_time = {}
+
+    def wait(self, url):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_time.get(host, now))
+            self.next_time[host] = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+def create_session(max_workers=8):
+    """建立共用 keep-alive 連線池的 requests.Session"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def fetch_with_retry(session, url, limiter=None, retries=3, backoff=0.5, timeout=60):
+    """
+    以共用 session 下載單一網址，遇到連線錯誤或 429/5xx 時以指數退避重試。
+
+    Args:
+        session (requests.Session): 共用連線池的 session。
+        url (str): 要下載的網址。
+        limiter (HostRateLimiter, optional): 主機節流器。
+        retries (int): 最多重試次數。
+        backoff (float): 退避秒數基準，第 n 次重試等待 backoff * 2**n 秒。
+        timeout (float): 單次請求逾時秒數。
+
+    Returns:
+        requests.Response: 最後一次請求的回應 (404 等非暫時性錯誤不重試，直接回傳)。
+    """
+    for attempt in range(retries + 1):
+        if limiter:
+            limiter.wait(url)
+        try:
+            response = session.get(url, timeout=timeout)
+            if response.status_code not in (429, 500, 502, 503, 504) or attempt == retries:
+                return response
+        except requests.exceptions.RequestException:
+            if attempt == retries:
+                raise
+        time.sleep(backoff * 2 ** attempt)
+
+def download_files_concurrently(tasks, handler, max_workers=8, rate_limit=None, retries=3, backoff=0.5, manifest=None):
+    """
+    以有上限的執行緒池平行下載多個檔案，所有執行緒共用同一個 keep-alive session。
+
+    Args:
+        tasks (list): (網址, 名稱) 組成的清單。
+        handler (function): handler(名稱, response) 於下載成功 (狀態碼 200) 後在工作執行緒中呼叫。
+        max_workers (int): 同時下載的數量。
+        rate_limit (float, optional): 每個主機每秒最多送出的請求數。
+        retries (int): 失敗時最多重試次數。
+        backoff (float): 重試的退避秒數基準。
+        manifest (DownloadManifest, optional): 下載失敗的項目記錄於此清單 (成功的項目由 handler 記錄)。
+
+    Returns:
+        dict: {名稱: handler 的回傳值}，下載失敗者為 None。
+    """
+    limiter = HostRateLimiter(rate_limit)
+    results = {}
+
+    def worker(downloadurl, name):
+        try:
+            response = fetch_with_retry(session, downloadurl, limiter=limiter, retries=retries, backoff=backoff)
+        except requests.exceptions.RequestException as e:
+            updatelog(file=logfile, text = f"ERROR: {downloadurl} 下載時發生錯誤, {e}")
+            if manifest is not None:
+                manifest.record(name, 'failed', error=str(e))
+            return None
+        if response.status_code != 200:
+            updatelog(file=logfile, text = f"ERROR: {downloadurl} 檔案無法下載，狀態碼: {response.status_code}")
+            if manifest is not None:
+                manifest.record(name, 'missing' if response.status_code == 404 else 'failed', http_status=response.status_code)
+            return None
+        return handler(name, response)
+
+    with create_session(max_workers) as session, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(worker, downloadurl, name): name for downloadurl, name in tasks}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                updatelog(file=logfile, text = f"ERROR: {name} 處理時發生錯誤, {e}")
+                if manifest is not None:
+                    manifest.record(name, 'failed', error=str(e))
+                results[name] = None
+    return results
+
+def download_and_extract_VD(url, datatype, date, downloadfolder, keep = False, max_workers = 8, rate_limit = None, retries = 3, backoff = 0.5, resume = False, verify = True, report = None):
+    '''
+    針對高公局交通資料庫的格式進行下載，一天 1,440 個 VDLive_HHMM.xml.gz 以執行緒池平行下載並解壓縮。
+    每個檔案的狀態、大小、SHA-256 與嘗試次數記錄於 downloadfolder/date/manifest.json (見 DownloadManifest)。
+
+    Args:
+        url (str): VD 歷史資料的根網址 (可替換成本機測試伺服器)。
+        datatype (str): 檔案下載後的儲存類型。
+        date (str): %Y%m%d 格式的日期。
+        downloadfolder (str): 原始資料的儲存資料夾。
+        keep (bool): 是否保留 壓縮檔 資料夾中的 .gz 檔。
+        max_workers (int): 同時下載的數量。
+        rate_limit (float, optional): 每個主機每秒最多送出的請求數，None 表示不限制。
+        retries (int): 連線錯誤或 429/5xx 時最多重試次數。
+        backoff (float): 重試的退避秒數基準。
+        resume (bool): 接續模式，只下載清單中尚未完成、或解壓後的 xml 缺少/損毀的檔案。
+        verify (bool): 接續模式下是否以 SHA-256 檢查已完成的檔案 (False 時只比對檔案大小)。
+        report (RunReport, optional): 累計各檔解壓縮的耗時與位元組數於 extract 階段。
+    '''
     hourlist = [f"{i:02d}" for i in range(24)]
     minutelist = [f"{i:02d}" for i in range(0, 60, 1)]
     downloadfolder = create_folder(os.path.join(downloadfolder, date))
     gzdownloadfolder = create_folder(os.path.join(downloadfolder, '壓縮檔'))
-    for hour in hourlist:
-        for minute in minutelist:
-            # https://tisvcloud.freeway.gov.tw/history/motc20/VD/20241205/VDLive_2315.xml.gz
-            downloadurl = f"{url}/{date}/VDLive_{hour}{minute}.xml.gz"
-            destfile = os.path.join(gzdownloadfolder, f"VDLive_{hour}{minute}.xml.gz")
-            checkfile = os.path.abspath(os.path.join(destfile,'..','..',f"VDLive_{hour}{minute}.xml"))
-            check_exist_bool = check_pathexist(checkfile)
-            if check_exist_bool:
-                updatelog(file=logfile, text = f"WARN: {checkfile} 已經存在，不進行下載")
-            else:
-                response = requests.get(downloadurl)
-                if response.status_code == 200:
-                    with open(destfile, 'wb') as file:
-                        file.write(response.content)
-                        updatelog(file=logfile, text = f"INFO: {destfile} 下載成功")
-                    extract_gz(destfile, downloadfolder)
-                    updatelog(file=logfile, text = f"INFO: {destfile} 解壓縮成功")
-                else:
-                    error_message = f"ERROR: {destfile} 檔案無法下載，狀態碼: {response.status_code}，回應內容: {response.text}"
-                    updatelog(file=logfile, text=error_message)
-                    # updatelog(file=logfile, text = f"ERROR: {destfile} 檔案無法下載")
-    os.remove(gzdownloadfolder)
+    manifest = DownloadManifest(os.path.join(downloadfolder, 'manifest.json'))
+
+    # https://tisvcloud.freeway.gov.tw/history/motc20/VD/20241205/VDLive_2315.xml.gz
+    names = [f"VDLive_{hour}{minute}.xml.gz" for hour in hourlist for minute in minutelist]
+    if resume:
+        pending = set(manifest.pending(names, verify=verify))
+        if len(pending) < len(names):
+            updatelog(file=logfile, text = f"INFO: {date} 已完成 {len(names) - len(pending)} 個檔案，接續下載其餘 {len(pending)} 個")
+        names = [name for name in names if name in pending]
+    tasks = [(f"{url}/{date}/{name}", name) for name in names]
+
+    def save_and_extract(name, response):
+        destfile = os.path.join(gzdownloadfolder, name)
+        write_atomic(destfile, response.content)
+        updatelog(file=logfile, text = f"INFO: {destfile} 下載成功")
+        start = time.perf_counter()
+        extracted_file = extract_gz(destfile, downloadfolder)
+        if report is not None:
+            report.add('extract', date, seconds = time.perf_counter() - start, files = 1, bytes_read = len(response.content),
+                       bytes_written = os.path.getsize(extracted_file) if extracted_file else 0)
+        if extracted_file:
+            updatelog(file=logfile, text = f"INFO: {destfile} 解壓縮成功")
+            manifest.record(name, 'done', path=extracted_file, http_status=response.status_code)
+        else:
+            manifest.record(name, 'failed', http_status=response.status_code, error='解壓縮失敗')
+        return extracted_file
+
+    with manifest:
+        download_files_concurrently(tasks, save_and_extract, max_workers=max_workers, rate_limit=rate_limit, retries=retries, backoff=backoff, manifest=manifest)
+
+    counts = manifest.summary()
+    level = "INFO" if counts.get('done', 0) == len(hourlist) * len(minutelist) else "WARNING"
+    updatelog(file=logfile, text = f"{level}: {date} 下載清單狀態 {counts}")
+
+    if not keep:
+        shutil.rmtree(gzdownloadfolder, ignore_errors=True)
     return downloadfolder
 
+def download_and_parse_VD(url, date, downloadfolder = None, vdlist = None, archive = False, max_workers = 8, rate_limit = None, retries = 3, backoff = 0.5, resume = False, verify = True, report = None):
+    '''
+    串流模式：下載一天的 VDLive_HHMM.xml.gz 後直接在記憶體中解壓縮並解析，不產生 壓縮檔 與 .xml 暫存檔。
+
+    Args:
+        url (str): VD 歷史資料的根網址。
+        date (str): %Y%m%d 格式的日期。
+        downloadfolder (str, optional): 原始資料的儲存資料夾，archive=True 時必須提供。
+        vdlist (list, optional): 需要過濾的 VD 清單。
+        archive (bool): 是否另外保存原始 .gz 檔於 downloadfolder/date 之下，並記錄下載清單 manifest.json。
+        max_workers (int): 同時下載的數量。
+        rate_limit (float, optional): 每個主機每秒最多送出的請求數。
+        retries (int): 失敗時最多重試次數。
+        backoff (float): 重試的退避秒數基準。
+        resume (bool): 接續模式 (需 archive=True)，清單中已完成且檔案完整的 gz 直接讀取本機檔案，只下載其餘檔案。
+        verify (bool): 接續模式下是否以 SHA-256 檢查已保存的 gz (False 時只比對檔案大小)。
+        report (RunReport, optional): 累計各檔解壓縮與解析的耗時、位元組數與資料列數於 parse 階段。
+
+    Returns:
+        list: 依時間排序、已經過 vdlive_preliminary_process 的 DataFrame 清單。
+    '''
+    manifest = None
+    if archive:
+        if downloadfolder is None:
+            raise ValueError("archive=True 時需要指定 downloadfolder")
+        archivefolder = create_folder(os.path.join(downloadfolder, date))
+        manifest = DownloadManifest(os.path.join(archivefolder, 'manifest.json'))
+
+    names = [f"VDLive_{hour:02d}{minute:02d}.xml.gz" for hour in range(24) for minute in range(60)]
+    local = set()
+    if resume and manifest is not None:
+        local = set(names) - set(manifest.pending(names, verify=verify))
+        updatelog(file=logfile, text = f"INFO: {date} 已保存 {len(local)} 個檔案，接續下載其餘 {len(names) - len(local)} 個")
+
+    def parse_content(name, content):
+        try:
+            start = time.perf_counter()
+            df = parse_vdlive_xml(io.BytesIO(gzip.decompress(content)), vdlist=vdlist, valid_only=True)
+            df = vdlive_preliminary_process(df, vdlist=vdlist)
+            if report is not None:
+                report.add('parse', date, seconds = time.perf_counter() - start, files = 1, bytes_read = len(content), rows_out = len(df))
+            return df
+        except Exception as e:
+            updatelog(file=logfile, text = f"ERROR: {name}原始xml資料出現失誤, {e}")
+            return None
+
+    def parse_response(name, response):
+        df = parse_content(name, response.content)
+        if archive:
+            # 無法解析的檔案記為失敗，接續模式時會重新下載
+            path = os.path.join(archivefolder, name)
+            write_atomic(path, response.content)
+            if df is None:
+                manifest.record(name, 'failed', http_status=response.status_code, error='無法解析')
+            else:
+                manifest.record(name, 'done', path=path, http_status=response.status_code)
+        if df is not None:
+            updatelog(file=logfile, text = f"INFO: {name} 下載並讀取成功")
+        return df
+
+    tasks = [(f"{url}/{date}/{name}", name) for name in names if name not in local]
+    results = download_files_concurrently(tasks, parse_response, max_workers=max_workers, rate_limit=rate_limit, retries=retries, backoff=backoff, manifest=manifest)
+    for name in local:
+        with open(os.path.join(archivefolder, name), 'rb') as file:
+            results[name] = parse_content(name, file.read())
+    if manifest is not None:
+        manifest.save()
+        updatelog(file=logfile, text = f"INFO: {date} 下載清單狀態 {manifest.summary()}")
+    return [results[name] for name in names if results.get(name) is not None]
+
+def format_vdlive_times(values):
+    '''把解析過的時間轉回 VDLive 原始的字串格式 (例如 2025-06-19T00:00:00+08:00)，只格式化不重複的值；字串直接回傳'''
+    if not pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    codes, uniques = pd.factorize(values)
+    return np.array([value.isoformat() for value in uniques] + [None], dtype=object)[codes]
+
+def vdlive_csv_frame(df):
+    '''
+    轉回 1_merge csv 原本的文字格式 (精簡型別之前直接輸出原始字串的結果)：UpdateTime、DataCollectTime 為 VDLive 原始的時間字串，
+    Speed、Occupancy、SpeedAvg (float32) 的值都是整數時寫成整數 (109 而非 109.0)，空值維持空白
+    '''
+    columns = {}
+    for column in ['UpdateTime', 'DataCollectTime']:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            columns[column] = values.cat.rename_categories(format_vdlive_times(values.cat.categories))
+        else:
+            columns[column] = format_vdlive_times(values)
+    for column in ['Speed', 'Occupancy', 'SpeedAvg']:
+        values = df[column]
+        if pd.api.types.is_float_dtype(values) and (values.dropna() % 1 == 0).all():
+            columns[column] = values.astype('Int64')
+    return df.assign(**columns)
+
 def cleanVD(df):
-    df["Direction"] = df["VDID"].str.extract(r"VD-[A-Z0-9]+-([A-Z])-")
+    vdid = df['VDID'].astype('category')
+    directions = vdid.cat.categories.str.extract(r"VD-[A-Z0-9]+-([A-Z])-", expand=False)
     df = df.reindex(columns=['VDID', 'Status','DataCollectTime', 'Direction', 'LaneID', 'Speed', 'Occupancy', 'VehicleType', 'Volume'])
+    df['Direction'] = np.append(np.asarray(directions, dtype=object), None)[vdid.cat.codes.to_numpy()] # 只對不重複的 VDID 做正規表示式
+    df['DataCollectTime'] = format_vdlive_times(df['DataCollectTime'])
     df.columns = ['vdid', 'status', 'datacollecttime', 'vsrdir', 'vsrid', 'speed', 'laneoccupy', 'carid', 'volume']
     return df 
 
 def VD_volume(df, roadselectlist = None):
-    df['UpdateTime'] = pd.to_datetime(df['UpdateTime'] )
-    df['Date'] = df['UpdateTime'].dt.strftime('%Y/%m/%d')
-    df['Hour'] = df['UpdateTime'].dt.strftime('%H')
-    df["Direction"] = df["VDID"].str.extract(r"VD-[A-Z0-9]+-([A-Z])-")
-    df = pd.pivot_table(
-        df,
-        index=['VDID', 'Date', 'Hour', 'Direction'],
-        columns='VehicleType',
-        values='Volume',
-        aggfunc='sum'  # 可依需求改成 'mean', 'max' 等
-    ).reset_index()
-    df[['L','S','T']] = df[['L','S','T']].fillna(0)
-    df = df.groupby(['VDID', 'Date', 'Hour', 'Direction']).agg({'S':'sum', 'T':'sum', 'L':'sum'}).reset_index()
-    df = df.rename(columns = {'VDID':'設備代碼',
-                              'Date':'日期',
-                              'Hour':'小時',
-                              'Direction':'車道方向', 
-                              'S':'小型車',
-                              'T':'聯結車',
-                              'L':'大型車'})
+    '''
+    統計每個 (設備代碼, 日期, 小時) 的小型車、聯結車、大型車通過量與分時PCU
+
+    VDID 以類別編碼、UpdateTime 以整數小時 (epoch hour) 作為分組鍵，一次加總三種車種；
+    時間只解析不重複的 UpdateTime，方向只對不重複的 VDID 做正規表示式，字串欄位最後才產生。
+    無法判斷方向的 VDID 不列入統計。
+    '''
+    vdid = df['VDID'].astype('category')
+    vd_codes = vdid.cat.codes.to_numpy()
+    directions = vdid.cat.categories.str.extract(r"VD-[A-Z0-9]+-([A-Z])-", expand=False)
+
+    # 每個檔案的 UpdateTime 都相同，只需解析不重複的值 (已是 category 時直接使用類別)
+    if isinstance(df['UpdateTime'].dtype, pd.CategoricalDtype):
+        time_codes, times = df['UpdateTime'].cat.codes.to_numpy(), df['UpdateTime'].cat.categories
+    else:
+        time_codes, times = pd.factorize(df['UpdateTime'])
+    times = pd.to_datetime(times)
+    if times.tz is not None:
+        times = times.tz_convert(VDLIVE_TIMEZONE).tz_localize(None) # 保留當地時間
+    epoch_hours = ((times - pd.Timestamp(0)) // pd.Timedelta(hours=1)).to_numpy()
+    hour_codes, hours = pd.factorize(epoch_hours[time_codes], sort=True)
+
+    vehicle_codes = pd.Categorical(df['VehicleType'], categories=['S', 'T', 'L']).codes
+    volume = np.nan_to_num(pd.to_numeric(df['Volume']).to_numpy(dtype='float64', na_value=np.nan))
+
+    valid = (vd_codes >= 0) & (time_codes >= 0)
+    valid[valid] = pd.notna(directions)[vd_codes[valid]]
+    keys = vd_codes[valid].astype('int64') * len(hours) + hour_codes[valid]
+    groups, inverse = np.unique(keys, return_inverse=True)
+    counted = vehicle_codes[valid] >= 0
+    sums = np.bincount(inverse[counted] * 3 + vehicle_codes[valid][counted], weights=volume[valid][counted], minlength=len(groups) * 3).reshape(-1, 3)
+
+    hour_times = pd.Timestamp(0) + pd.to_timedelta(hours, unit='h')
+    group_vds = groups // len(hours)
+    group_hours = groups % len(hours)
+    df = pd.DataFrame({
+        '設備代碼': vdid.cat.categories.take(group_vds),
+        '日期': hour_times.strftime('%Y/%m/%d').take(group_hours),
+        '小時': hour_times.strftime('%H').take(group_hours),
+        '車道方向': directions.take(group_vds),
+        '小型車': sums[:, 0],
+        '聯結車': sums[:, 1],
+        '大型車': sums[:, 2]
+    })
     
     if roadselectlist : 
         vd_info_dict = {'N1': '國道1號',
@@ -358,41 +990,124 @@ def VD_volume(df, roadselectlist = None):
     return df 
 
 def calculate_peak_hour(VD_Data):
+    '''
+    計算每組 (設備代碼, 日期) 的全日PCU、尖峰時段與尖峰率
+
+    以整數編碼排序後找出每組的尖峰小時，不在原資料上新增欄位；同一天有多個小時同為最大值時取最早的小時，每組只輸出一列。
+    全日加總依原始列順序以 groupby().sum() 計算 (與原本相同的補償加總)，輸出的 PCU 與原本完全相同。
+    '''
+    day_columns = ['設備代碼', '日期', '小型車', '聯結車', '大型車', '小型車全日PCU', '聯結車全日PCU', '大型車全日PCU', '合計全日PCU', '尖峰時段', '尖峰小時PCU', '尖峰率']
+    if VD_Data['車道方向'].isna().any():
+        VD_Data = VD_Data[VD_Data['車道方向'].notna()]
+    if VD_Data.empty:
+        return pd.DataFrame(columns=day_columns)
+
+    # 依 (設備代碼, 日期, 小時) 的整數編碼排序，每組資料成為連續區段
+    vd_codes, vd_names = pd.factorize(VD_Data['設備代碼'], sort=True)
+    date_codes, date_names = pd.factorize(VD_Data['日期'], sort=True)
+    hour_codes, hour_names = pd.factorize(VD_Data['小時'], sort=True)
+    group = vd_codes.astype('int64') * len(date_names) + date_codes
+    order = np.lexsort((hour_codes, group))
+    starts = np.flatnonzero(np.r_[True, group[order][1:] != group[order][:-1]])
+    head = order[starts]
+
+    def segment_sum(values):
+        # 群組依編碼排序，與 starts 的區段順序相同
+        return values.groupby(group, sort=True).sum().to_numpy()
+
     # 計算合計分時PCU
     updatelog(file=logfile, text = f"INFO: 計算合計分時PCU")
-    VD_Data['合計分時PCU'] = VD_Data['小型車分時PCU'] + VD_Data['大型車分時PCU'] + VD_Data['聯結車分時PCU']
+    total = VD_Data['小型車分時PCU'] + VD_Data['大型車分時PCU'] + VD_Data['聯結車分時PCU']
+    VD_Data_Day = pd.DataFrame({'設備代碼': vd_names.take(vd_codes[head]), '日期': date_names.take(date_codes[head])})
+    for source, column in zip(['小型車', '聯結車', '大型車', '小型車分時PCU', '聯結車分時PCU', '大型車分時PCU'], day_columns[2:8]):
+        VD_Data_Day[column] = segment_sum(VD_Data[source]).astype(VD_Data[source].dtype)
+    VD_Data_Day['合計全日PCU'] = segment_sum(total).astype(total.dtype)
 
-    # 找到每組(設備代碼, 日期)的尖峰時段
+    # 找到每組(設備代碼, 日期)的尖峰時段：區段內第一個最大值 (同分取最早的小時)
     updatelog(file=logfile, text = f"INFO: 找到每組(設備代碼, 日期)的尖峰時段")
-    VD_Data['尖峰時段'] = VD_Data.groupby(['設備代碼', '日期'])['合計分時PCU'].transform(max)
-
-    # 標示尖峰小時
-    VD_Data['尖峰小時'] = np.where(VD_Data['尖峰時段'] == VD_Data['合計分時PCU'], '*', 'NA')
-
-    # 提取尖峰時段資料
-    peak_hour = VD_Data[VD_Data['尖峰小時'] == '*'].reset_index(drop=True)
-    peak_hour['尖峰時段'] = peak_hour['小時']
-    peak_hour.rename(columns={'合計分時PCU': '尖峰小時PCU'}, inplace=True)
+    total_dtype = total.dtype
+    total = total.to_numpy(dtype='float64')[order]
+    peak = np.fmax.reduceat(total, starts)
+    position = np.where(total == np.repeat(peak, np.diff(np.r_[starts, len(order)])), np.arange(len(order)), len(order))
+    first = np.minimum.reduceat(position, starts)
+    valid = first < len(order)  # 整組皆為空值時沒有尖峰時段，不輸出
 
     updatelog(file=logfile, text = f"INFO:  合併 尖峰時段、尖峰小時PCU 兩個欄位")
-    # 合併尖峰時段資料
-    VD_Data = VD_Data.drop('尖峰時段', axis=1)
-    VD_Data = VD_Data.merge(peak_hour[['尖峰時段', '尖峰小時PCU', '設備代碼', '日期']], on=['設備代碼', '日期'], how='left')
-
-    # 彙總資料並計算尖峰率
-    agg_columns = ['設備代碼', '日期', '車道方向', '尖峰時段', '尖峰小時PCU']
-    VD_Data_Day = VD_Data.groupby(agg_columns)[['小型車', '聯結車', '大型車', '小型車分時PCU', '聯結車分時PCU', '大型車分時PCU', '合計分時PCU']].sum().reset_index()
-    
-    # 整理欄位順序與名稱
-    VD_Data_Day = VD_Data_Day[['設備代碼', '日期', '小型車', '聯結車', '大型車', '小型車分時PCU', '聯結車分時PCU', '大型車分時PCU', '合計分時PCU', '尖峰時段', '尖峰小時PCU']]
-    VD_Data_Day.columns = ['設備代碼', '日期', '小型車', '聯結車', '大型車', '小型車全日PCU', '聯結車全日PCU', '大型車全日PCU', '合計全日PCU', '尖峰時段', '尖峰小時PCU']
+    VD_Data_Day['尖峰時段'] = hour_names.take(hour_codes[order[np.where(valid, first, 0)]])
+    VD_Data_Day['尖峰小時PCU'] = peak.astype(total_dtype) if valid.all() else peak
+    VD_Data_Day = VD_Data_Day[valid].reset_index(drop=True)
 
     # 計算尖峰率
     VD_Data_Day['尖峰率'] = round(VD_Data_Day['尖峰小時PCU'] / VD_Data_Day['合計全日PCU'], 3)
 
     return VD_Data_Day
 
-def VDlive (datelist , datatype = 'VD_live', vdlist = None, roadselectlist = None):
+def partition_signature(root, date):
+    '''以分區內 parquet 檔的大小與修改時間作為該日期資料的簽章，資料重寫後簽章即改變'''
+    files = find_partitions(root, filters = {'date': [date]})
+    return ';'.join(f"{os.path.relpath(path, root)}:{os.stat(path).st_size}:{os.stat(path).st_mtime_ns}" for path, _ in files)
+
+def update_yearly_rollup(volumestore, rollupfolder, year):
+    '''
+    增量更新年度正規化彙整資料與尖峰小時資料
+
+    3_store/rollup 中保存 {year}_volume.parquet (年度彙整)、{year}_peak.parquet (尖峰小時) 與
+    {year}_manifest.json (已彙整的日期及其簽章)。每次只讀入新增或有變動的日期，移除已刪除的日期，
+    calculate_peak_hour 也只針對這些日期的 (設備代碼, 日期) 重新計算。
+
+    Args:
+        volumestore (str): vd_volume 資料表根目錄
+        rollupfolder (str): 彙整資料的存放資料夾
+        year (int 或 str): 年度
+
+    Returns:
+        tuple: (年度彙整 DataFrame, 尖峰小時 DataFrame, 有變動的日期 list)
+    '''
+    year = str(year)
+    volumepath = os.path.join(rollupfolder, f'{year}_volume.parquet')
+    peakpath = os.path.join(rollupfolder, f'{year}_peak.parquet')
+    manifestpath = os.path.join(rollupfolder, f'{year}_manifest.json')
+
+    manifest = {}
+    if check_pathexist(manifestpath) and check_pathexist(volumepath) and check_pathexist(peakpath):
+        with open(manifestpath, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    dates = [date for date in partition_values(volumestore, 'date') if date.startswith(year)]
+    signatures = {date: partition_signature(volumestore, date) for date in dates}
+    changed = [date for date in dates if manifest.get(date) != signatures[date]]
+    removed = [date for date in manifest if date not in signatures]
+    affected = {f"{date[:4]}/{date[4:6]}/{date[6:]}" for date in changed + removed}
+
+    if manifest:
+        volume = pd.read_parquet(volumepath)
+        peak = pd.read_parquet(peakpath)
+    else:
+        volume = pd.DataFrame(columns = list(VD_VOLUME_SCHEMA))
+        peak = pd.DataFrame(columns = ['設備代碼', '日期'])
+    if not affected:
+        return volume, peak, []
+
+    updatelog(file=logfile, text = f"INFO: {year}年彙整資料需更新的日期: {', '.join(sorted(changed + removed))}")
+    newvolume = read_partitioned(volumestore, columns = list(VD_VOLUME_SCHEMA), filters = {'date': changed}, schema = VD_VOLUME_SCHEMA)
+    volume = pd.concat([volume[~volume['日期'].isin(affected)], newvolume], ignore_index=True)
+    volume = apply_schema(volume, VD_VOLUME_SCHEMA).sort_values('日期', kind='stable', ignore_index=True)
+
+    # 只重新計算受影響的 (設備代碼, 日期)
+    peak = peak[~peak['日期'].isin(affected)]
+    if len(newvolume):
+        peak = pd.concat([peak, calculate_peak_hour(newvolume)], ignore_index=True) if len(peak) else calculate_peak_hour(newvolume)
+    peak = peak.sort_values(['設備代碼', '日期'], kind='stable', ignore_index=True)
+
+    create_folder(rollupfolder)
+    volume.to_parquet(volumepath, index=False)
+    peak.to_parquet(peakpath, index=False)
+    with open(manifestpath, 'w', encoding='utf-8') as f:
+        json.dump(signatures, f, ensure_ascii=False, indent=1)
+
+    return volume, peak, sorted(changed + removed)
+
+def VDlive (datelist , datatype = 'VD_live', vdlist = None, roadselectlist = None, url = "https://tisvcloud.freeway.gov.tw/history/motc20/VD/", max_workers = 8, rate_limit = None, stream = False, archive = False, parse_workers = None, queue_size = 2, export_csv = False, export_excel = False, resume = False, report = None):
     '''
     VDlive 函數包含下載、解壓縮、過濾、合併等步驟
     
@@ -400,91 +1115,190 @@ def VDlive (datelist , datatype = 'VD_live', vdlist = None, roadselectlist = Non
         datelist (list): 要下載的日期清單，以%Y%M%D的形式list組成。
         datatype (str): 檔案下載後的儲存類型
         vdlist (list):需要過濾的清單
+        url (str): VD 歷史資料的根網址，測試時可指向本機伺服器
+        max_workers (int): 同時下載的數量
+        rate_limit (float, optional): 每秒最多送出的請求數，None 表示不限制
+        stream (bool): 串流模式，下載的 gz 直接在記憶體解壓縮並解析，不產生 壓縮檔 與 xml 暫存檔
+        archive (bool): 串流模式下是否保存原始 gz 檔
+        parse_workers (int, optional): 平行解析 xml 的程序數，預設為 CPU 核心數
+        queue_size (int): 管線各階段之間最多暫存的日期數
+        export_csv (bool): 是否另外輸出 1_merge 的每日 csv (資料一律存於 3_store，csv 維持原始字串的格式，見 vdlive_csv_frame)
+        export_excel (bool): 是否另外輸出 2_excel/正規化分時PCU 的每日 xlsx，年度彙整與尖峰小時的 xlsx 不受影響
+        resume (bool): 接續模式，依每日的下載清單 (manifest.json) 只下載缺少或損毀的檔案 (串流模式需搭配 archive)
+        report (RunReport, optional): 各階段 (download、extract、parse、merge、filter、volume、peak、excel) 的耗時、資料列數、
+                                      讀寫位元組數與記憶體峰值，未提供時存於 datatype/reports/run_時間.json (不做 profile)
+
+    Returns:
+        pd.DataFrame: 每個日期的處理結果摘要 (見 run_pipeline)，執行報告路徑存於 attrs['report']
     
     '''
 
     # datatype = 'VD_live'
-    url = "https://tisvcloud.freeway.gov.tw/history/motc20/VD/" 
     rawdatafolder, mergefolder, excelfolder = VDfolder(datatype=datatype)
-    for date in datelist :
-        year = date[:4]
-        month = date[4:6]
+    livestore = VDstore(datatype, 'vdlive')
+    cleanstore = VDstore(datatype, 'vdlive_5min')
+    volumestore = VDstore(datatype, 'vd_volume')
+    if report is None:
+        report = RunReport()
+    if report.path is None:
+        report.path = os.path.join(create_folder(os.path.join(os.getcwd(), datatype, 'reports')), f"run_{datetime.now():%Y%m%d_%H%M%S}.json")
+
+    def stored(date):
+        # 已入庫，或是舊版流程留下的合併 csv
+        return check_pathexist(os.path.join(livestore, f"date={date}")) or check_pathexist(os.path.join(mergefolder, f"{date}.csv"))
+
+    def download_stage(date, _):
+        if stored(date):
+            return None
+        if stream:
+            # Step1 + Step2 : 串流模式，gz 於記憶體解壓縮後直接解析
+            updatelog(file=logfile, text = f"INFO: 開始串流下載並讀取{date}的{datatype}資料")
+            with report.stage('download', date) as record:
+                frames = download_and_parse_VD(url, date, downloadfolder = rawdatafolder, vdlist = vdlist, archive = archive, max_workers = max_workers, rate_limit = rate_limit, resume = resume, report = report)
+                record['files'] = len(frames)
+            return frames
 
         updatelog(file=logfile, text = f"INFO: 開始下載{date}的{datatype}檔案")
         # Step1 : 下載
-        try:
-            dowloadfilefolder = os.path.join(rawdatafolder, date)
-            dowloadfilefolder = download_and_extract_VD(url, datatype, date, downloadfolder = rawdatafolder, keep = False)
-        except:
-            pass
+        with report.stage('download', date) as record:
+            try:
+                download_and_extract_VD(url, datatype, date, downloadfolder = rawdatafolder, keep = False, max_workers = max_workers, rate_limit = rate_limit, resume = resume, report = report)
+            except Exception as e:
+                updatelog(file=logfile, text = f"ERROR: {date}的{datatype}檔案下載失敗, {e}")
 
-        # Step2 : xml -> csv
-        updatelog(file=logfile, text = f"INFO: 開始下載讀取{date}的{datatype}原始xml檔案")
         dowloadfilefolder = os.path.join(rawdatafolder, date)
-        delete_folders([os.path.join(dowloadfilefolder,'壓縮檔')])
+        if check_pathexist(os.path.join(dowloadfilefolder,'壓縮檔')):
+            delete_folders([os.path.join(dowloadfilefolder,'壓縮檔')])
         updatelog(file=logfile, text = f"INFO: 刪除{date}的{datatype}原始gz壓縮檔案")
+        return dowloadfilefolder
 
-        filelist = findfiles(filefolderpath=dowloadfilefolder, filetype='.xml')
+    def parse_stage(date, downloaded):
+        # Step2 : xml -> 3_store/vdlive
         VDlivemergename = os.path.join(mergefolder, f"{date}.csv")
-        check_path_exist_bool = check_pathexist(VDlivemergename)
-        if check_path_exist_bool == False: # 如果已經有merge過的檔案不重複處理 (怕使用者下載不同時間)
-            updatelog(file=logfile, text = f"INFO: 開始讀取{date}的{datatype}xml資料")
-            VDLive = []
-            for filepath in filelist:
-                # filepath = filelist[0]
-                updatelog(file=logfile, text = f"INFO: 正在讀取{filepath}的xml資料")
-                try:
-                    df = parse_vdlive_xml(filepath)
-                    df = vdlive_preliminary_process(df, vdlist=vdlist)
-                    VDLive.append(df)
-                except:
-                    updatelog(file=logfile, text = f"ERROR: {filepath}原始xml資料出現失誤")
-            VDLive = pd.concat(VDLive, ignore_index=True)
+        if all(check_pathexist(os.path.join(store, f"date={date}")) for store in [livestore, cleanstore, volumestore]):
+            updatelog(file=logfile, text = f"WARN: 資料庫中已將有{date}的完整資料，不進行更新")
+            return None
+        if check_pathexist(os.path.join(livestore, f"date={date}")): # 如果已經有合併過的資料不重複處理 (怕使用者下載不同時間)
+            updatelog(file=logfile, text = f"WARN: 資料庫中已將有{date}的合併資料，不進行更新")
+            with report.stage('parse', date) as record:
+                VDLive = read_partitioned(livestore, columns = VDLIVE_COLUMNS, filters = {'date': [date]}, schema = VDLIVE_SCHEMA)
+                record['rows_out'] = len(VDLive)
+            return VDLive
+
+        if check_pathexist(VDlivemergename):
+            updatelog(file=logfile, text = f"WARN: 資料夾中已將有{date}的合併資料，不進行更新，僅匯入資料庫")
+            with report.stage('parse', date) as record:
+                VDLive = pd.read_csv(VDlivemergename)
+                record['rows_out'] = len(VDLive)
+        else:
+            with report.stage('parse', date) as record:
+                if stream:
+                    VDLive = downloaded  # 串流模式已於下載時解析 (耗時累計於同一階段)
+                else:
+                    updatelog(file=logfile, text = f"INFO: 開始讀取{date}的{datatype}xml資料")
+                    filelist = findfiles(filefolderpath=downloaded, filetype='.xml')
+                    record['files'] = len(filelist)
+                    VDLive = parse_vdlive_files(filelist, vdlist=vdlist, parse_workers=parse_workers)
+                record['rows_out'] = sum(len(df) for df in VDLive)
+            with report.stage('merge', date, rows_in = record['rows_out']):
+                VDLive = concat_categorical(VDLive)
             updatelog(file=logfile, text = f"INFO: {date}dataframe 合併成功")
-            VDLive.to_csv(VDlivemergename, index = False)
-            updatelog(file=logfile, text = f"INFO: {date}資料存於 {VDlivemergename}")
-        else :
-            updatelog(file=logfile, text = f"WARN: 資料夾中已將有{date}的合併資料，不進行更新")
-            VDLive = pd.read_csv(VDlivemergename)
-
-        VDLiveclean = cleanVD(VDLive)
-        updatelog(file=logfile, text = f"INFO: {date}dataframe 轉為五分鐘格式")
-        VDlivecleanfolder = create_folder(os.path.join(mergefolder, '符合原本五分鐘格式'))
-        VDlivecleanname =  os.path.join(VDlivecleanfolder,f'{date}.csv')
-        VDLiveclean.to_csv(VDlivecleanname, index = False)
-        updatelog(file=logfile, text = f"INFO: {date}(轉為五分鐘格式) 存於 {VDlivecleanname}")
+            if export_csv:
+                vdlive_csv_frame(VDLive).to_csv(VDlivemergename, index = False)
+                updatelog(file=logfile, text = f"INFO: {date}資料存於 {VDlivemergename}")
+
+        with report.stage('merge', date) as record:
+            VDLive = apply_schema(VDLive, VDLIVE_SCHEMA)
+            write_partitioned(VDLive.assign(date = date, road = VDLive['VDID'].str.split('-').str[1]), livestore, ['date', 'road'])
+            record['rows_out'] = len(VDLive)
+        updatelog(file=logfile, text = f"INFO: {date}資料存於 {livestore}")
+        return VDLive
+
+    def output_stage(date, VDLive):
+        if VDLive is None:
+            return
+        year = date[:4]
+        month = date[4:6]
 
+        with report.stage('filter', date, rows_in = len(VDLive)) as record:
+            VDLiveclean = apply_schema(cleanVD(VDLive), VDLIVE_5MIN_SCHEMA)
+            updatelog(file=logfile, text = f"INFO: {date}dataframe 轉為五分鐘格式")
+            write_partitioned(VDLiveclean.assign(date = date), cleanstore, ['date'])
+            record['rows_out'] = len(VDLiveclean)
+        updatelog(file=logfile, text = f"INFO: {date}(轉為五分鐘格式) 存於 {cleanstore}")
+        if export_csv:
+            VDlivecleanfolder = create_folder(os.path.join(mergefolder, '符合原本五分鐘格式'))
+            VDlivecleanname =  os.path.join(VDlivecleanfolder,f'{date}.csv')
+            VDLiveclean.to_csv(VDlivecleanname, index = False)
+            updatelog(file=logfile, text = f"INFO: {date}(轉為五分鐘格式) 存於 {VDlivecleanname}")
 
         # Step3 : 統計每個小時通過Volume
-        VDLive = VD_volume(VDLive, roadselectlist)
-        updatelog(file=logfile, text = f"INFO: {date}資料進行正規化")
-        VDvolumecountfolder = create_folder(os.path.join(excelfolder, '正規化分時PCU',year,month))
-        VDexcelname = os.path.join(VDvolumecountfolder, f'{date}.xlsx')
-        VDLive.to_excel(VDexcelname, index=False)
-        updatelog(file=logfile, text = f"INFO: {date}正規化資料輸出於 {VDexcelname}")
-        reformat_excel(VDexcelname)
+        with report.stage('volume', date, rows_in = len(VDLive)) as record:
+            VDLive = apply_schema(VD_volume(VDLive, roadselectlist), VD_VOLUME_SCHEMA)
+            updatelog(file=logfile, text = f"INFO: {date}資料進行正規化")
+            write_partitioned(VDLive.assign(date = date), volumestore, ['date'])
+            record['rows_out'] = len(VDLive)
+        updatelog(file=logfile, text = f"INFO: {date}正規化資料存於 {volumestore}")
+        if export_excel:
+            VDvolumecountfolder = create_folder(os.path.join(excelfolder, '正規化分時PCU',year,month))
+            VDexcelname = os.path.join(VDvolumecountfolder, f'{date}.xlsx')
+            with report.stage('excel', date, rows_in = len(VDLive)):
+                to_excel_formatted(VDLive, VDexcelname)
+            updatelog(file=logfile, text = f"INFO: {date}正規化資料輸出於 {VDexcelname}")
+
+    # Step1 ~ Step3 以管線方式跨日期重疊執行：下載第 N+1 天時同時解析第 N 天、輸出第 N-1 天
+    stages = [('download', download_stage), ('parse', parse_stage), ('output', output_stage)]
+    summary = run_pipeline(datelist, stages, queue_size = queue_size, logfile = logfile)
+    for _, row in summary.iterrows():
+        if row['status'] == 'success':
+            elapsed = sum(row[f'{name}_seconds'] for name, _ in stages)
+            updatelog(file=logfile, text = f"INFO: {row['item']} 處理完成", elapsed = elapsed)
+        else:
+            updatelog(file=logfile, text = f"ERROR: {row['item']} 於 {row['failed_stage']} 階段失敗：{row['error']}")
     
     # Step 4 : 把整個月分進行統計
     lastyear = datetime.now().year - 1
     updatelog(file=logfile, text = f"INFO: 開始整併 {lastyear}年 VD通過量資料")
-    VDvolumecountfolder = create_folder(os.path.join(excelfolder, '正規化分時PCU', str(lastyear)))
-    
-    volume_lastyear = read_combined_dataframe(findfiles(filefolderpath=VDvolumecountfolder, filetype='.xlsx'))
+    # 舊版流程只存成 xlsx 的日期先匯入資料庫
+    storeddates = set(partition_values(volumestore, 'date'))
+    VDvolumecountfolder = os.path.join(excelfolder, '正規化分時PCU', str(lastyear))
+    if check_pathexist(VDvolumecountfolder):
+        for VDexcelname in findfiles(filefolderpath=VDvolumecountfolder, filetype='.xlsx'):
+            date = get_filename(VDexcelname)
+            if date not in storeddates:
+                write_partitioned(pd.read_excel(VDexcelname).assign(date = date), volumestore, ['date'], schema = VD_VOLUME_SCHEMA)
+                updatelog(file=logfile, text = f"INFO: 匯入舊版正規化資料 {VDexcelname}")
+
+    # 年度彙整與尖峰小時 (只針對有變動的日期重新計算，見 update_yearly_rollup) 記錄於 peak 階段
+    with logstage(logfile, 'rollup', f'{lastyear}年 '), report.stage('peak', str(lastyear)) as record:
+        volume_lastyear, peak_lastyear, changed = update_yearly_rollup(volumestore, VDstore(datatype, 'rollup'), lastyear)
+        record['rows_out'] = len(peak_lastyear)
     volumeoutputname = os.path.join(create_folder(os.path.join(excelfolder, '正規化分時PCU', '整合')), f'{lastyear}VD 正規化彙整資料20240413.xlsx')
-    volume_lastyear.to_excel(volumeoutputname, index=False)
-    updatelog(file=logfile, text = f"INFO: {lastyear}年VD通過量資料輸出：{volumeoutputname}")
-    reformat_excel(volumeoutputname)
+    peakoutputname = os.path.join(create_folder(os.path.join(excelfolder, '正規化及尖峰小時')), f'{lastyear}VD 正規化及尖峰小時20240413.xlsx')
+    if not changed and check_pathexist(volumeoutputname) and check_pathexist(peakoutputname):
+        updatelog(file=logfile, text = f"INFO: {lastyear}年VD通過量資料沒有新增日期，不重新輸出")
+    else:
+        with report.stage('excel', str(lastyear), rows_in = len(volume_lastyear) + len(peak_lastyear)):
+            to_excel_formatted(volume_lastyear, volumeoutputname)
+            updatelog(file=logfile, text = f"INFO: {lastyear}年VD通過量資料輸出：{volumeoutputname}")
 
 
-    # Step 5 : 計算尖峰小時PCU
-    updatelog(file=logfile, text = f"INFO: 開使轉換尖峰小時PCU {lastyear}年")
-    volume_lastyear = calculate_peak_hour(volume_lastyear)
-    volumeoutputname = os.path.join(create_folder(os.path.join(excelfolder, '正規化及尖峰小時')), f'{lastyear}VD 正規化及尖峰小時20240413.xlsx')
-    volume_lastyear.to_excel(volumeoutputname, index = False)
-    updatelog(file=logfile, text = f"INFO: 尖峰小時PCU資料輸出為: {volumeoutputname}")
-    reformat_excel(volumeoutputname)
+            # Step 5 : 計算尖峰小時PCU (只針對有變動的日期重新計算，見 update_yearly_rollup)
+            updatelog(file=logfile, text = f"INFO: 開使轉換尖峰小時PCU {lastyear}年")
+            to_excel_formatted(peak_lastyear, peakoutputname)
+            updatelog(file=logfile, text = f"INFO: 尖峰小時PCU資料輸出為: {peakoutputname}")
 
-def main():
+    summary.attrs['report'] = report.save()
+    updatelog(file=logfile, text = f"INFO: 執行報告存於 {summary.attrs['report']}")
+    return summary
+
+def main(resume = False, report = None, profile = None):
+    '''
+    Args:
+        resume (bool): 接續模式，只下載各日期下載清單中缺少或損毀的檔案 (命令列參數 --resume)
+        report (str, optional): 執行報告的輸出路徑 (命令列參數 --report)，預設存於 VD_live/reports
+        profile (str, optional): 'cprofile' 或 'sample'，對每個階段做 profile 並列於報告中 (命令列參數 --profile)
+    '''
     # 0. 定義我們的logfile
     global logfile
     logfile = os.path.join(os.getcwd(), 'VD_logfile.txt')
@@ -494,7 +1308,6 @@ def main():
     vdtable = get_vd()
     updatetime = str(vdtable['UpdateTime'][0])[:10]
     updatelog(file=logfile, text = f"INFO: 下載最新VD靜態資料, 版本更新時間為:{updatetime}. ")
-    reformat_excel(excel_path=os.path.join(os.getcwd(), 'VD', 'VD.xlsx'), allsheet=True)
 
 
 
@@ -527,8 +1340,13 @@ def main():
     # 2-3 需要過濾出來的路線
     # SelectRoad = ['國道1號']
 
-    VDlive(datelist = datelist , datatype = 'VD_live', vdlist = SelectVD)
+    VDlive(datelist = datelist , datatype = 'VD_live', vdlist = SelectVD, resume = resume, report = RunReport(report, profile = profile))
 
 # 執行 main()
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='下載並處理高公局 VD 資料')
+    parser.add_argument('--resume', action='store_true', help='接續先前中斷的下載，只補抓缺少或損毀的檔案')
+    parser.add_argument('--report', help='執行報告 (.json) 的輸出路徑')
+    parser.add_argument('--profile', choices=['cprofile', 'sample'], help='對每個階段做 profile (cProfile 或堆疊取樣) 並列於報告中')
+    args = parser.parse_args()
+    main(resume = args.resume, report = args.report, profile = args.profile)
\ No newline at end of file
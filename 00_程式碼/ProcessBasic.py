@@ -1,13 +1,40 @@
 import pandas as pd
 import os 
+import sys
 import shutil
 import openpyxl
 import numpy as np
+import time
+import queue
+import threading
+import atexit
+import math
+import zipfile
+import json
+import re
+import hashlib
+import posixpath
+import copy
+from xml.sax.saxutils import escape as xml_escape
+from contextlib import contextmanager
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date as _date
 from openpyxl import load_workbook
 from openpyxl.styles import Font, Alignment
 from openpyxl.utils import get_column_letter, column_index_from_string
+from openpyxl.utils.cell import coordinate_from_string
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE, TIME_TYPES, get_time_format
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.datetime import to_excel, WINDOWS_EPOCH, CALENDAR_MAC_1904
+from pandas.api.types import union_categoricals
+
+try:
+    from lxml import etree as lxml_etree  # 有安裝 lxml 時 Excel 大量寫入直接改寫工作表 xml
+except ImportError:
+    lxml_etree = None
 
 # 1. 資料夾路徑相關
 
@@ -207,27 +234,88 @@ def get_filename_withoutprojectname(path, step = 0):
 
 # 2. Excel 資料處理相關
 
-def read_combined_dataframe(file_list):
-    dataframes = []
-    
+READABLE_SUFFIXES = ('.csv', '.shp', '.xls', '.xlsx')
+
+def _read_table(file, columns=None, schema=None):
+    """依副檔名讀取單一檔案，只保留 columns 並套用 schema (交給 process pool 執行，需為模組層級的函式)"""
+    usecols = None
+    if columns is not None:
+        wanted = set(columns)
+        usecols = lambda name: name in wanted
+    # 文字欄位在讀取時就指定型別，避免代碼類欄位 (例如 0 開頭的編號) 先被轉成數字
+    textcols = {column: str for column, dtype in (schema or {}).items()
+                if pd.api.types.is_string_dtype(pd.api.types.pandas_dtype(dtype))} or None
+
+    suffix = file.lower()
+    if suffix.endswith('.csv'):
+        df = pd.read_csv(file, usecols=usecols, dtype=textcols)
+    elif suffix.endswith(('.xls', '.xlsx')):
+        df = pd.read_excel(file, usecols=usecols, dtype=textcols)
+    else:
+        import geopandas as gpd  # 只有讀取 shapefile 時才需要 geopandas
+        df = gpd.read_file(file)
+        if columns is not None:
+            df = df[[column for column in df.columns if column in wanted or column == 'geometry']]
+    return apply_schema(df, schema)
+
+def iter_combined_dataframe(file_list, columns=None, schema=None, max_workers=None, use_processes=None):
+    """
+    依序逐檔回傳 DataFrame，背景最多同時預先讀取 max_workers 個檔案，整批資料不需要同時放在記憶體中。
+
+    Args:
+        file_list (list): 檔案路徑 (.csv / .xls / .xlsx / .shp)。
+        columns (list, optional): 只讀取的欄位，檔案中不存在的欄位會被略過。
+        schema (dict, optional): {欄位名稱: dtype}，規則同 apply_schema。
+        max_workers (int, optional): 同時讀取的檔案數，預設為 CPU 核心數。
+        use_processes (bool, optional): 是否以多個行程讀取；預設有 Excel 檔時使用 (解析 xlsx 受 GIL 限制)，否則使用執行緒。
+
+    Yields:
+        pd.DataFrame: 每個檔案的資料，順序與 file_list 相同；讀取失敗的檔案會印出錯誤後略過。
+    """
+    files = []
     for file in file_list:
-        try:
-            if file.endswith('.csv'):
-                df = pd.read_csv(file)
-            elif file.endswith('.shp'):
-                df = gpd.read_file(file)
-            elif file.endswith(('.xls', '.xlsx')):
-                df = pd.read_excel(file)
-            else:
-                print(f"Unsupported file format: {file}")
+        if file.lower().endswith(READABLE_SUFFIXES):
+            files.append(file)
+        else:
+            print(f"Unsupported file format: {file}")
+    if not files:
+        return
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(files))
+    if use_processes is None:
+        use_processes = len(files) > 1 and any(file.lower().endswith(('.xls', '.xlsx')) for file in files)
+    executor = (ProcessPoolExecutor if use_processes else ThreadPoolExecutor)(max_workers=max_workers)
+    try:
+        remaining = iter(files)
+        pending = deque((file, executor.submit(_read_table, file, columns, schema)) for file in islice(remaining, max_workers))
+        while pending:
+            file, future = pending.popleft()
+            nextfile = next(remaining, None)
+            if nextfile is not None:
+                pending.append((nextfile, executor.submit(_read_table, nextfile, columns, schema)))
+            try:
+                df = future.result()
+            except Exception as e:
+                print(f"Error reading {file}: {e}")
                 continue
-                
-            dataframes.append(df)
-        except Exception as e:
-            print(f"Error reading {file}: {e}")
+            yield df
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def read_combined_dataframe(file_list, columns=None, schema=None, max_workers=None, use_processes=None):
+    """
+    平行讀取多個檔案並合併成一個 DataFrame，參數說明見 iter_combined_dataframe。
+    資料量大到無法一次放進記憶體時，請改用 iter_combined_dataframe 逐檔處理。
+    """
+    dataframes = list(iter_combined_dataframe(file_list, columns=columns, schema=schema,
+                                              max_workers=max_workers, use_processes=use_processes))
+    if not dataframes:
+        return pd.DataFrame(columns=columns)
 
-    # 合併所有 DataFrame
+    # 合併所有 DataFrame (只在最後合併一次)
     combined_df = pd.concat(dataframes, ignore_index=True)
+    if columns is not None:
+        combined_df = combined_df.reindex(columns=[column for column in columns if column in combined_df.columns])
     return combined_df
 
 def move_column(df, column_name, insert_index):
@@ -325,34 +413,30 @@ def clean_excel_data(file_path, sheet_name, start_col='B', start_row=2, axis='ra
         end_row (int): 清除資料的結束列 (如 10)，僅在 axis='range' 時有效。
         verbose (bool): 是否印出清除範圍的訊息 (預設 False)。
     """
-    # 打開 Excel 檔案
-    wb = openpyxl.load_workbook(file_path)
-    sheet = wb[sheet_name]
+    if axis not in ('row', 'col', 'range'):
+        raise ValueError("axis 必須是 'row', 'col', 或 'range'")
 
     # 將欄位轉換成索引
     start_col_index = openpyxl.utils.column_index_from_string(start_col)
     end_col_index = openpyxl.utils.column_index_from_string(end_col) if end_col else start_col_index
 
-    # 清除資料與公式
+    # 先串流掃描資料範圍 (公式也算資料)，超出範圍的儲存格本來就是空白，不需要處理
+    last_row, last_column = find_data_extent(file_path, sheet_name, data_only=False)
+
+    # 清除資料與公式：以空白值整批寫入，保留儲存格格式
     if axis == 'row':  # 清除整列
-        for col in range(1, sheet.max_column + 1):
-            sheet.cell(row=start_row, column=col).value = None
+        rows, startcell = [[None] * last_column], f"A{start_row}"
     elif axis == 'col':  # 清除整欄
-        for row in range(1, sheet.max_row + 1):
-            sheet.cell(row=row, column=start_col_index).value = None
-    elif axis == 'range':  # 清除指定範圍
-        end_row = end_row if end_row else sheet.max_row
-        for row in range(start_row, end_row + 1):
-            for col in range(start_col_index, end_col_index + 1):
-                sheet.cell(row=row, column=col).value = None
-    else:
-        raise ValueError("axis 必須是 'row', 'col', 或 'range'")
-
-    # 儲存檔案
-    wb.save(file_path)
+        rows, startcell = [[None]] * last_row, f"{start_col}1"
+    else:  # 清除指定範圍
+        end_row = end_row if end_row else last_row
+        rows = [[None] * (end_col_index - start_col_index + 1)] * max(min(end_row, last_row) - start_row + 1, 0)
+        startcell = f"{start_col}{start_row}"
+    if rows and rows[0]:
+        bulk_write_excel(file_path, sheet_name, rows, startcell=startcell)
 
     if verbose:
-        print(f"已清除 {sheet_name} 的 {start_col}{start_row} 到 {end_col or start_col}{end_row or sheet.max_row} 範圍的資料與公式！")
+        print(f"已清除 {sheet_name} 的 {start_col}{start_row} 到 {end_col or start_col}{end_row or last_row} 範圍的資料與公式！")
 
 def save_to_excel_multiplesheet(dflists, folder, filename, sheetnamelist):
     """
@@ -425,9 +509,336 @@ def write_to_excel(excelpath, sheetname, cell, value, verbose = False):
     if verbose:
         print(f"✅ 在 '{sheetname}' 的 {cell} 填入 '{value}'")
 
+XLSX_MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+XLSX_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+class ExcelFastPathError(Exception):
+    """bulk_write_excel 無法直接改寫 xml 時 (例如含時區的日期、共用公式) 使用，會改用 openpyxl 寫入"""
+
+def split_cell(cell):
+    """把 'B5' 轉成 (列, 欄索引)，例如 (5, 2)"""
+    col_letter, row_number = coordinate_from_string(cell)
+    return row_number, column_index_from_string(col_letter)
+
+def dataframe_rows(df, title=False):
+    """把 DataFrame 轉成 Python 原生型別的 list of list，title=True 時第一列為欄位名稱"""
+    rows = df.to_numpy(dtype=object).tolist()
+    return [list(df.columns)] + rows if title else rows
+
+def is_blank(value):
+    return value is None or value is pd.NA or value is pd.NaT or (isinstance(value, float) and math.isnan(value))
+
+def _workbook_parts(zf):
+    """回傳 workbook.xml.rels 中的 {Id: (關聯類型, 在壓縮檔中的路徑)}"""
+    parts = {}
+    for rel in lxml_etree.fromstring(zf.read('xl/_rels/workbook.xml.rels')):
+        target = rel.get('Target')
+        path = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+        parts[rel.get('Id')] = (rel.get('Type', '').rsplit('/', 1)[-1], path)
+    return parts
+
+def _find_sheet_xml(zf, sheet_name):
+    """回傳工作表在 xlsx 壓縮檔中的 xml 路徑，找不到時回傳 None"""
+    workbook = lxml_etree.fromstring(zf.read('xl/workbook.xml'))
+    rid = None
+    for sheet in workbook.iter(f'{{{XLSX_MAIN_NS}}}sheet'):
+        if sheet.get('name') == sheet_name:
+            rid = sheet.get(f'{{{XLSX_REL_NS}}}id')
+    if rid is None or rid not in _workbook_parts(zf):
+        return None
+    return _workbook_parts(zf)[rid][1]
+
+class _XlsxDateStyles:
+    """
+    把日期與時間寫成 Excel 序列值時使用的儲存格樣式 (styles.xml 的 cellXfs)，規則與 openpyxl 相同：
+    儲存格原本的數值格式已是日期格式時沿用，否則複製原本的樣式並改成該型別的預設格式 (例如 yyyy-mm-dd h:mm:ss)。
+    """
+    def __init__(self, stylesxml, date1904=False):
+        ns = XLSX_MAIN_NS
+        self.epoch = CALENDAR_MAC_1904 if date1904 else WINDOWS_EPOCH
+        self.root = lxml_etree.fromstring(stylesxml)
+        self.cellxfs = self.root.find(f'{{{ns}}}cellXfs')
+        if self.cellxfs is None:
+            raise ExcelFastPathError("styles.xml 中沒有 cellXfs")
+        self.numfmts = self.root.find(f'{{{ns}}}numFmts')
+        self.formats = dict(BUILTIN_FORMATS)
+        for numfmt in (self.numfmts if self.numfmts is not None else []):
+            self.formats[int(numfmt.get('numFmtId'))] = numfmt.get('formatCode')
+        self.styles = {}  # {(原樣式, 格式): 新樣式}
+        self.changed = False
+
+    def serial(self, value):
+        """日期或時間的 Excel 序列值"""
+        if getattr(value, 'tzinfo', None) is not None:
+            raise ExcelFastPathError("Excel 不支援含時區的日期")  # 交給 openpyxl 拋出原本的錯誤
+        return to_excel(value, self.epoch)
+
+    def style(self, base, value):
+        """寫入 value 後儲存格的樣式編號 (字串，None 表示不需要 s 屬性)，base 為儲存格原本的樣式編號"""
+        code = get_time_format(type(value))
+        key = (base, code)
+        if key not in self.styles:
+            index = int(base) if base is not None else 0
+            xf = self.cellxfs[index] if index < len(self.cellxfs) else None
+            if xf is not None and is_date_format(self.formats.get(int(xf.get('numFmtId', 0)))):
+                self.styles[key] = base
+            else:
+                if xf is None:
+                    xf = lxml_etree.Element(f'{{{XLSX_MAIN_NS}}}xf', numFmtId='0', fontId='0', fillId='0', borderId='0', xfId='0')
+                xf = copy.deepcopy(xf)
+                xf.set('numFmtId', str(self._format_id(code)))
+                xf.set('applyNumberFormat', '1')
+                self.cellxfs.append(xf)
+                self.cellxfs.set('count', str(len(self.cellxfs)))
+                self.styles[key] = str(len(self.cellxfs) - 1)
+                self.changed = True
+        return self.styles[key]
+
+    def _format_id(self, code):
+        """數值格式的編號，內建與既有格式直接沿用，否則新增自訂格式 (編號從 164 起)"""
+        for fmtid, fmtcode in self.formats.items():
+            if fmtcode == code:
+                return fmtid
+        if self.numfmts is None:
+            self.numfmts = lxml_etree.Element(f'{{{XLSX_MAIN_NS}}}numFmts')
+            self.root.insert(0, self.numfmts)  # numFmts 必須是 styleSheet 的第一個子元素
+        fmtid = max([163] + list(self.formats)) + 1
+        lxml_etree.SubElement(self.numfmts, f'{{{XLSX_MAIN_NS}}}numFmt', numFmtId=str(fmtid), formatCode=code)
+        self.numfmts.set('count', str(len(self.numfmts)))
+        self.formats[fmtid] = code
+        return fmtid
+
+    def tostring(self):
+        return lxml_etree.tostring(self.root, xml_declaration=True, encoding='UTF-8', standalone=True)
+
+def _clear_cell(cell):
+    """清除儲存格的值與公式，保留位置與格式"""
+    style = cell.get('s')
+    ref = cell.get('r')
+    for child in list(cell):
+        if child.tag == f'{{{XLSX_MAIN_NS}}}f' and child.get('t') == 'shared' and child.get('ref'):
+            raise ExcelFastPathError(f"{ref} 為共用公式的來源儲存格")
+        cell.remove(child)
+    cell.attrib.clear()
+    cell.set('r', ref)
+    if style is not None:
+        cell.set('s', style)
+
+def _number_text(value):
+    """
+    數值寫入 xml 的文字：浮點數用 repr (可完整還原的最短位數，整數值不加 .0)，整數寫出全部位數，
+    NaN 與無限大為空字串。openpyxl 的 safe_string 只保留 16 位有效數字，例如 0.1+0.2 會變成 0.3。
+    """
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            return ''
+        text = repr(float(value))
+        return text[:-2] if text.endswith('.0') else text
+    return str(int(value))
+
+def _set_cell_value(cell, value, styles=None):
+    """
+    依照 openpyxl 的規則寫入儲存格：數值、布林、字串 (inline string)、以 = 開頭的字串為公式，
+    日期與時間寫成序列值並依 styles (_XlsxDateStyles) 設定日期格式。
+    """
+    ns = XLSX_MAIN_NS
+    _clear_cell(cell)
+    if isinstance(value, bool):
+        cell.set('t', 'b')
+        lxml_etree.SubElement(cell, f'{{{ns}}}v').text = '1' if value else '0'
+    elif isinstance(value, (int, float)):
+        lxml_etree.SubElement(cell, f'{{{ns}}}v').text = _number_text(value)
+    elif isinstance(value, str):
+        if value.startswith('=') and len(value) > 1:
+            lxml_etree.SubElement(cell, f'{{{ns}}}f').text = value[1:]
+        else:
+            cell.set('t', 'inlineStr')
+            text = lxml_etree.SubElement(lxml_etree.SubElement(cell, f'{{{ns}}}is'), f'{{{ns}}}t')
+            text.text = value
+            if value != value.strip():
+                text.set('{http://www.w3.org/XML/1998/namespace}space', 'preserve')
+    elif isinstance(value, TIME_TYPES) and styles is not None:
+        serial = styles.serial(value)
+        style = styles.style(cell.get('s'), value)
+        if style is not None:
+            cell.set('s', style)
+        lxml_etree.SubElement(cell, f'{{{ns}}}v').text = _number_text(serial)
+    else:
+        raise ExcelFastPathError(f"不支援的型別 {type(value).__name__}")
+
+def _cell_xml(ref, value, styles=None):
+    """產生單一儲存格的 xml 字串 (空白值回傳空字串)，規則與 _set_cell_value 相同"""
+    kind = type(value)
+    if kind is float or kind is int:
+        if value != value:
+            return ''
+        return f'<c r="{ref}"><v>{_number_text(value)}</v></c>'  # 與 openpyxl 相同，無限大寫成空值
+    if kind is str:
+        if ILLEGAL_CHARACTERS_RE.search(value):
+            raise ExcelFastPathError("資料中有無法寫入 xml 的字元")
+        if value.startswith('=') and len(value) > 1:
+            return f'<c r="{ref}"><f>{xml_escape(value[1:])}</f></c>'
+        return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{xml_escape(value)}</t></is></c>'
+    if kind is bool:
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if is_blank(value):
+        return ''
+    if isinstance(value, TIME_TYPES) and styles is not None:
+        serial = styles.serial(value)
+        style = styles.style(None, value)
+        style = f' s="{style}"' if style is not None else ''
+        return f'<c r="{ref}"{style}><v>{_number_text(serial)}</v></c>'
+    # numpy 純量或子類別轉成 Python 原生型別
+    for basetype, numpytype in ((bool, np.bool_), (int, np.integer), (float, np.floating), (str, np.str_)):
+        if isinstance(value, (basetype, numpytype)):
+            return _cell_xml(ref, basetype(value), styles)
+    raise ExcelFastPathError(f"不支援的型別 {kind.__name__}")
+
+def _write_sheet_xml(sheetxml, rows, start_row, start_col, clear, styles=None):
+    """
+    在工作表 xml 的 sheetData 中寫入 rows，其他儲存格 (公式、格式) 不變；clear=True 時先清空所有列。
+    原本不存在的列直接組成 xml 字串後一次解析，已存在的列才逐格合併。styles 為 _XlsxDateStyles，
+    為 None 時遇到日期拋出 ExcelFastPathError。
+    """
+    ns = XLSX_MAIN_NS
+    root = lxml_etree.fromstring(sheetxml)
+    sheetdata = root.find(f'{{{ns}}}sheetData')
+    if clear:
+        del sheetdata[:]
+
+    existing = {int(row.get('r')): row for row in sheetdata if row.get('r')}
+    if len(existing) != len(sheetdata):
+        raise ExcelFastPathError("工作表中有沒有列號的列")
+    lastrow = max(existing, default=0)
+
+    letters = [get_column_letter(start_col + i) for i in range(max((len(row) for row in rows), default=0))]
+    newrows = []
+    for offset, values in enumerate(rows):
+        number = start_row + offset
+        row = existing.get(number)
+        if row is None:
+            cells = ''.join([_cell_xml(f'{letter}{number}', value, styles) for letter, value in zip(letters, values)])
+            newrows.append(f'<row r="{number}">{cells}</row>')
+            continue
+
+        # 已存在的列：逐格合併，保留原本的格式
+        row.attrib.pop('spans', None)
+        cells = {cell.get('r'): cell for cell in row}
+        added = False
+        for letter, value in zip(letters, values):
+            ref = f'{letter}{number}'
+            cell = cells.get(ref)
+            if is_blank(value):
+                if cell is not None:
+                    _clear_cell(cell)
+                continue
+            if cell is None:
+                cell = lxml_etree.SubElement(row, f'{{{ns}}}c', r=ref)
+                added = True
+            _set_cell_value(cell, value, styles)
+        if added and len(cells):
+            row[:] = sorted(row, key=lambda cell: split_cell(cell.get('r'))[1])
+
+    # 新的列都在原有資料之後時，直接把 xml 字串接在 sheetData 最後，不再解析
+    marker = None
+    if newrows and start_row > lastrow:
+        marker = lxml_etree.Comment('bulk_write_excel')
+        sheetdata.append(marker)
+    elif newrows:
+        fragment = lxml_etree.fromstring(f'<sheetData xmlns="{ns}">' + ''.join(newrows) + '</sheetData>')
+        sheetdata.extend(fragment)
+        sheetdata[:] = sorted(sheetdata, key=lambda row: int(row.get('r')))
+
+    # 更新資料範圍
+    dimension = root.find(f'{{{ns}}}dimension')
+    if dimension is not None:
+        maxrow = max(list(existing) + ([start_row + len(rows) - 1] if rows else []), default=0)
+        maxcol = max([split_cell(row[-1].get('r'))[1] for row in sheetdata if len(row) and row.tag == f'{{{ns}}}row'] + ([start_col + len(letters) - 1] if newrows else []), default=0)
+        dimension.set('ref', f"A1:{get_column_letter(maxcol)}{maxrow}" if maxcol and maxrow else 'A1')
+
+    xml = lxml_etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+    if marker is not None:
+        xml = xml.replace(b'<!--bulk_write_excel-->', ''.join(newrows).encode('utf-8'), 1)
+    return xml
+
+def bulk_write_excel(excelpath, sheet_name, rows, startcell='A1', clear=False):
+    """
+    把 rows (list of list) 從 startcell 開始整批寫入既有 Excel 的指定工作表，其他工作表、公式與格式維持不變。
+
+    有安裝 lxml 時直接改寫 xlsx 中該工作表的 xml，不經過 openpyxl 逐格建立物件，速度約快一個數量級；
+    寫入後 Excel 開啟時會重新計算公式。日期與時間和 openpyxl 一樣寫成序列值並套用日期格式；
+    遇到含時區的日期等無法直接寫入的值時改用 openpyxl 寫入。
+
+    Args:
+        excelpath (str): Excel 檔案路徑。
+        sheet_name (str): 工作表名稱，不存在時拋出 KeyError。
+        rows (list): 每個元素為一列的值，None / NaN 表示空白。
+        startcell (str): 起始儲存格，例如 'B2'。
+        clear (bool): 是否先清空整個工作表。
+    """
+    start_row, start_col = split_cell(startcell)
+    if lxml_etree is not None:
+        try:
+            _bulk_write_xml(excelpath, sheet_name, rows, start_row, start_col, clear)
+            return
+        except ExcelFastPathError:
+            pass
+
+    wb = load_workbook(excelpath)
+    if sheet_name not in wb.sheetnames:
+        wb.close()
+        raise KeyError(sheet_name)
+    ws = wb[sheet_name]
+    if clear:
+        ws.delete_rows(1, ws.max_row)
+    for r_idx, values in enumerate(rows, start=start_row):
+        for c_idx, value in enumerate(values, start=start_col):
+            ws.cell(row=r_idx, column=c_idx, value=None if is_blank(value) else value)
+    wb.save(excelpath)
+    wb.close()
+
+def _bulk_write_xml(excelpath, sheet_name, rows, start_row, start_col, clear):
+    with zipfile.ZipFile(excelpath) as src:
+        sheetpath = _find_sheet_xml(src, sheet_name)
+        if sheetpath is None:
+            raise KeyError(sheet_name)
+        styles = None
+        stylespath = next((path for kind, path in _workbook_parts(src).values() if kind == 'styles'), None)
+        if stylespath in src.namelist():
+            workbookpr = lxml_etree.fromstring(src.read('xl/workbook.xml')).find(f'{{{XLSX_MAIN_NS}}}workbookPr')
+            date1904 = workbookpr is not None and workbookpr.get('date1904') in ('1', 'true')
+            styles = _XlsxDateStyles(src.read(stylespath), date1904)
+        newsheet = _write_sheet_xml(src.read(sheetpath), rows, start_row, start_col, clear, styles)
+
+        tmppath = excelpath + '.tmp'
+        with zipfile.ZipFile(tmppath, 'w', zipfile.ZIP_DEFLATED) as dst:
+            for info in src.infolist():
+                if info.filename == 'xl/calcChain.xml':
+                    continue  # 計算鏈交給 Excel 重建
+                data = src.read(info)
+                if info.filename == sheetpath:
+                    data = newsheet
+                elif info.filename == stylespath and styles.changed:
+                    data = styles.tostring()
+                elif info.filename == 'xl/workbook.xml':
+                    root = lxml_etree.fromstring(data)
+                    calcpr = root.find(f'{{{XLSX_MAIN_NS}}}calcPr')
+                    if calcpr is None:
+                        calcpr = lxml_etree.SubElement(root, f'{{{XLSX_MAIN_NS}}}calcPr')
+                    calcpr.set('fullCalcOnLoad', '1')
+                    data = lxml_etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+                elif info.filename in ('[Content_Types].xml', 'xl/_rels/workbook.xml.rels'):
+                    root = lxml_etree.fromstring(data)
+                    for child in list(root):
+                        if 'calcChain' in (child.get('PartName') or child.get('Target') or ''):
+                            root.remove(child)
+                    data = lxml_etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+                dst.writestr(info, data)
+    os.replace(tmppath, excelpath)
+
 def clean_and_paste(excelpath, sheet_name, df, startcell, title=True, verbose = False):
     """
-    清空指定 Excel 工作表的內容，並將 df 從 startcell 開始寫入。
+    清空指定 Excel 工作表的內容，並將 df 從 startcell 開始寫入 (整批寫入，見 bulk_write_excel)。
 
     參數:
     - excelpath (str): Excel 檔案路徑
@@ -437,37 +848,12 @@ def clean_and_paste(excelpath, sheet_name, df, startcell, title=True, verbose =
     - title (bool): 是否寫入欄位名稱 (預設 True)
     - verbose(Bool) : 是的話則會印出完成指定字串。
     """
-    # 讀取 Excel
-    wb = load_workbook(excelpath)
-
-    if sheet_name not in wb.sheetnames:
+    try:
+        bulk_write_excel(excelpath, sheet_name, dataframe_rows(df, title=title), startcell=startcell, clear=True)
+    except KeyError:
         print(f"工作表 '{sheet_name}' 不存在！")
         return
-    
-    ws = wb[sheet_name]
-
-    # 清空工作表 (移除所有內容)
-    ws.delete_rows(1, ws.max_row)
-
-    # 解析 startcell (A1 轉換成 row=1, col=1)
-    col_letter = ''.join(filter(str.isalpha, startcell))  # 提取字母部分 (欄)
-    row_number = int(''.join(filter(str.isdigit, startcell)))  # 提取數字部分 (列)
-    start_col = column_index_from_string(col_letter)  # 轉換 A → 1, B → 2
-
-    # 如果 title=True，先寫入欄位名稱
-    if title:
-        for c_idx, col_name in enumerate(df.columns, start=start_col):
-            ws.cell(row=row_number, column=c_idx, value=col_name)
-        row_number += 1  # 資料從下一列開始
 
-    # 使用 openpyxl 方式將 DataFrame 寫入 (避免影響其他工作表)
-    for r_idx, row in enumerate(df.to_numpy(), start=row_number):
-        for c_idx, value in enumerate(row, start=start_col):
-            ws.cell(row=r_idx, column=c_idx, value=value)
-    
-    # 儲存 Excel
-    wb.save(excelpath)
-    wb.close()
     if verbose:
         print(f"資料已寫入 {sheet_name}，起始位置：{startcell} (標題: {title})")
 
@@ -478,23 +864,86 @@ def paste_data_to_excel(file_path, sheet_name, data, start_col='B', start_row=2)
     Args:
         file_path (str): Excel 檔案路徑。
         sheet_name (str): 工作表名稱。
-        data (list): 要貼上的資料 (每個元素代表一列)。
+        data (list 或 pd.DataFrame): 要貼上的資料。一維 list 貼成單一欄；list of list 或 DataFrame
+                                     (不含欄位名稱) 從 start_col 開始貼成多欄，只需開關檔案一次。
         start_col (str): 貼上資料的起始欄 (如 'B')。
         start_row (int): 貼上資料的起始列 (預設從第 2 列開始)。
     """
-    # 打開 Excel 檔案
-    wb = openpyxl.load_workbook(file_path)
-    sheet = wb[sheet_name]
+    if isinstance(data, pd.DataFrame):
+        rows = dataframe_rows(data)
+    elif isinstance(data, pd.Series):
+        rows = [[value] for value in data.tolist()]
+    else:
+        rows = [list(value) if isinstance(value, (list, tuple)) else [value] for value in data]
+    bulk_write_excel(file_path, sheet_name, rows, startcell=f"{start_col}{start_row}")
+
+def iter_sheet_rows(excelpath, sheet_name=None, min_row=1, max_row=None, min_col=1, max_col=None, data_only=True):
+    '''
+    以唯讀模式逐列串流讀取工作表的值，不會把整個活頁簿的儲存格物件載入記憶體，適合數十萬列的大型工作表。
 
-    # 將起始欄字母轉換為索引
-    col_index = openpyxl.utils.column_index_from_string(start_col)
+    Args:
+        excelpath (str): Excel 檔案路徑。
+        sheet_name (str, optional): 工作表名稱，沒有填寫的話會讀取第一個分頁。
+        min_row, max_row, min_col, max_col (int, optional): 讀取範圍 (欄位為數字索引)，未指定上限時讀到資料結尾。
+        data_only (bool): True 時公式儲存格回傳上次計算的結果，False 時回傳公式字串。
 
-    # 貼資料到指定欄
-    for i, value in enumerate(data, start=start_row):
-        sheet.cell(row=i, column=col_index, value=value)
+    Yields:
+        tuple: 每一列的值 (從 min_row 開始，中間沒有資料的列也會回傳)，空白儲存格為 None。
+    '''
+    wb = openpyxl.load_workbook(excelpath, read_only=True, data_only=data_only)
+    try:
+        sheet = wb[sheet_name] if sheet_name else wb.worksheets[0]
+        # 不依賴檔案中記錄的 dimension，有些程式產生的檔案此值不正確
+        sheet.reset_dimensions()
+        yield from sheet.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col, values_only=True)
+    finally:
+        wb.close()
 
-    # 儲存檔案
-    wb.save(file_path)
+def find_data_extent(excelpath, sheet_name=None, data_only=True):
+    '''
+    掃描一次工作表，找出最後一個有值的列與欄 (數字索引)，沒有資料時回傳 (0, 0)。
+
+    Args:
+        excelpath (str): Excel 檔案路徑。
+        sheet_name (str, optional): 工作表名稱，沒有填寫的話會讀取第一個分頁。
+        data_only (bool): False 時沒有快取結果的公式儲存格也算有資料。
+    '''
+    last_row = last_column = 0
+    for number, values in enumerate(iter_sheet_rows(excelpath, sheet_name, data_only=data_only), start=1):
+        # 從每列最後面往前找第一個非空白的儲存格
+        for idx in range(len(values) - 1, -1, -1):
+            if values[idx] is not None:
+                last_row = number
+                last_column = max(last_column, idx + 1)
+                break
+    return last_row, last_column
+
+def find_value_runs(values, start_row=1, min_length=2):
+    '''
+    找出連續且內容相同的區段 (例如要合併的儲存格)，只需依序走過一次 values。
+
+    Args:
+        values (iterable): 依列排列的值。
+        start_row (int): values 第一個值所在的列號。
+        min_length (int): 區段最少要有幾列才回傳。
+
+    Returns:
+        list: (起始列, 結束列, 值) 的列表。
+    '''
+    runs = []
+    run_start = start_row
+    current = None
+    number = start_row - 1
+    for number, value in enumerate(values, start=start_row):
+        if number == start_row:
+            current = value
+        elif value != current:
+            if number - run_start >= min_length:
+                runs.append((run_start, number - 1, current))
+            run_start, current = number, value
+    if number - run_start + 1 >= min_length:
+        runs.append((run_start, number, current))
+    return runs
 
 def find_last_cell(excelpath, sheet_name=None):
     '''
@@ -504,26 +953,11 @@ def find_last_cell(excelpath, sheet_name=None):
         excelpath (str): Excel 檔案路徑。
         sheet_name (str, optional): 工作表名稱，沒有填寫的話會讀取第一個分頁。
     '''
-    # 開啟 Excel 檔案
-    workbook = openpyxl.load_workbook(excelpath, data_only=True)
-    
-    # 如果沒提供 sheet_name，預設使用第一個工作表
-    sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
-    
-    # 找最後有資料的列
-    last_row = sheet.max_row
-    while last_row > 0 and all(sheet.cell(row=last_row, column=col).value is None for col in range(1, sheet.max_column + 1)):
-        last_row -= 1
-    
-    # 找最後有資料的欄
-    last_column = sheet.max_column
-    while last_column > 0 and all(sheet.cell(row=row, column=last_column).value is None for row in range(1, sheet.max_row + 1)):
-        last_column -= 1
-    
+    # 以串流方式掃描一次，同時找出最後有資料的列與欄
+    last_row, last_column = find_data_extent(excelpath, sheet_name)
+
     # 把欄數轉成Excel字母
     last_column_letter = get_column_letter(last_column)
-    
-    workbook.close()
     return last_row, last_column_letter
 
 def reformat_excel(excel_path, sheetname=None, allsheet=False, selectfont="微軟正黑體", fontsize=12):
@@ -571,6 +1005,68 @@ def reformat_excel(excel_path, sheetname=None, allsheet=False, selectfont="微
     # 儲存 Excel 文件
     wb.save(excel_path)
 
+def _excel_text(value):
+    """
+    儲存格由 xlsxwriter 寫入、reformat_excel 以 openpyxl 讀回後 str(cell.value) 的文字：
+    空白為 'None'，日期讀回為 datetime (YYYY-MM-DD HH:MM:SS)，時間長度為天數，數值只保留 16 位有效數字
+    """
+    if is_blank(value):
+        return 'None'
+    if isinstance(value, (bool, np.bool_)):
+        return str(bool(value))
+    if isinstance(value, datetime):
+        return str(value)
+    if isinstance(value, _date):
+        return str(datetime(value.year, value.month, value.day))
+    if isinstance(value, timedelta):
+        value = value / timedelta(days=1)
+    if isinstance(value, (int, float, np.number)):
+        text = f'{value:.16G}'
+        return str(float(text)) if '.' in text or 'E' in text else text
+    return str(value)
+
+def excel_column_widths(df, index=False):
+    """依 reformat_excel 的規則 ((最長文字長度 + 2) * 1.3) 計算 DataFrame 輸出後各欄的欄寬，標題列也列入計算
+    Args:
+        df (pd.DataFrame): 要輸出的資料。
+        index (bool): 是否一併輸出 index。
+    Returns:
+        list: 依輸出欄位順序排列的欄寬。
+    """
+    if index:
+        df = df.reset_index()
+    widths = []
+    for column in df.columns:
+        max_length = len(str(column))
+        if len(df):
+            max_length = max(max_length, int(df[column].map(_excel_text).str.len().max()))
+        widths.append((max_length + 2) * 1.3)
+    return widths
+
+def to_excel_formatted(df, excel_path, sheet_name='Sheet1', index=False, selectfont="微軟正黑體", fontsize=12):
+    """輸出 Excel 並在寫入時一併設定欄寬與字體，取代 to_excel 後再呼叫 reformat_excel 重新讀檔存檔的流程
+    字體設定為活頁簿的預設格式，所有儲存格共用同一個樣式。
+    Args:
+        df (pd.DataFrame or dict): 要輸出的資料，多個工作表時傳入 {工作表名稱: DataFrame}。
+        excel_path (str): 輸出檔案的完整路徑。
+        sheet_name (str, optional): df 為單一 DataFrame 時的工作表名稱。
+        index (bool, optional): 是否輸出 index。
+        selectfont (str) : 字體。
+        fontsize (int) : 字體大小。
+    """
+    sheets = df if isinstance(df, dict) else {sheet_name: df}
+    options = {'default_format_properties': {'font_name': selectfont, 'font_size': fontsize}}
+    with pd.ExcelWriter(excel_path, engine='xlsxwriter', engine_kwargs={'options': options}) as writer:
+        for sheet, data in sheets.items():
+            if index:
+                data = data.reset_index()
+            # 標題列另外寫入，避免 pandas 套用粗體框線的標題格式 (與 reformat_excel 的結果一致)
+            data.to_excel(writer, sheet_name=sheet, index=False, header=False, startrow=1)
+            ws = writer.sheets[sheet]
+            ws.write_row(0, 0, [str(column) for column in data.columns])
+            for colidx, width in enumerate(excel_column_widths(data)):
+                ws.set_column(colidx, colidx, width)
+
 def merge_column_data(excel_path, sheet_name, columns, start_row=2, replace=True):
     """
     合併 Excel 指定欄位中相鄰且內容相同的儲存格，並進行跨欄置中對齊。
@@ -593,35 +1089,21 @@ def merge_column_data(excel_path, sheet_name, columns, start_row=2, replace=True
 
     sheet = wb[sheet_name]
 
-    # 獲取總行數
-    max_row = sheet.max_row
-
+    # 找到各欄位的索引
+    header = next(sheet.iter_rows(min_row=1, max_row=1, values_only=True), ())
     for col in columns:
-        col_index = None
-        # 找到對應欄位的索引
-        for i, cell in enumerate(sheet[1], start=1):
-            if cell.value == col:
-                col_index = i
-                break
-        
-        if col_index is None:
+        if col not in header:
             print(f"找不到欄位 {col}")
             continue
+        col_index = header.index(col) + 1
 
-        # 開始合併相同內容的儲存格
-        merge_start = start_row  # 設定合併起點
-        for row in range(start_row + 1, max_row + 2):  # 從 start_row+1 行開始比對
-            current_value = sheet.cell(row=merge_start, column=col_index).value
-            next_value = sheet.cell(row=row, column=col_index).value
-
-            if current_value != next_value or row > max_row:
-                if row - merge_start > 1:
-                    sheet.merge_cells(start_row=merge_start, start_column=col_index, 
-                                      end_row=row-1, end_column=col_index)
-                    merged_cell = sheet.cell(row=merge_start, column=col_index)
-                    merged_cell.alignment = Alignment(horizontal="center", vertical="center")
-                
-                merge_start = row  # 更新起始行數
+        # 每欄只依序讀一次值，找出相鄰且內容相同的區段後合併
+        values = next(sheet.iter_cols(min_col=col_index, max_col=col_index, min_row=start_row, max_row=sheet.max_row, values_only=True), ())
+        for merge_start, merge_end, _ in find_value_runs(values, start_row=start_row):
+            sheet.merge_cells(start_row=merge_start, start_column=col_index,
+                              end_row=merge_end, end_column=col_index)
+            merged_cell = sheet.cell(row=merge_start, column=col_index)
+            merged_cell.alignment = Alignment(horizontal="center", vertical="center")
 
     # 儲存 Excel 檔案
     if replace:
@@ -633,23 +1115,16 @@ def merge_column_data(excel_path, sheet_name, columns, start_row=2, replace=True
         print(f"合併完成，已另存為：{new_excel_path}")
 
 def excel_addnewsheet(excelpath, df, sheet_name="Sheet1", startcell="A1"):
-    # Load the existing Excel file
+    """
+    在既有 Excel 新增工作表，並將 df (不含欄位名稱) 從 startcell 開始寫入，第一筆資料位於 startcell 所在列。
+    """
+    # 建立新的空白工作表後再整批寫入資料
     wb = load_workbook(excelpath)
-
-    # Create a new sheet
-    ws = wb.create_sheet(title=sheet_name)
-
-    # Convert the start cell to row and column indices
-    start_row = int(startcell[1:])
-    start_col = ord(startcell[0].upper()) - ord('A') + 1
-
-    # Write DataFrame to the sheet starting at the specified cell
-    for row_idx, row in df.iterrows():
-        for col_idx, value in enumerate(row, start=start_col):
-            ws.cell(row=row_idx + start_row - 1, column=col_idx, value=value)
-
-    # Save the workbook after adding the new sheet
+    wb.create_sheet(title=sheet_name)
     wb.save(excelpath)
+    wb.close()
+
+    bulk_write_excel(excelpath, sheet_name, dataframe_rows(df), startcell=startcell)
 
 def read_specific_data(excelfilepath, sheetname, cell):
     """
@@ -667,14 +1142,295 @@ def read_specific_data(excelfilepath, sheetname, cell):
     ws = wb[sheetname]
     return ws[cell].value
 
+# 2-1. 欄式資料儲存 (Parquet) 相關
+
+def apply_schema(df, schema=None):
+    """
+    依照 schema 轉換欄位型別，schema 中不存在於 df 的欄位會被略過
+
+    Parameters:
+        df (pd.DataFrame): 要轉換的資料
+        schema (dict): {欄位名稱: dtype}，數值欄位無法轉換的值會變成空值，
+                       整數欄位若有空值則改用可為空值的整數型別 (例如 Int64)；
+                       時間欄位 (例如 'datetime64[ns, Asia/Taipei]') 由字串或其他時區轉換，
+                       沒有時區的時間視為該時區的當地時間
+
+    Returns:
+        pd.DataFrame: 轉換後的資料，所有欄位型別都已符合時直接回傳原本的 df (不複製)
+    """
+    if not schema:
+        return df
+    dtypes = {column: pd.api.types.pandas_dtype(dtype) for column, dtype in schema.items() if column in df.columns}
+    dtypes = {column: dtype for column, dtype in dtypes.items()
+              if df[column].dtype != dtype and not (dtype == 'category' and isinstance(df[column].dtype, pd.CategoricalDtype))}
+    if not dtypes:
+        return df
+    df = df.copy()
+    for column, dtype in dtypes.items():
+        if isinstance(dtype, np.dtype) and dtype.kind in 'iuf':
+            values = pd.to_numeric(df[column], errors='coerce')
+            if dtype.kind in 'iu' and values.isna().any():
+                dtype = dtype.name.capitalize()
+            df[column] = values.astype(dtype)
+        elif isinstance(dtype, pd.DatetimeTZDtype) or (isinstance(dtype, np.dtype) and dtype.kind == 'M'):
+            values = pd.to_datetime(df[column], errors='coerce')
+            tz = getattr(dtype, 'tz', None)
+            if tz is not None:
+                values = values.dt.tz_localize(tz) if values.dt.tz is None else values.dt.tz_convert(tz)
+            elif values.dt.tz is not None:
+                values = values.dt.tz_localize(None) # 保留當地時間
+            df[column] = values.astype(dtype)
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+def concat_categorical(frames):
+    """
+    合併多個 DataFrame，類別欄位合併類別後仍維持 category (pd.concat 遇到不同類別會轉成 object)
+
+    Parameters:
+        frames (list): 欄位相同的 DataFrame，所有 DataFrame 都是 category 的欄位才以合併類別的方式處理
+
+    Returns:
+        pd.DataFrame: 合併後的資料 (索引重新編號)，合併後的類別依排序排列
+    """
+    frames = list(frames)
+    catcols = [column for column in (frames[0].columns if frames else []) if all(isinstance(df[column].dtype, pd.CategoricalDtype) for df in frames)]
+    if not catcols:
+        return pd.concat(frames, ignore_index=True)
+
+    def union(values):
+        # 沒有任何類別的欄位 (例如空的 DataFrame) 類別型別為 object，先改成與其他類別相同的型別才能合併
+        dtypes = [value.cat.categories.dtype for value in values if len(value.cat.categories)]
+        if dtypes:
+            values = [value if len(value.cat.categories) else value.cat.set_categories(pd.Index([], dtype=dtypes[0])) for value in values]
+        return union_categoricals(values, sort_categories=True)
+
+    categoricals = {column: union([df[column] for df in frames]) for column in catcols}
+    combineddf = pd.concat([df.drop(columns=catcols) for df in frames], ignore_index=True)
+    for column, values in categoricals.items():
+        combineddf[column] = values
+    return combineddf[frames[0].columns]
+
+def write_partitioned(df, root, partition_cols, schema=None, filename='part-0.parquet'):
+    """
+    將 df 依 partition_cols 切分，以 hive 格式的資料夾 (root/欄位=值/...) 存成 parquet
+
+    同一個第一層分區 (例如同一天) 會整個覆寫，重跑同一天不會殘留舊的子分區。
+    分區欄位不會寫進 parquet 檔，讀取時由資料夾名稱還原。
+
+    Parameters:
+        df (pd.DataFrame): 要儲存的資料
+        root (str): 資料表根目錄
+        partition_cols (list): 分區欄位，依序為資料夾層級
+        schema (dict, optional): 寫入前套用的欄位型別，見 apply_schema
+        filename (str): 每個分區內的檔名
+
+    Returns:
+        list: 寫出的 parquet 檔路徑
+    """
+    df = apply_schema(df, schema)
+    for value in df[partition_cols[0]].astype(str).unique():
+        folder = os.path.join(root, f"{partition_cols[0]}={value}")
+        if check_pathexist(folder):
+            delete_folders([folder])
+
+    paths = []
+    for keys, part in df.groupby(partition_cols, sort=True, observed=True):
+        folder = create_folder(os.path.join(root, *[f"{column}={key}" for column, key in zip(partition_cols, keys)]))
+        path = os.path.join(folder, filename)
+        part.drop(columns=partition_cols).to_parquet(path, index=False)
+        paths.append(path)
+    return paths
+
+def find_partitions(root, filters=None):
+    """
+    列出資料表中符合 filters 的 parquet 檔，不符合的分區資料夾整個略過不讀
+
+    Parameters:
+        root (str): 資料表根目錄
+        filters (dict, optional): {分區欄位: 允許的值(list) 或 判斷函數}，值一律以字串比較
+
+    Returns:
+        list: [(parquet 路徑, {分區欄位: 值}), ...]，依路徑排序
+    """
+    filters = filters or {}
+    found = []
+
+    def walk(folder, keys):
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if os.path.isdir(path) and '=' in name:
+                column, value = name.split('=', 1)
+                allowed = filters.get(column)
+                if allowed is not None:
+                    if callable(allowed):
+                        if not allowed(value):
+                            continue
+                    elif value not in {str(v) for v in allowed}:
+                        continue
+                walk(path, {**keys, column: value})
+            elif name.endswith('.parquet'):
+                found.append((path, keys))
+
+    if check_pathexist(root):
+        walk(root, {})
+    return found
+
+def read_partitioned(root, columns=None, filters=None, schema=None):
+    """
+    讀取 write_partitioned 寫出的資料表
+
+    Parameters:
+        root (str): 資料表根目錄
+        columns (list, optional): 只讀取的欄位 (可包含分區欄位)，None 表示全部
+        filters (dict, optional): 分區篩選條件，見 find_partitions
+        schema (dict, optional): 讀取後套用的欄位型別，分區欄位讀回時為字串
+
+    Returns:
+        pd.DataFrame: 合併後的資料，沒有符合的分區時回傳空的 DataFrame
+    """
+    dataframes = []
+    for path, keys in find_partitions(root, filters):
+        readcolumns = None if columns is None else [column for column in columns if column not in keys]
+        df = pd.read_parquet(path, columns=readcolumns)
+        for column, value in keys.items():
+            if columns is None or column in columns:
+                df[column] = value
+        dataframes.append(df if columns is None else df[columns])
+
+    if not dataframes:
+        return pd.DataFrame(columns=columns)
+    return apply_schema(concat_categorical(dataframes), schema)
+
+def partition_values(root, column):
+    """回傳資料表中某個分區欄位已存在的值 (例如已經入庫的日期)"""
+    return sorted({keys[column] for _, keys in find_partitions(root) if column in keys})
+
 # 3. 系統操作文件
 
-def updatelog(file, text):
-    """將 text 追加寫入指定的 log 檔案，並加上當前時間"""
+LOG_LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARN': 30, 'WARNING': 30, 'ERROR': 40}
+log_level = 'INFO'  # 低於此等級的訊息不寫入，以 set_loglevel 調整
+
+class LogWriter:
+    """
+    以背景執行緒寫入單一 log 檔：檔案只開啟一次，佇列中累積的訊息一次寫入並 flush，
+    多個執行緒同時呼叫 write 也不會交錯。
+    """
+    def __init__(self, file):
+        self.file = file
+        self.pid = os.getpid()
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, line):
+        self.queue.put(line)
+
+    def _run(self):
+        with open(self.file, 'a', encoding='utf-8') as f:
+            while True:
+                lines = [self.queue.get()]
+                while True:
+                    try:
+                        lines.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                f.writelines(line + '\n' for line in lines if line is not None)
+                f.flush()
+                for _ in lines:
+                    self.queue.task_done()
+                if None in lines:
+                    return
+
+    def flush(self):
+        """等待佇列中的訊息全部寫入"""
+        self.queue.join()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+_log_writers = {}
+_log_lock = threading.Lock()
+
+def get_logwriter(file):
+    """取得 file 的 LogWriter，子程序 (fork) 會建立自己的 LogWriter"""
+    path = os.path.abspath(file)
+    with _log_lock:
+        writer = _log_writers.get(path)
+        if writer is None or writer.pid != os.getpid():
+            writer = _log_writers[path] = LogWriter(path)
+    return writer
+
+def flushlog(file=None):
+    """等待 file (None 表示全部) 尚未寫入的訊息寫入檔案"""
+    with _log_lock:
+        writers = [w for path, w in _log_writers.items() if file is None or path == os.path.abspath(file)]
+    for writer in writers:
+        if writer.pid == os.getpid():
+            writer.flush()
+
+def closelog(file=None):
+    """寫入剩餘訊息並關閉 file (None 表示全部) 的 log 檔，之後再呼叫 updatelog 會重新開啟"""
+    with _log_lock:
+        paths = [path for path in _log_writers if file is None or path == os.path.abspath(file)]
+        writers = [_log_writers.pop(path) for path in paths]
+    for writer in writers:
+        if writer.pid == os.getpid():
+            writer.close()
+
+atexit.register(closelog)
+
+def set_loglevel(level='INFO'):
+    """設定寫入 log 的最低等級：DEBUG、INFO、WARN、ERROR"""
+    global log_level
+    log_level = level.upper()
+
+def updatelog(file, text, level=None, stage=None, elapsed=None):
+    """
+    將 text 追加寫入指定的 log 檔案，並加上當前時間
+
+    實際寫入由背景執行緒批次處理，不會每一行都開關檔案；程式結束時會自動寫完剩餘的訊息。
+    level 未指定時由 text 開頭的 INFO: / WARN: / ERROR: 判斷，低於 log_level 的訊息不寫入。
+    stage、elapsed (秒) 會以 [stage=...] [elapsed=...s] 附加在行尾。file 為 None 時改為 print。
+    """
+    prefix = text.split(':', 1)[0].strip().upper()
+    if level is None:
+        level = prefix if prefix in LOG_LEVELS else 'INFO'
+    elif prefix not in LOG_LEVELS:
+        text = f"{level.upper()}: {text}"
+    if LOG_LEVELS[level.upper()] < LOG_LEVELS[log_level]:
+        return
+
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')  # 取得當前時間
     log_entry = f"[{timestamp}] {text}"  # 格式化日誌內容
-    with open(file, 'a', encoding='utf-8') as f:
-        f.write(log_entry + '\n')
+    if stage is not None:
+        log_entry += f" [stage={stage}]"
+    if elapsed is not None:
+        log_entry += f" [elapsed={elapsed:.3f}s]"
+
+    if file is None:
+        print(log_entry)
+    else:
+        get_logwriter(file).write(log_entry)
+
+@contextmanager
+def logstage(file, stage, text=''):
+    """
+    記錄一個階段的耗時，成功時寫入 INFO，失敗時寫入 ERROR 並繼續拋出例外
+
+    Example:
+        with logstage(logfile, 'rollup', '2024年'):
+            ...
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        updatelog(file, f"ERROR: {text}{stage} 階段失敗, {e}", stage=stage, elapsed=time.perf_counter() - start)
+        raise
+    updatelog(file, f"INFO: {text}{stage} 階段完成", stage=stage, elapsed=time.perf_counter() - start)
 
 def is_expired(line, cutoff_date):
     """判斷該行的時間戳記是否超過 `cutoff_date`"""
@@ -685,36 +1441,440 @@ def is_expired(line, cutoff_date):
     except ValueError:
         return False  # 解析錯誤則保留該行
 
-def refreshlog(file, day=30):
-    """僅檢查第一行的時間戳記，若超過 `day` 天才執行清理"""
+def rotatelog(file, backups=3):
+    """將 file 改名為 file.1 (原本的 file.1 改為 file.2，依此類推)，超過 backups 份的最舊檔案會被覆蓋"""
+    closelog(file)
+    if not os.path.exists(file):
+        return
+    if backups <= 0:
+        os.remove(file)
+        return
+    for index in range(backups, 0, -1):
+        source = file if index == 1 else f"{file}.{index - 1}"
+        if os.path.exists(source):
+            os.replace(source, f"{file}.{index}")
+
+def refreshlog(file, day=30, max_bytes=None, backups=3):
+    """
+    檢查 log 檔是否需要輪替：第一行的時間戳記超過 `day` 天，或檔案大小超過 max_bytes 時，
+    以 rotatelog 將整個檔案改名保存，不再讀入並重寫整個檔案
+    """
+    flushlog(file)
     if not os.path.exists(file):
         return  # 檔案不存在，直接返回
 
-    cutoff_date = datetime.now() - timedelta(days=day)  # 計算過期時間
+    if max_bytes is not None and os.path.getsize(file) > max_bytes:
+        rotatelog(file, backups)
+        return
 
+    # 只讀第一行的時間戳記
     with open(file, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+        first_line = f.readline()
 
-    if not lines:
-        return  # 檔案為空，直接返回
+    if first_line.startswith('[') and is_expired(first_line, datetime.now() - timedelta(days=day)):
+        rotatelog(file, backups)
 
-    # 解析第一行的時間戳記
-    first_line = lines[0]
-    if first_line.startswith('['):  # 確保這行有時間戳記
-        try:
-            timestamp_str = first_line[1:20]  # 擷取 `[YYYY-MM-DD HH:MM:SS]`
-            first_log_time = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-            if first_log_time >= cutoff_date:
-                return  # 如果第一行時間還在範圍內，直接跳出
-        except ValueError:
-            pass  # 解析失敗就忽略，繼續清理
+def run_pipeline(items, stages, queue_size=2, logfile=None):
+    """
+    以多階段管線處理多個項目 (例如日期清單)：每個階段各用一個執行緒，階段之間以有上限的佇列串接，
+    使第 N+1 天下載時，第 N 天可同時解析、第 N-1 天同時輸出。
+
+    Args:
+        items (list): 要處理的項目，依序送入第一個階段。
+        stages (list): (階段名稱, 函數) 組成的清單，函數格式為 func(item, data)，回傳值交給下一個階段；第一個階段的 data 為 None。
+        queue_size (int): 階段之間佇列的上限，佇列滿時上游階段會暫停 (back-pressure)。
+        logfile (str, optional): 若有提供，失敗的項目會寫入 log。
+
+    Returns:
+        pd.DataFrame: 每個項目一列 (依 items 的順序，重複的項目各自一列)，包含 item、status (success/failed)、
+                      failed_stage、error 與各階段耗時 (秒)。
+    """
+    stop = object()
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages))] + [queue.Queue()]
+    summary = [{'item': item, 'status': 'success', 'failed_stage': None, 'error': None} for item in items]
+
+    def worker(index, name, func):
+        inbox, outbox = queues[index], queues[index + 1]
+        while True:
+            packet = inbox.get()
+            if packet is stop:
+                outbox.put(stop)
+                return
+            position, item, data, failed = packet
+            if not failed:
+                start = time.perf_counter()
+                try:
+                    data = func(item, data)
+                except BaseException as e:
+                    # 包含 SystemExit 等：執行緒結束而不往下傳遞時，主執行緒會一直等待最後的佇列
+                    failed = True
+                    data = None
+                    summary[position].update(status='failed', failed_stage=name, error=f"{type(e).__name__}: {e}")
+                elapsed = time.perf_counter() - start
+                summary[position][f'{name}_seconds'] = round(elapsed, 3)
+                if logfile:
+                    if failed:
+                        updatelog(file=logfile, text=f"ERROR: {item} 於 {name} 階段失敗, {summary[position]['error']}", stage=name, elapsed=elapsed)
+                    else:
+                        updatelog(file=logfile, text=f"DEBUG: {item} {name} 階段完成", stage=name, elapsed=elapsed)
+            outbox.put((position, item, data, failed))
+
+    threads = [threading.Thread(target=worker, args=(i, name, func), daemon=True) for i, (name, func) in enumerate(stages)]
+    for thread in threads:
+        thread.start()
+
+    for position, item in enumerate(items):
+        queues[0].put((position, item, None, False))  # 佇列滿時會在此等待
+    queues[0].put(stop)
+
+    while queues[-1].get() is not stop:
+        pass
+    for thread in threads:
+        thread.join()
+
+    return pd.DataFrame(summary)
+
+def file_sha256(path, chunk_size=1 << 20):
+    """計算檔案的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def write_atomic(path, data):
+    """先寫入 path.part 再改名為 path，中斷時不會留下寫到一半的檔案"""
+    partpath = path + '.part'
+    with open(partpath, 'wb') as f:
+        f.write(data)
+    os.replace(partpath, path)
+
+class DownloadManifest:
+    """
+    下載清單 (JSON)：記錄每個下載項目的狀態、檔案大小、SHA-256 與嘗試次數，讓中斷的大量下載可以只補抓缺少或損毀的項目。
+    狀態為 done (完成)、missing (伺服器回覆 404) 或 failed (其他錯誤)；多個執行緒可同時呼叫 record。
 
-    # 若第一行時間超過 `day` 天，則開始過濾所有行
-    new_lines = [line for line in lines if not (line.startswith('[') and is_expired(line, cutoff_date))]
+    Args:
+        path (str): 清單檔路徑，檔案中記錄的檔名皆相對於清單所在的資料夾。
+        save_interval (float): 最多每隔幾秒寫回一次清單，save() 或離開 with 區塊時一定寫回。
+    """
+    def __init__(self, path, save_interval=5):
+        self.path = path
+        self.folder = os.path.dirname(os.path.abspath(path))
+        self.save_interval = save_interval
+        self.lock = threading.Lock()
+        self.items = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.items = json.load(f)['items']
+            except (ValueError, KeyError, OSError):
+                self.items = {}  # 清單損毀時視同沒有紀錄，所有項目重新下載
+        self.last_save = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.save()
+
+    def is_done(self, name, verify=True):
+        """項目已完成且檔案仍與紀錄相符 (大小相同，verify=True 時再比對 SHA-256)"""
+        item = self.items.get(name)
+        if not item or item.get('status') != 'done':
+            return False
+        path = os.path.join(self.folder, item['file'])
+        if not os.path.exists(path) or os.path.getsize(path) != item['size']:
+            return False
+        return not verify or file_sha256(path) == item['sha256']
+
+    def pending(self, names, verify=True):
+        """回傳 names 中尚未完成、或檔案缺少/損毀而需要重新下載的項目"""
+        return [name for name in names if not self.is_done(name, verify=verify)]
+
+    def record(self, name, status, path=None, http_status=None, error=None):
+        """
+        記錄一次下載嘗試的結果。
+
+        Args:
+            name (str): 項目名稱 (例如 VDLive_0000.xml.gz)。
+            status (str): done / missing / failed。
+            path (str, optional): 完成時保存在磁碟上的檔案，會記錄其大小與 SHA-256。
+            http_status (int, optional): HTTP 狀態碼。
+            error (str, optional): 錯誤訊息。
+        """
+        fileinfo = {}
+        if path is not None:
+            fileinfo = {'file': os.path.relpath(os.path.abspath(path), self.folder),
+                        'size': os.path.getsize(path), 'sha256': file_sha256(path)}
+        with self.lock:
+            item = self.items.setdefault(name, {'attempts': 0})
+            item['attempts'] += 1
+            item.update(status=status, http_status=http_status, error=error,
+                        updated=datetime.now().strftime('%Y-%m-%d %H:%M:%S'), **fileinfo)
+            if time.monotonic() - self.last_save >= self.save_interval:
+                self._save()
+
+    def summary(self):
+        """各狀態的項目數，例如 {'done': 1438, 'missing': 2}"""
+        with self.lock:
+            counts = {}
+            for item in self.items.values():
+                counts[item['status']] = counts.get(item['status'], 0) + 1
+        return counts
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+    def _save(self):
+        data = json.dumps({'items': self.items}, ensure_ascii=False, indent=1).encode('utf-8')
+        write_atomic(self.path, data)
+        self.last_save = time.monotonic()
+
+def current_rss():
+    """目前程序的常駐記憶體 (bytes)，無法取得時回傳 None"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
 
-    # 重新寫入檔案
-    with open(file, 'w', encoding='utf-8') as f:
-        f.writelines(new_lines)
+def process_io():
+    """目前程序累計讀取、寫入的位元組數 (含檔案與網路)，無法取得時回傳 (None, None)"""
+    try:
+        with open('/proc/self/io') as f:
+            counters = dict(line.split(':') for line in f.read().splitlines())
+        return int(counters['rchar']), int(counters['wchar'])
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        import psutil
+        counters = psutil.Process().io_counters()
+        return getattr(counters, 'read_chars', counters.read_bytes), getattr(counters, 'write_chars', counters.write_bytes)
+    except (ImportError, AttributeError, OSError):
+        return None, None
+
+class RSSSampler:
+    """
+    背景執行緒每 interval 秒取樣一次常駐記憶體，記錄相對於開始時增加的最大值 (含 pyarrow 等 tracemalloc 看不到的配置)。
+    sample_thread 指定執行緒 id 時，同時取樣該執行緒的呼叫堆疊 (簡易的取樣式 profiler)，結果見 top_functions。
+    """
+
+    def __init__(self, interval=0.005, sample_thread=None):
+        self.interval = interval
+        self.sample_thread = sample_thread
+        self.peak = None
+        self.samples = 0
+        self.selfcounts = {}
+        self.cumcounts = {}
+
+    def __enter__(self):
+        self.start = current_rss()
+        self.peak = self.start
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        if self.start is not None or self.sample_thread is not None:
+            self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            if self.start is not None:
+                self.peak = max(self.peak, current_rss())
+            if self.sample_thread is not None:
+                self._sample_stack()
+
+    def _sample_stack(self):
+        frame = sys._current_frames().get(self.sample_thread)
+        if frame is None:
+            return
+        self.samples += 1
+        seen = set()
+        innermost = True
+        while frame is not None:
+            code = frame.f_code
+            key = f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})"
+            if innermost:
+                self.selfcounts[key] = self.selfcounts.get(key, 0) + 1
+                innermost = False
+            if key not in seen:
+                self.cumcounts[key] = self.cumcounts.get(key, 0) + 1
+                seen.add(key)
+            frame = frame.f_back
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        if self.start is not None:
+            self.peak = max(self.peak, current_rss())
+        return False
+
+    @property
+    def increase_mb(self):
+        return None if self.start is None else round((self.peak - self.start) / 2**20, 2)
+
+    def top_functions(self, top=20):
+        """取樣次數最多的函數 (cumulative 為在堆疊中、self 為正在執行)，seconds 為依取樣間隔推估的時間"""
+        ranked = sorted(self.cumcounts.items(), key=lambda item: item[1], reverse=True)[:top]
+        return [{'function': key, 'cumulative_samples': count, 'self_samples': self.selfcounts.get(key, 0),
+                 'seconds': round(count * self.interval, 3)} for key, count in ranked]
+
+class RunReport:
+    """
+    記錄一次執行中各階段的耗時、資料列數、讀寫位元組數與記憶體峰值，輸出為 JSON 報告。
+
+    讀寫位元組數與常駐記憶體為整個程序的量，管線中同時執行的階段會互相計入；
+    profile 只涵蓋進入 stage 的執行緒，交給執行緒池或子程序的工作不在其中。
+
+    Args:
+        path (str, optional): 報告輸出路徑 (.json)。
+        profile (str, optional): 'cprofile' 以 cProfile 記錄每個階段 (另存 .prof 檔)，'sample' 以堆疊取樣記錄，None 不記錄。
+        stages (list, optional): 只對這些階段做 profile，None 表示全部。
+        top (int): 報告中列出的函數數量。
+        interval (float): 記憶體 (與堆疊) 取樣的間隔秒數。
+
+    Example:
+        report = RunReport('run.json', profile='sample')
+        with report.stage('parse', item='20250619', rows_in=len(files)) as record:
+            df = parse(files)
+            record['rows_out'] = len(df)
+        report.save()
+    """
+
+    def __init__(self, path=None, profile=None, stages=None, top=20, interval=0.05):
+        if profile not in (None, 'cprofile', 'sample'):
+            raise ValueError("profile 只能是 None、'cprofile' 或 'sample'")
+        self.path = path
+        self.profile = profile
+        self.stages = set(stages) if stages else None
+        self.top = top
+        self.interval = interval
+        self.started = datetime.now()
+        self.records = []
+        self.lock = threading.Lock()
+
+    def _record(self, stage, item):
+        """取得 (stage, item) 的紀錄，沒有時新增 (需持有 lock)"""
+        for record in self.records:
+            if record['stage'] == stage and record['item'] == item:
+                return record
+        record = {'stage': stage, 'item': item}
+        self.records.append(record)
+        return record
+
+    def add(self, stage, item=None, **values):
+        """累加數值到 (stage, item) 的紀錄，供執行緒池中分散執行的子步驟 (例如逐檔解壓縮) 使用"""
+        with self.lock:
+            record = self._record(stage, item)
+            for key, value in values.items():
+                if value is None:
+                    continue
+                if isinstance(value, (int, float)):
+                    value = record.get(key, 0) + value
+                    value = round(value, 4) if isinstance(value, float) else value
+                record[key] = value
+
+    @contextmanager
+    def stage(self, stage, item=None, rows_in=None):
+        """
+        測量一個階段，yield 的 dict 可由呼叫端補上 rows_out 等欄位；發生例外時記錄 error 並繼續拋出。
+        """
+        with self.lock:
+            record = self._record(stage, item)
+        if rows_in is not None:
+            record['rows_in'] = rows_in
+        profiling = self.profile is not None and (self.stages is None or stage in self.stages)
+        profiler = None
+        if profiling and self.profile == 'cprofile':
+            import cProfile
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:  # 已有其他 profiler 在執行 (Python 3.12 以後同時只能有一個)
+                profiler = None
+                record['profile'] = 'skipped'
+        sampler = RSSSampler(interval=self.interval, sample_thread=threading.get_ident() if profiling and self.profile == 'sample' else None)
+        readstart, writestart = process_io()
+        start = time.perf_counter()
+        try:
+            with sampler:
+                yield record
+        except Exception as e:
+            record['error'] = str(e)
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+            readend, writeend = process_io()
+            with self.lock:
+                record['seconds'] = round(record.get('seconds', 0) + seconds, 4)
+                if readstart is not None:
+                    record['bytes_read'] = record.get('bytes_read', 0) + readend - readstart
+                    record['bytes_written'] = record.get('bytes_written', 0) + writeend - writestart
+                if sampler.increase_mb is not None:
+                    record['rss_peak_mb'] = round(sampler.peak / 2**20, 2)
+                    record['rss_increase_mb'] = max(record.get('rss_increase_mb', 0), sampler.increase_mb)
+                if profiler is not None:
+                    record['profile'] = self._cprofile_summary(profiler, stage, item)
+                elif profiling and self.profile == 'sample':
+                    record['profile'] = sampler.top_functions(self.top)
+
+    def _cprofile_summary(self, profiler, stage, item):
+        """cProfile 結果依 cumulative 排序取前 top 個函數，並於報告旁另存 .prof 檔 (可用 snakeviz 等工具檢視)"""
+        import pstats
+        stats = pstats.Stats(profiler)
+        if self.path:
+            folder = create_folder(os.path.splitext(self.path)[0] + '_profile')
+            stats.dump_stats(os.path.join(folder, f"{item}_{stage}.prof" if item else f"{stage}.prof"))
+        stats.sort_stats('cumulative')
+        summary = []
+        for key in stats.fcn_list[:self.top]:
+            calls, _, selftime, cumtime, _ = stats.stats[key]
+            filename, line, function = key
+            summary.append({'function': f"{os.path.basename(filename)}:{line}({function})", 'calls': calls,
+                            'self_seconds': round(selftime, 4), 'cumulative_seconds': round(cumtime, 4)})
+        return summary
+
+    def to_frame(self):
+        """各階段紀錄 (不含 profile) 的 DataFrame"""
+        with self.lock:
+            records = [{key: value for key, value in record.items() if key != 'profile'} for record in self.records]
+        return pd.DataFrame(records)
+
+    def totals(self):
+        """依階段加總耗時、資料列數與讀寫位元組數，記憶體取最大值"""
+        df = self.to_frame()
+        if df.empty:
+            return {}
+        grouped = df.groupby('stage', sort=False)
+        sums = grouped[[column for column in ['seconds', 'rows_in', 'rows_out', 'bytes_read', 'bytes_written', 'files'] if column in df]].sum(min_count=1)
+        maxs = grouped[[column for column in ['rss_peak_mb', 'rss_increase_mb'] if column in df]].max()
+        totals = {}
+        for stage, row in pd.concat([sums, maxs], axis=1).iterrows():
+            values = {key: float(value) for key, value in row.items() if pd.notna(value)}
+            totals[stage] = {key: (int(value) if value.is_integer() and key not in ('seconds', 'rss_peak_mb', 'rss_increase_mb') else round(value, 4))
+                             for key, value in values.items()}
+        return totals
+
+    def save(self, path=None):
+        """寫出 JSON 報告 (started、finished、totals 與各階段紀錄)，回傳路徑"""
+        path = path or self.path
+        if path is None:
+            raise ValueError("沒有指定報告的輸出路徑")
+        with self.lock:
+            records = [dict(record) for record in self.records]
+        report = {'started': self.started.isoformat(timespec='seconds'), 'finished': datetime.now().isoformat(timespec='seconds'),
+                  'profile': self.profile, 'totals': self.totals(), 'stages': records}
+        write_atomic(path, json.dumps(report, ensure_ascii=False, indent=1, default=str).encode('utf-8'))
+        return path
 
 # 4. 鼎漢資料慣用處理
 
@@ -750,56 +1910,97 @@ def keepZH_tw(df, keepsuffixies='_Zh_tw', deletesuffixies='_En'):
     df.columns = [col.replace(keepsuffixies, '') if col.endswith(keepsuffixies) else col for col in df.columns]
     return df
 
-def get_VL1(df, Vcolumn, VLimitcolumn):
-    df['V/VL'] = df[Vcolumn] / df[VLimitcolumn]
+# 服務水準門檻表：breaks 由小到大，grades 依序對應 breaks 切出的各區間 (比 breaks 多一個)
+# right=False 為 [a, b) 左閉右開，right=True 為 (a, b] 左開右閉
+LOS_TABLES = {
+    'LOS_VL1': {'breaks': [0.2, 0.4, 0.6, 0.8, 0.9], 'grades': [6, 5, 4, 3, 2, 1], 'right': False},
+    'LOS_VL2': {'breaks': [0.2, 0.4, 0.5, 0.6, 0.8], 'grades': ['F', 'E', 'D', 'C', 'B', 'A'], 'right': False},
+    'LOS_V/C': {'breaks': [0.25, 0.50, 0.80, 0.90, 1.00], 'grades': ['A', 'B', 'C', 'D', 'E', 'F'], 'right': True},
+}
+
+def _los_codes(ratio, table):
+    """依門檻表把比值 (任意維度) 轉成等級代碼，比值為空值時代碼為 -1，回傳 (代碼, 等級類別)"""
+    if isinstance(table, str):
+        table = LOS_TABLES[table]
+    if len(table['grades']) != len(table['breaks']) + 1:
+        raise ValueError("grades 的數量必須比 breaks 多一個")
+    ratio = np.asarray(ratio, dtype=float)
+    categories = pd.Index(sorted(set(table['grades'])))
+    gradecodes = categories.get_indexer(table['grades'])
+    position = np.searchsorted(np.asarray(table['breaks'], dtype=float), ratio, side='left' if table['right'] else 'right')
+    codes = np.where(np.isnan(ratio), -1, gradecodes[np.minimum(position, len(gradecodes) - 1)])
+    return codes, categories
+
+def classify_los(ratio, table):
+    """
+    依門檻表將比值分級 (二分搜尋門檻，不需逐一建立各等級的條件)。
 
-    conditions = [
-        df['V/VL'] < 0.2,
-        (df['V/VL'] >= 0.2) & (df['V/VL'] < 0.4),
-        (df['V/VL'] >= 0.4) & (df['V/VL'] < 0.6),
-        (df['V/VL'] >= 0.6) & (df['V/VL'] < 0.8),
-        (df['V/VL'] >= 0.8) & (df['V/VL'] < 0.9),
-        df['V/VL'] >= 0.9
-    ]
+    Args:
+        ratio (array-like): 比值 (V/VL、V/C...)。
+        table (str or dict): LOS_TABLES 的名稱，或相同格式的門檻表。
 
-    values = [6, 5, 4, 3, 2, 1]
+    Returns:
+        pandas.Categorical: 服務水準等級，比值為空值時為空值。
+    """
+    codes, categories = _los_codes(np.ravel(ratio), table)
+    return pd.Categorical.from_codes(codes, categories=categories)
 
-    df['LOS_VL1'] = np.select(conditions, values, default=np.nan)  # 預設 NaN 避免錯誤
-    return df
+def get_LOS(df, Vcolumn, Ccolumn, tables, ratiocolumn):
+    """
+    計算 Vcolumn / Ccolumn 的比值，並一次依多個門檻表分級。不修改傳入的 df。
 
-def get_VL2(df, Vcolumn, VLimitcolumn):
-    df['V/VL'] = df[Vcolumn] / df[VLimitcolumn]
+    Args:
+        df (DataFrame): 輸入的資料框。
+        Vcolumn (str): 分子欄位 (速率或交通量)。
+        Ccolumn (str): 分母欄位 (速限或容量)。
+        tables (list): 門檻表名稱 (LOS_TABLES 的鍵)，分級結果的欄位名稱同門檻表名稱。
+        ratiocolumn (str): 比值的欄位名稱。
 
-    conditions = [
-        df['V/VL'] < 0.2,
-        (df['V/VL'] >= 0.2) & (df['V/VL'] < 0.4),
-        (df['V/VL'] >= 0.4) & (df['V/VL'] < 0.5),
-        (df['V/VL'] >= 0.5) & (df['V/VL'] < 0.6),
-        (df['V/VL'] >= 0.6) & (df['V/VL'] < 0.8),
-        df['V/VL'] >= 0.8
-    ]
+    Returns:
+        DataFrame: 新增比值與各等級 (category) 欄位的資料框。
+    """
+    ratio = df[Vcolumn] / df[Ccolumn]
+    grades = {table: pd.Series(classify_los(ratio, table), index=df.index) for table in tables}
+    return df.assign(**{ratiocolumn: ratio}, **grades)
 
-    values = ['F', 'E', 'D', 'C', 'B', 'A']
+def get_LOS_scenarios(volume, capacities, table='LOS_V/C'):
+    """
+    批次計算多個容量情境的服務水準。交通量不複製，以廣播一次計算 (n 筆 × k 個情境) 的 V/C 並分級。
 
-    df['LOS_VL2'] = np.select(conditions, values, default=None)  # 預設 NaN 避免錯誤
-    return df
+    Args:
+        volume (Series or array): 交通量 (n 筆)。
+        capacities (DataFrame or dict): 各情境的容量，欄位 (或鍵) 為情境名稱，值為純量或長度 n 的陣列
+                                        (例如依門架對應 ETC_M03A_202304_容量.xlsx 的容量再乘上不同倍率)。
+        table (str or dict): 門檻表，預設為 LOS_V/C。
 
-def get_LOS_VC(df, Vcolumn, Ccolumn):
-    df['V/C'] = df[Vcolumn] / df[Ccolumn]
+    Returns:
+        DataFrame: 每個情境一欄服務水準 (category)，index 同 volume。
+    """
+    index = volume.index if isinstance(volume, pd.Series) else None
+    volume = np.asarray(volume, dtype=float)
+    if isinstance(capacities, pd.DataFrame):
+        names = list(capacities.columns)
+        capacity = capacities.to_numpy(dtype=float)
+    else:
+        names = list(capacities)
+        capacity = np.column_stack([np.broadcast_to(np.asarray(capacities[name], dtype=float), volume.shape) for name in names]) if names else np.empty((len(volume), 0))
 
-    conditions = [
-        df['V/C'] <= 0.25,
-        (df['V/C'] > 0.25) & (df['V/C'] <= 0.50),
-        (df['V/C'] > 0.50) & (df['V/C'] <= 0.80),
-        (df['V/C'] > 0.80) & (df['V/C'] <= 0.90),
-        (df['V/C'] > 0.90) & (df['V/C'] <= 1.00),
-        df['V/C'] > 1.00
-    ]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = volume[:, None] / capacity
+    codes, categories = _los_codes(ratio, table)
+    return pd.DataFrame({name: pd.Categorical.from_codes(codes[:, i], categories=categories) for i, name in enumerate(names)}, index=index)
 
-    values = ['A', 'B', 'C', 'D', 'E', 'F']
+def get_VL1(df, Vcolumn, VLimitcolumn):
+    """速率與速限比 (V/VL) 的服務水準 (6~1)"""
+    return get_LOS(df, Vcolumn, VLimitcolumn, tables=['LOS_VL1'], ratiocolumn='V/VL')
 
-    df['LOS_V/C'] = np.select(conditions, values, default=np.nan)  # 預設 NaN 避免錯誤
-    return df
+def get_VL2(df, Vcolumn, VLimitcolumn):
+    """速率與速限比 (V/VL) 的服務水準 (A~F)"""
+    return get_LOS(df, Vcolumn, VLimitcolumn, tables=['LOS_VL2'], ratiocolumn='V/VL')
+
+def get_LOS_VC(df, Vcolumn, Ccolumn):
+    """交通量與容量比 (V/C) 的服務水準 (A~F)"""
+    return get_LOS(df, Vcolumn, Ccolumn, tables=['LOS_V/C'], ratiocolumn='V/C')
 
 def matrixtable(df, from_columns, to_columns):
     """
@@ -0,0 +1,81 @@
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+CODEFOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '00_程式碼')
+if CODEFOLDER not in sys.path:
+    sys.path.insert(0, CODEFOLDER)
+
+
+def notebook_namespace(notebook, cell=0):
+    """執行 notebook 中只有 import 與函式定義的儲存格，回傳其中定義的名稱"""
+    with open(os.path.join(CODEFOLDER, notebook), encoding='utf-8') as f:
+        source = ''.join(json.load(f)['cells'][cell]['source'])
+    namespace = {}
+    exec(compile(source, notebook, 'exec'), namespace)
+    return namespace
+
+
+class VDServer:
+    """
+    本機的高公局歷史資料替身：以 http.server 提供 /{date}/VDLive_HHMM.xml.gz。
+
+    files 為 {路徑: 內容}，不在其中的路徑回覆 404；failures 為 {路徑: [狀態碼, ...]}，
+    該路徑的前幾次請求依序回覆這些狀態碼，之後才回覆檔案。每次請求的路徑依序記錄於 requests。
+    """
+    def __init__(self):
+        self.files = {}
+        self.failures = {}
+        self.requests = []
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.lstrip('/')
+                with server.lock:
+                    server.requests.append(path)
+                    queued = server.failures.get(path)
+                    status = queued.pop(0) if queued else None
+                if status is None:
+                    content = server.files.get(path)
+                    status = 200 if content is not None else 404
+                body = content if status == 200 else b''
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def requested(self, date):
+        """某一天被請求過的檔名 (含重試的重複請求)"""
+        with self.lock:
+            return [path.split('/', 1)[1] for path in self.requests if path.startswith(f"{date}/")]
+
+
+@pytest.fixture
+def vd_server():
+    server = VDServer()
+    server.thread.start()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
+
+
+@pytest.fixture
+def vd_logfile(tmp_path, monkeypatch):
+    """FreewayVD 的 log 寫入暫存資料夾"""
+    import FreewayVD
+    logfile = str(tmp_path / 'VD_logfile.txt')
+    monkeypatch.setattr(FreewayVD, 'logfile', logfile)
+    return logfile
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import notebook_namespace
+
+GROUP_COLS = ['檔案', '平假日', '方向']
+
+
+@pytest.fixture(scope='module')
+def aggregate_by_window():
+    return notebook_namespace('03_海線交通量資料處理.ipynb')['aggregate_by_window']
+
+
+def baseline_aggregate_by_window(df, window_size, starttimecolumn, endtimecolumn, group_cols=GROUP_COLS, sum_cols=['PCU'], drop=False):
+    """原本逐組、逐視窗建立 dict 的寫法"""
+    df_result = []
+    df[starttimecolumn] = pd.to_datetime(df[starttimecolumn].astype(str), format='%H:%M:%S', errors='coerce').dt.time
+    df[endtimecolumn] = pd.to_datetime(df[endtimecolumn].astype(str), format='%H:%M:%S', errors='coerce').dt.time
+    df = df.sort_values(group_cols + [starttimecolumn]).reset_index(drop=True)
+    for group_keys, group_df in df.groupby(group_cols):
+        group_df = group_df.reset_index(drop=True)
+        for i in range(len(group_df) - window_size + 1):
+            window = group_df.iloc[i:i + window_size]
+            agg_row = {col: key for col, key in zip(group_cols, group_keys)}
+            agg_row[starttimecolumn] = window.iloc[0][starttimecolumn].strftime('%H:%M:%S')
+            agg_row[endtimecolumn] = window.iloc[-1][endtimecolumn] if pd.notna(window.iloc[-1][endtimecolumn]) else None
+            for col in sum_cols:
+                agg_row[col] = window[col].sum()
+            df_result.append(agg_row)
+    df_result = pd.DataFrame(df_result)
+    if drop:
+        # 原本為預設的 quicksort，同值的順序不固定；這裡以穩定排序固定為最早的視窗
+        df_result = (df_result.sort_values(by=sum_cols, ascending=[False] * len(sum_cols), kind='stable')
+                     .drop_duplicates(subset=group_cols).sort_values(by=group_cols).reset_index(drop=True))
+    return df_result
+
+
+def counts(group, pcu, small=None, start='07:00'):
+    times = pd.date_range(f'2025-06-19 {start}', periods=len(pcu), freq='15min')
+    return pd.DataFrame({
+        '檔案': group[0], '平假日': group[1], '方向': group[2],
+        '起': times.strftime('%H:%M:%S'), '迄': (times + pd.Timedelta('15min')).strftime('%H:%M:%S'),
+        'PCU': pcu, '小型車PCU': small if small is not None else [1.0] * len(pcu),
+    })
+
+
+def traffic():
+    return pd.concat([
+        counts(('SL1-1', '平日', '往北'), [10.0, 20.0, 30.0, 40.0, 10.0, 20.0, 30.0, 40.0]),  # 多個視窗同為最大值
+        counts(('SL1-1', '平日', '往南'), [5.0, np.nan, 7.5, 1.25, 3.0, 0.1]),  # 加總欄位有空值
+        counts(('SL1-1', '假日', '往北'), [1.0, 2.0]),  # 資料少於一個視窗
+        counts((np.nan, '平日', '往北'), [100.0, 100.0, 100.0, 100.0, 100.0]),  # 分組欄位為空值，不計算
+        counts(('SL1-2', None, '往北'), [50.0, 50.0, 50.0, 50.0]),
+        counts(('SL1-2', '平日', '往北'), [9.0, 9.0, 9.0, 9.0, 9.0, 9.0], small=[1.0, 2.0, 3.0, 4.0, 5.0, 1.0]),
+    ]).sample(frac=1, random_state=0).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('drop', [False, True])
+@pytest.mark.parametrize('sum_cols', [['PCU'], ['PCU', '小型車PCU']])
+def test_matches_window_loop(aggregate_by_window, drop, sum_cols):
+    expected = baseline_aggregate_by_window(traffic(), 4, '起', '迄', sum_cols=sum_cols, drop=drop)
+    result = aggregate_by_window(traffic(), 4, '起', '迄', sum_cols=sum_cols, drop=drop)
+
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_nan_group_keys_are_skipped(aggregate_by_window):
+    result = aggregate_by_window(traffic(), 4, '起', '迄')
+
+    assert result['檔案'].notna().all() and result['平假日'].notna().all()
+    assert (result['PCU'] != 400.0).all() and (result['PCU'] != 200.0).all()
+    assert len(result[(result['檔案'] == 'SL1-1') & (result['平假日'] == '假日')]) == 0
+
+
+def test_drop_keeps_earliest_of_tied_peaks(aggregate_by_window):
+    result = aggregate_by_window(traffic(), 4, '起', '迄', drop=True).set_index(GROUP_COLS)
+
+    # 往北 07:00~08:00 與 08:00~09:00 之後的視窗加總都是 100，保留最早的視窗
+    assert result.loc[('SL1-1', '平日', '往北'), '起'] == '07:00:00'
+    assert result.loc[('SL1-1', '平日', '往北'), 'PCU'] == 100.0
+    assert result.loc[('SL1-2', '平日', '往北'), '起'] == '07:00:00'
+
+    # 第二個加總欄位用來決定同值的尖峰
+    result = aggregate_by_window(traffic(), 4, '起', '迄', sum_cols=['PCU', '小型車PCU'], drop=True).set_index(GROUP_COLS)
+    assert result.loc[('SL1-2', '平日', '往北'), '起'] == '07:15:00'
+    assert result.loc[('SL1-2', '平日', '往北'), '小型車PCU'] == 14.0
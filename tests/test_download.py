@@ -0,0 +1,119 @@
+import gzip
+import os
+
+import FreewayVD
+from ProcessBasic import DownloadManifest
+
+DATE = '20250619'
+NAMES = [f"VDLive_{hour:02d}{minute:02d}.xml.gz" for hour in range(24) for minute in range(60)]
+
+
+def vdlive_gz(minute):
+    xml = f'<?xml version="1.0" encoding="utf-8"?><VDLiveList><UpdateTime>2025-06-19T00:{minute:02d}:00+08:00</UpdateTime></VDLiveList>'
+    return gzip.compress(xml.encode('utf-8'))
+
+
+def test_fetch_retries_429_and_5xx_with_backoff(vd_server, monkeypatch):
+    path = f"{DATE}/VDLive_0000.xml.gz"
+    vd_server.files[path] = vdlive_gz(0)
+    vd_server.failures[path] = [429, 503, 500]
+    delays = []
+    monkeypatch.setattr(FreewayVD.time, 'sleep', delays.append)
+
+    with FreewayVD.create_session(1) as session:
+        response = FreewayVD.fetch_with_retry(session, f"{vd_server.url}/{path}", retries=3, backoff=0.5)
+
+    assert response.status_code == 200
+    assert response.content == vdlive_gz(0)
+    assert delays == [0.5, 1.0, 2.0]
+    assert vd_server.requested(DATE) == ['VDLive_0000.xml.gz'] * 4
+
+
+def test_fetch_returns_last_response_when_retries_run_out(vd_server, monkeypatch):
+    path = f"{DATE}/VDLive_0000.xml.gz"
+    vd_server.files[path] = vdlive_gz(0)
+    vd_server.failures[path] = [502, 502, 502]
+    delays = []
+    monkeypatch.setattr(FreewayVD.time, 'sleep', delays.append)
+
+    with FreewayVD.create_session(1) as session:
+        response = FreewayVD.fetch_with_retry(session, f"{vd_server.url}/{path}", retries=1, backoff=0.5)
+
+    assert response.status_code == 502
+    assert delays == [0.5]
+    assert len(vd_server.requested(DATE)) == 2
+
+
+def test_404_is_recorded_as_missing_without_retry(vd_server, vd_logfile, tmp_path, monkeypatch):
+    vd_server.files[f"{DATE}/VDLive_0000.xml.gz"] = vdlive_gz(0)
+    vd_server.failures[f"{DATE}/VDLive_0002.xml.gz"] = [503, 503, 503]
+    monkeypatch.setattr(FreewayVD.time, 'sleep', lambda seconds: None)
+    names = NAMES[:3]
+    tasks = [(f"{vd_server.url}/{DATE}/{name}", name) for name in names]
+    manifest = DownloadManifest(str(tmp_path / 'manifest.json'))
+
+    def save(name, response):
+        path = tmp_path / name
+        path.write_bytes(response.content)
+        manifest.record(name, 'done', path=str(path), http_status=response.status_code)
+        return str(path)
+
+    with manifest:
+        results = FreewayVD.download_files_concurrently(tasks, save, max_workers=2, retries=2, backoff=0.5, manifest=manifest)
+
+    assert results == {'VDLive_0000.xml.gz': str(tmp_path / 'VDLive_0000.xml.gz'), 'VDLive_0001.xml.gz': None, 'VDLive_0002.xml.gz': None}
+    assert manifest.items['VDLive_0000.xml.gz']['status'] == 'done'
+    assert manifest.items['VDLive_0001.xml.gz']['status'] == 'missing'
+    assert manifest.items['VDLive_0001.xml.gz']['http_status'] == 404
+    assert manifest.items['VDLive_0002.xml.gz']['status'] == 'failed'
+    assert manifest.items['VDLive_0002.xml.gz']['http_status'] == 503
+    assert manifest.summary() == {'done': 1, 'missing': 1, 'failed': 1}
+    requested = vd_server.requested(DATE)
+    assert requested.count('VDLive_0001.xml.gz') == 1
+    assert requested.count('VDLive_0002.xml.gz') == 3
+    assert DownloadManifest(str(tmp_path / 'manifest.json')).summary() == manifest.summary()
+
+
+def test_resume_fetches_only_pending_or_corrupt_files(vd_server, vd_logfile, tmp_path):
+    served = NAMES[:4]
+    for minute, name in enumerate(served):
+        vd_server.files[f"{DATE}/{name}"] = vdlive_gz(minute)
+    downloadfolder = str(tmp_path / 'rawdata')
+
+    folder = FreewayVD.download_and_extract_VD(vd_server.url, 'VD_live', DATE, downloadfolder, max_workers=4, backoff=0)
+    manifest = DownloadManifest(os.path.join(folder, 'manifest.json'))
+    assert manifest.summary() == {'done': 4, 'missing': len(NAMES) - 4}
+    assert len(vd_server.requested(DATE)) == len(NAMES)
+
+    # VDLive_0001 損毀、VDLive_0002 被刪除，VDLive_0000 與 VDLive_0003 維持完整
+    with open(os.path.join(folder, 'VDLive_0001.xml'), 'ab') as file:
+        file.write(b'corrupt')
+    os.remove(os.path.join(folder, 'VDLive_0002.xml'))
+    vd_server.requests.clear()
+
+    FreewayVD.download_and_extract_VD(vd_server.url, 'VD_live', DATE, downloadfolder, max_workers=4, backoff=0, resume=True)
+
+    requested = vd_server.requested(DATE)
+    assert sorted(requested) == sorted(set(NAMES) - {'VDLive_0000.xml.gz', 'VDLive_0003.xml.gz'})
+    manifest = DownloadManifest(os.path.join(folder, 'manifest.json'))
+    assert manifest.summary() == {'done': 4, 'missing': len(NAMES) - 4}
+    assert manifest.items['VDLive_0000.xml.gz']['attempts'] == 1
+    assert manifest.items['VDLive_0001.xml.gz']['attempts'] == 2
+    for minute, name in enumerate(served):
+        with open(os.path.join(folder, name[:-3]), 'rb') as file:
+            assert file.read() == gzip.decompress(vdlive_gz(minute))
+
+
+def test_resume_without_changes_requests_only_missing_files(vd_server, vd_logfile, tmp_path):
+    vd_server.files[f"{DATE}/VDLive_0000.xml.gz"] = vdlive_gz(0)
+    downloadfolder = str(tmp_path / 'rawdata')
+    FreewayVD.download_and_extract_VD(vd_server.url, 'VD_live', DATE, downloadfolder, max_workers=4, backoff=0)
+    vd_server.requests.clear()
+
+    # 伺服器補上原本 404 的檔案後接續下載
+    vd_server.files[f"{DATE}/VDLive_0001.xml.gz"] = vdlive_gz(1)
+    folder = FreewayVD.download_and_extract_VD(vd_server.url, 'VD_live', DATE, downloadfolder, max_workers=4, backoff=0, resume=True)
+
+    assert 'VDLive_0000.xml.gz' not in vd_server.requested(DATE)
+    assert len(vd_server.requested(DATE)) == len(NAMES) - 1
+    assert DownloadManifest(os.path.join(folder, 'manifest.json')).summary() == {'done': 2, 'missing': len(NAMES) - 2}
@@ -0,0 +1,54 @@
+import datetime
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+
+import ProcessBasic
+
+
+def output_frame():
+    return pd.DataFrame({
+        '日期': pd.to_datetime(['2025-06-21', '2025-06-22']),
+        '調查日': [datetime.date(2025, 6, 21), None],
+        '路段': ['台61線-後龍觀海大橋', None],
+        '聯結車': [32.0, np.nan],
+        '比值': [0.1 + 0.2, 1e15],
+        '流量': [1, 12345678901234567],
+        '假日': [True, False],
+        '時間長度': pd.to_timedelta(['1h', '26h']),
+    })
+
+
+def column_widths(path, count):
+    wb = openpyxl.load_workbook(path)
+    ws = wb.active
+    widths = [ws.column_dimensions[openpyxl.utils.get_column_letter(i)].width for i in range(1, count + 1)]
+    wb.close()
+    return widths
+
+
+def test_widths_match_reformat_excel(tmp_path):
+    df = output_frame()
+    path = str(tmp_path / 'reformat.xlsx')
+    df.to_excel(path, index=False)
+    ProcessBasic.reformat_excel(path)
+
+    expected = column_widths(path, len(df.columns))
+    assert ProcessBasic.excel_column_widths(df) == pytest.approx(expected)
+    # 日期欄寫成 YYYY-MM-DD HH:MM:SS，欄寬需容納 19 個字元
+    assert expected[0] == pytest.approx((19 + 2) * 1.3)
+
+
+def test_to_excel_formatted_date_columns_fit(tmp_path):
+    path = str(tmp_path / 'formatted.xlsx')
+    ProcessBasic.to_excel_formatted(output_frame(), path)
+
+    # xlsxwriter 會補上邊距並合併相同欄寬的欄，只確認日期欄 (A、B) 的寬度足以顯示日期時間
+    wb = openpyxl.load_workbook(path)
+    ws = wb.active
+    assert ws.column_dimensions['A'].width >= (19 + 2) * 1.3
+    assert (ws.column_dimensions['A'].min, ws.column_dimensions['A'].max) == (1, 2)
+    assert ws['A2'].value == datetime.datetime(2025, 6, 21)
+    wb.close()
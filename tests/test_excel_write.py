@@ -0,0 +1,162 @@
+import datetime
+import os
+import shutil
+import zipfile
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+from openpyxl.worksheet.formula import ArrayFormula
+
+import ProcessBasic
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '02_資料彙整', '道路服務水準_分析檔.xlsx')
+SHEET = '交通量資料'
+SHEETPATH = 'xl/worksheets/sheet3.xml'
+# 寫入後會改變的部分：工作表本身、重新計算設定、移除的計算鏈、新增的日期樣式
+CHANGED = {SHEETPATH, 'xl/workbook.xml', '[Content_Types].xml', 'xl/_rels/workbook.xml.rels', 'xl/styles.xml', 'xl/calcChain.xml'}
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = str(tmp_path / '道路服務水準_分析檔.xlsx')
+    shutil.copy(TEMPLATE, path)
+    return path
+
+
+@pytest.fixture
+def no_openpyxl_fallback(monkeypatch):
+    """確認走 xml 直接改寫，沒有改用 openpyxl"""
+    def fail(*args, **kwargs):
+        raise AssertionError("改用 openpyxl 寫入")
+    monkeypatch.setattr(ProcessBasic, 'load_workbook', fail)
+
+
+def traffic_frame():
+    return pd.DataFrame({
+        '調查計畫書點位編號': ['SL1-1', 'SL1-1', 'SL1-2'],
+        '日期': pd.to_datetime(['2025-06-21', '2025-06-21', '2025-06-22']),
+        '小時': [0, 1, 2],
+        '聯結車': [32.0, np.nan, 14.5],
+        '時段': [datetime.time(7, 30), datetime.time(8, 0), datetime.time(17, 45)],
+        '持續時間': pd.to_timedelta(['1h', '1h30min', '26h']),
+    })
+
+
+def zip_parts(path):
+    with zipfile.ZipFile(path) as zf:
+        return {name: zf.read(name) for name in zf.namelist()}
+
+
+def cell_value(cell):
+    if isinstance(cell.value, ArrayFormula):
+        return (cell.value.ref, cell.value.text)
+    return cell.value
+
+
+def sheet_values(path, sheet):
+    wb = openpyxl.load_workbook(path)
+    ws = wb[sheet]
+    values = [[(cell_value(cell), cell.number_format) for cell in row] for row in ws.iter_rows()]
+    merges = sorted(str(merged) for merged in ws.merged_cells.ranges)
+    wb.close()
+    return values, merges
+
+
+def test_clean_and_paste_keeps_other_parts(workbook, no_openpyxl_fallback):
+    before = zip_parts(workbook)
+    summary_before = sheet_values(workbook, '服務水準列表')
+
+    ProcessBasic.clean_and_paste(workbook, SHEET, traffic_frame(), 'A1')
+
+    after = zip_parts(workbook)
+    assert 'xl/calcChain.xml' not in after
+    for name in set(before) - CHANGED:
+        assert after[name] == before[name], name
+    # 公式 (含共用公式) 與合併儲存格不變
+    assert sheet_values(workbook, '服務水準列表') == summary_before
+    assert b'fullCalcOnLoad="1"' in after['xl/workbook.xml']
+
+
+def test_clean_and_paste_writes_header_blanks_and_dates(workbook, no_openpyxl_fallback):
+    df = traffic_frame()
+    ProcessBasic.clean_and_paste(workbook, SHEET, df, 'A1')
+
+    wb = openpyxl.load_workbook(workbook)
+    ws = wb[SHEET]
+    rows = [list(row) for row in ws.iter_rows(values_only=True)]
+    assert ws.max_row == len(df) + 1
+    assert rows[0] == list(df.columns)
+    assert rows[1][:4] == ['SL1-1', datetime.datetime(2025, 6, 21), 0, 32]
+    assert rows[2][3] is None  # NaN 寫成空白儲存格
+    assert rows[3][1] == datetime.datetime(2025, 6, 22)
+    assert [row[4] for row in rows[1:]] == list(df['時段'])
+    assert [row[5] for row in rows[1:]] == list(df['持續時間'])
+    assert ws['B2'].is_date and ws['E2'].is_date and ws['F2'].is_date
+    wb.close()
+    with zipfile.ZipFile(workbook) as zf:
+        assert b'r="D3"' not in zf.read(SHEETPATH)
+
+
+def test_dates_match_openpyxl(workbook, tmp_path, monkeypatch):
+    rows = ProcessBasic.dataframe_rows(traffic_frame(), title=True)
+    # 17 位有效數字的浮點數與超過 float 精度的整數必須完整還原
+    numbers = [[0.1 + 0.2, 1 / 3, 2.5e-310, 1e20, 12345678901234567, 2 ** 53 + 1]]
+    expected = str(tmp_path / 'openpyxl.xlsx')
+    shutil.copy(workbook, expected)
+
+    ProcessBasic.bulk_write_excel(workbook, SHEET, rows + numbers, 'B3', clear=True)
+    monkeypatch.setattr(ProcessBasic, 'lxml_etree', None)
+    ProcessBasic.bulk_write_excel(expected, SHEET, rows, 'B3', clear=True)
+
+    values, merges = sheet_values(workbook, SHEET)
+    assert (values[:-1], merges) == sheet_values(expected, SHEET)
+    written = [value for value, _ in values[-1][1:]]
+    assert written == numbers[0]
+    assert [type(value) for value in written] == [type(value) for value in numbers[0]]
+
+
+def test_dimension_covers_rows_written_past_existing_data(workbook, no_openpyxl_fallback):
+    rows = [['新增', i] for i in range(3000)]
+    ProcessBasic.bulk_write_excel(workbook, SHEET, rows, 'A2000')
+
+    wb = openpyxl.load_workbook(workbook, read_only=True)
+    ws = wb[SHEET]
+    assert ws.max_row == 2000 + len(rows) - 1
+    assert sum(1 for _ in ws.iter_rows()) == 2000 + len(rows) - 1
+    wb.close()
+
+
+def test_existing_rows_are_merged(workbook, no_openpyxl_fallback):
+    wb = openpyxl.load_workbook(workbook)
+    ws = wb[SHEET]
+    before = [[(cell.value, cell.style_id) for cell in row] for row in ws.iter_rows(min_row=1, max_row=4)]
+    wb.close()
+    with zipfile.ZipFile(workbook) as zf:
+        styles = zf.read('xl/styles.xml')
+
+    ProcessBasic.bulk_write_excel(workbook, SHEET, [[datetime.datetime(2025, 7, 1), '日', '假日', 5], [None, '一', '平日', 6]], 'E2')
+
+    wb = openpyxl.load_workbook(workbook)
+    ws = wb[SHEET]
+    after = [[(cell.value, cell.style_id) for cell in row] for row in ws.iter_rows(min_row=1, max_row=4)]
+    assert ws.max_row == 2113
+    wb.close()
+    # 只有寫入範圍內的值改變，格式與其他儲存格不變
+    assert after[0] == before[0]
+    assert after[3] == before[3]
+    assert [value for value, _ in after[1][4:8]] == [datetime.datetime(2025, 7, 1), '日', '假日', 5]
+    assert [value for value, _ in after[2][4:8]] == [None, '一', '平日', 6]
+    for row in (1, 2):
+        assert [style for _, style in after[row]] == [style for _, style in before[row]]
+        assert after[row][:4] == before[row][:4] and after[row][8:] == before[row][8:]
+    # 原本已是日期格式，不需要新增樣式
+    with zipfile.ZipFile(workbook) as zf:
+        assert zf.read('xl/styles.xml') == styles
+
+
+def test_timezone_aware_dates_fall_back_to_openpyxl(workbook):
+    rows = [[pd.Timestamp('2025-06-21', tz='Asia/Taipei')]]
+    with pytest.raises(TypeError):
+        ProcessBasic.bulk_write_excel(workbook, SHEET, rows, 'A1', clear=True)
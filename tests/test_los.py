@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+import ProcessBasic
+
+BREAKS = [0.2, 0.25, 0.4, 0.5, 0.6, 0.8, 0.9, 1.0]
+
+
+def baseline_grade(ratio, table):
+    """原本 get_VL1 / get_VL2 / get_LOS_VC 逐一建立條件的分級 (空值不符合任何條件)"""
+    r = pd.Series(ratio)
+    if table == 'LOS_VL1':
+        breaks, values = [0.2, 0.4, 0.6, 0.8, 0.9], [6, 5, 4, 3, 2, 1]
+    elif table == 'LOS_VL2':
+        breaks, values = [0.2, 0.4, 0.5, 0.6, 0.8], ['F', 'E', 'D', 'C', 'B', 'A']
+    else:
+        conditions = [r <= 0.25, (r > 0.25) & (r <= 0.50), (r > 0.50) & (r <= 0.80),
+                      (r > 0.80) & (r <= 0.90), (r > 0.90) & (r <= 1.00), r > 1.00]
+        return list(np.select(conditions, ['A', 'B', 'C', 'D', 'E', 'F'], default=None))
+    conditions = [r < breaks[0]] + [(r >= low) & (r < high) for low, high in zip(breaks, breaks[1:])] + [r >= breaks[-1]]
+    return list(np.select(conditions, values, default=None))
+
+
+def ratios():
+    """每個門檻值與其前後最接近的浮點數，加上 0、負值、空值與正負無限大"""
+    values = [0.0, -0.1, 0.1, 0.3, 0.7, 0.95, 1.5, np.nan, np.inf, -np.inf]
+    for value in BREAKS:
+        values += [np.nextafter(value, -np.inf), value, np.nextafter(value, np.inf)]
+    return np.array(values)
+
+
+def test_classify_los_matches_baseline_conditions():
+    ratio = ratios()
+    for table in ['LOS_VL1', 'LOS_VL2', 'LOS_V/C']:
+        result = [None if pd.isna(grade) else grade for grade in ProcessBasic.classify_los(ratio, table)]
+        assert result == baseline_grade(ratio, table), table
+
+
+def test_boundary_grades():
+    ratio = np.array([0.2, 0.25, 1.0, np.nan, np.inf])
+    assert list(ProcessBasic.classify_los(ratio, 'LOS_VL1'))[:3] == [5, 5, 1]
+    assert list(ProcessBasic.classify_los(ratio, 'LOS_VL2'))[:3] == ['E', 'E', 'A']
+    grades = ProcessBasic.classify_los(ratio, 'LOS_V/C')
+    assert list(grades[[0, 1, 2, 4]]) == ['A', 'A', 'E', 'F']
+    assert pd.isna(grades[3])
+
+
+def test_get_LOS_with_zero_capacity_and_missing_values():
+    df = pd.DataFrame({'交通量': [0.0, 500.0, 500.0, np.nan, 1000.0], '容量': [0.0, 0.0, 2000.0, 2000.0, 1000.0]})
+
+    result = ProcessBasic.get_LOS_VC(df, '交通量', '容量')
+
+    assert 'V/C' not in df.columns  # 不修改傳入的資料
+    assert result['V/C'].iloc[1] == np.inf
+    assert [None if pd.isna(grade) else grade for grade in result['LOS_V/C']] == [None, 'F', 'A', None, 'E']
+    assert [None if pd.isna(grade) else grade for grade in result['LOS_V/C']] == baseline_grade(result['V/C'], 'LOS_V/C')
+
+
+def test_scenarios_match_single_classification():
+    volume = pd.Series([0.0, 450.0, 1000.0, np.nan, 1800.0], index=list('abcde'))
+    capacity = np.array([2000.0, 1800.0, 1000.0, 2000.0, 0.0])
+    scenarios = {'現況': capacity, '增加一成': capacity * 1.1, '固定容量': 1800.0}
+
+    result = ProcessBasic.get_LOS_scenarios(volume, scenarios)
+
+    assert list(result.index) == list(volume.index)
+    for name, cap in scenarios.items():
+        with np.errstate(divide='ignore', invalid='ignore'):
+            expected = ProcessBasic.classify_los(volume.to_numpy() / cap, 'LOS_V/C')
+        assert list(result[name].astype(object).where(result[name].notna(), None)) == [None if pd.isna(g) else g for g in expected]
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+import FreewayVD
+
+
+def hourly_volume(seed=0, vds=20, days=3):
+    rng = np.random.default_rng(seed)
+    rows = [(f'VD-N1-N-{i}.000-M-LOOP', f'2025/06/{day:02d}', f'{hour:02d}') for i in range(vds) for day in range(1, days + 1) for hour in range(24)]
+    df = pd.DataFrame(rows, columns=['設備代碼', '日期', '小時']).sample(frac=1, random_state=seed).reset_index(drop=True)
+    df['車道方向'] = 'N'
+    for column in ['小型車', '聯結車', '大型車']:
+        df[column] = rng.integers(0, 800, len(df)).astype('float64')
+    df['小型車分時PCU'] = df['小型車'] * 1.0
+    df['聯結車分時PCU'] = df['聯結車'] * 1.4
+    df['大型車分時PCU'] = df['大型車'] * 1.4
+    return df
+
+
+def test_daily_sums_match_groupby_sum_exactly(tmp_path, monkeypatch):
+    monkeypatch.setattr(FreewayVD, 'logfile', str(tmp_path / 'log.txt'))
+    df = hourly_volume()
+    result = FreewayVD.calculate_peak_hour(df.copy())
+
+    expected = df.groupby(['設備代碼', '日期'])[['小型車', '聯結車', '大型車', '小型車分時PCU', '聯結車分時PCU', '大型車分時PCU']].sum()
+    expected['合計'] = (df['小型車分時PCU'] + df['大型車分時PCU'] + df['聯結車分時PCU']).groupby([df['設備代碼'], df['日期']]).sum()
+    result = result.set_index(['設備代碼', '日期']).loc[expected.index]
+    assert (result['小型車全日PCU'].to_numpy() == expected['小型車分時PCU'].to_numpy()).all()
+    assert (result['聯結車全日PCU'].to_numpy() == expected['聯結車分時PCU'].to_numpy()).all()
+    assert (result['大型車全日PCU'].to_numpy() == expected['大型車分時PCU'].to_numpy()).all()
+    assert (result['合計全日PCU'].to_numpy() == expected['合計'].to_numpy()).all()
+    assert (result['小型車'].to_numpy() == expected['小型車'].to_numpy()).all()
+
+
+def test_peak_hour_takes_earliest_of_tied_hours(tmp_path, monkeypatch):
+    monkeypatch.setattr(FreewayVD, 'logfile', str(tmp_path / 'log.txt'))
+    df = pd.DataFrame({
+        '設備代碼': ['VD-N1-N-1.000-M-LOOP'] * 3, '日期': ['2025/06/19'] * 3, '小時': ['09', '07', '08'], '車道方向': ['N'] * 3,
+        '小型車': [10.0, 10.0, 5.0], '聯結車': [0.0, 0.0, 0.0], '大型車': [5.0, 5.0, 0.0],
+    })
+    df['小型車分時PCU'] = df['小型車'] * 1.0
+    df['聯結車分時PCU'] = df['聯結車'] * 1.4
+    df['大型車分時PCU'] = df['大型車'] * 1.4
+
+    result = FreewayVD.calculate_peak_hour(df)
+
+    assert len(result) == 1
+    assert result.loc[0, '尖峰時段'] == '07'
+    assert result.loc[0, '尖峰小時PCU'] == 10.0 + 5 * 1.4
+    assert result.loc[0, '合計全日PCU'] == (df['小型車分時PCU'] + df['大型車分時PCU'] + df['聯結車分時PCU']).sum()
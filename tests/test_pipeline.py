@@ -0,0 +1,48 @@
+import sys
+import threading
+
+from ProcessBasic import run_pipeline
+
+
+def run_with_timeout(items, stages, timeout=10):
+    """在另一個執行緒執行 run_pipeline，逾時未結束表示管線卡住"""
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(summary=run_pipeline(items, stages)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "run_pipeline 沒有結束"
+    return result['summary']
+
+
+def test_stage_calling_sys_exit_fails_item_without_hanging():
+    processed = []
+
+    def parse(item, data):
+        if item == '20250620':
+            sys.exit(1)
+        return item
+
+    stages = [('download', lambda item, data: item), ('parse', parse), ('save', lambda item, data: processed.append(data))]
+    summary = run_with_timeout(['20250619', '20250620', '20250621'], stages)
+
+    assert processed == ['20250619', '20250621']
+    assert list(summary['status']) == ['success', 'failed', 'success']
+    assert summary.loc[1, 'failed_stage'] == 'parse'
+    assert summary.loc[1, 'error'].startswith('SystemExit')
+
+
+def test_duplicate_items_keep_one_row_each():
+    calls = []
+
+    def download(item, data):
+        calls.append(item)
+        if len(calls) == 2:
+            raise ValueError('連線中斷')
+        return item
+
+    summary = run_with_timeout(['20250619', '20250619', '20250620'], [('download', download)])
+
+    assert list(summary['item']) == ['20250619', '20250619', '20250620']
+    assert list(summary['status']) == ['success', 'failed', 'success']
+    assert summary.loc[1, 'error'] == 'ValueError: 連線中斷'
+    assert summary['download_seconds'].notna().all()
@@ -0,0 +1,107 @@
+import pandas as pd
+
+import FreewayTDCS
+
+M06A_COLUMNS = FreewayTDCS.TDCS_COLUMNS['M06A']
+
+# 旅次經過的門架，(車種, [(時間, 門架), ...])
+TRIPS = [
+    (31, [('2025-06-19 07:58:10', '01F0005N'), ('2025-06-19 08:03:40', '01F0017N'), ('2025-06-19 08:09:00', '01F0029N')]),
+    (31, [('2025-06-19 07:59:50', '01F0005N'), ('2025-06-19 08:05:12', '01F0017N')]),
+    (32, [('2025-06-19 08:01:00', '01F0017N'), ('2025-06-19 08:07:30', '01F0029N')]),
+    (31, [('2025-06-19 08:20:00', '01F0017N')]),
+    (41, [('2025-06-19 08:40:00', '01F0029N'), ('2025-06-19 08:46:00', '01F0017N'), ('2025-06-19 08:52:00', '01F0029N')]),
+    (31, [('2025-06-19 23:58:30', '01F0005N'), ('2025-06-20 00:04:00', '01F0017N')]),
+    (5, [('2025-06-19 09:10:00', '03F0010S'), ('2025-06-19 09:15:00', '03F0020S')]),
+]
+
+RAMP = pd.DataFrame({
+    '匝道': ['入口A', '出口B', '未知門架', '未知排除門架', '無排除門架'],
+    '方向': ['N', 'N', 'N', 'S', 'N'],
+    'PassGantryID': ['01F0017N', '01F0029N', '01F9999N', '03F0010S', '01F0005N'],
+    # 入口A 的 UnpassGantryID 有旅次經過；未知排除門架不在任何旅次中
+    'UnpassGantryID': ['01F0005N', '01F0005N', '01F0005N', '03F9999S', None],
+})
+
+
+def m06a_frame(trips):
+    rows = []
+    for vehicletype, passages in trips:
+        rows.append({
+            'VehicleType': vehicletype, 'DetectionTimeO': passages[0][0], 'GantryO': passages[0][1],
+            'DetectionTimeD': passages[-1][0], 'GantryD': passages[-1][1], 'TripLength': 1.0, 'TripEnd': 'Y',
+            'TripInformation': '; '.join(f'{time}+{gantry}' for time, gantry in passages),
+        })
+    return pd.DataFrame(rows, columns=M06A_COLUMNS)
+
+
+def baseline_counts(df, ramp):
+    """原本 THI_M06A_step1 / step2 的逐條規則掃描"""
+    df = df.reset_index()
+    df['TripInformation'] = df['TripInformation'].str.split('; ')
+    df = df.explode('TripInformation').reset_index(drop=True)
+    df[['DetectionTime', 'GantryID']] = df['TripInformation'].str.split('+', expand=True)
+    df['DetectionTime'] = pd.to_datetime(df['DetectionTime'])
+    df['DetectionDate'] = df['DetectionTime'].dt.date
+    df['DetectionHour'] = df['DetectionTime'].dt.hour
+    df = df.reindex(columns=['index', 'VehicleType', 'DetectionDate', 'DetectionHour', 'GantryID'])
+    df = df.merge(df.groupby('index')['GantryID'].apply(list).reset_index(), on='index', suffixes=('', '_list'))
+
+    results = []
+    for _, row in ramp.iterrows():
+        ramp_name, direction, pass_id, unpass_id = row
+        matched = df[df['GantryID_list'].apply(lambda x: pass_id in x and unpass_id not in x)]
+        matched = matched[matched['GantryID'] == pass_id]
+        summary = matched.groupby(['DetectionDate', 'DetectionHour', 'VehicleType'])['index'].nunique().reset_index(name='Count')
+        summary['Ramp'] = ramp_name
+        summary['Direction'] = direction
+        summary['PassGantryID'] = pass_id
+        summary['UnpassGantryID'] = unpass_id
+        results.append(summary)
+    return pd.concat(results, ignore_index=True)
+
+
+def normalize(df):
+    df = df.reset_index(drop=True).astype({'DetectionHour': 'int64', 'VehicleType': 'int64', 'Count': 'int64'})
+    return df.astype({column: object for column in ['Ramp', 'Direction', 'PassGantryID', 'UnpassGantryID']})
+
+
+def test_count_ramp_trips_matches_rule_by_rule_scan():
+    df = m06a_frame(TRIPS)
+    expected = baseline_counts(df, RAMP)
+
+    result = FreewayTDCS.count_ramp_trips(FreewayTDCS.explode_trips(df), RAMP)
+
+    pd.testing.assert_frame_equal(normalize(result), normalize(expected))
+    # 入口A：經過 01F0005N 的兩個旅次 (與跨日旅次) 被排除，只剩三個旅次
+    assert result.loc[result['Ramp'] == '入口A', 'Count'].sum() == 3
+    assert (result['Ramp'] != '未知門架').all()
+    assert result.loc[result['Ramp'] == '未知排除門架', 'Count'].sum() == 1
+
+
+def test_count_ramp_trips_by_shard_matches_whole_day(tmp_path):
+    df = m06a_frame(TRIPS)
+    folder = tmp_path / 'M06A'
+    folder.mkdir()
+    shards = [df.iloc[:3], df.iloc[3:5], df.iloc[6:], df.iloc[5:6]]
+    for hour, shard in enumerate(shards):
+        shard.to_csv(folder / f'TDCS_M06A_20250619_{hour:02d}0000.csv', header=False, index=False)
+    # 沒有資料的小時檔，以及沒有任何旅次經過規則門架的小時檔 (df.iloc[6:])
+    (folder / 'TDCS_M06A_20250619_230000.csv').write_text('')
+
+    result = FreewayTDCS.count_ramp_trips_by_shard(str(folder), RAMP)
+
+    expected = baseline_counts(df, RAMP)
+    pd.testing.assert_frame_equal(normalize(result), normalize(expected))
+
+
+def test_empty_input_returns_empty_counts(tmp_path):
+    folder = tmp_path / 'M06A'
+    folder.mkdir()
+    (folder / 'TDCS_M06A_20250619_000000.csv').write_text('')
+
+    result = FreewayTDCS.count_ramp_trips_by_shard(str(folder), RAMP)
+    direct = FreewayTDCS.count_ramp_trips(FreewayTDCS.explode_trips(m06a_frame([])), RAMP)
+
+    assert len(result) == 0 and len(direct) == 0
+    assert list(result.columns) == list(direct.columns)
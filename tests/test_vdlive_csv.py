@@ -0,0 +1,39 @@
+import io
+
+import pandas as pd
+
+import FreewayVD
+
+NS = 'http://traffic.transportdata.tw/standard/traffic/schema/'
+
+
+def lane(laneid, speed, occupancy, vehicles):
+    speed = f'<Speed>{speed}</Speed>' if speed is not None else ''
+    vehicles = ''.join(f'<Vehicle><VehicleType>{vtype}</VehicleType><Volume>{volume}</Volume><Speed>{vspeed}</Speed></Vehicle>'
+                       for vtype, volume, vspeed in vehicles)
+    return f'<Lane><LaneID>{laneid}</LaneID><LaneType>1</LaneType>{speed}<Occupancy>{occupancy}</Occupancy><Vehicles>{vehicles}</Vehicles></Lane>'
+
+
+def vdlive_xml():
+    vds = [
+        ('VD-N1-N-86.120-M-LOOP', '0', [lane(0, 109, 7, [('S', 12, 109), ('L', 0, 0), ('T', 1, 95)])]),
+        ('VD-N1-S-86.120-M-LOOP', '1', [lane(0, -99, -99, [('S', -99, -99)]), lane(1, None, 0, [('S', 3, 87)])]),
+    ]
+    body = ''.join(
+        f'<VDLive><VDID>{vdid}</VDID><LinkFlows><LinkFlow><LinkID>0000100086120A</LinkID><Lanes>{"".join(lanes)}</Lanes></LinkFlow></LinkFlows>'
+        f'<Status>{status}</Status><DataCollectTime>2025-06-19T07:59:00+08:00</DataCollectTime></VDLive>'
+        for vdid, status, lanes in vds)
+    return (f'<?xml version="1.0" encoding="utf-8"?><VDLiveList xmlns="{NS}"><UpdateTime>2025-06-19T08:00:00+08:00</UpdateTime>'
+            f'<UpdateInterval>60</UpdateInterval><AuthorityCode>NFB</AuthorityCode><VDLives>{body}</VDLives></VDLiveList>').encode('utf-8')
+
+
+def test_merge_csv_keeps_the_raw_text_format():
+    xml = vdlive_xml()
+    # 精簡型別之前的 csv：每個欄位都是 XML 中的原始字串
+    raw = pd.DataFrame(next(FreewayVD.iter_vdlive_batches(io.BytesIO(xml))))[FreewayVD.VDLIVE_COLUMNS]
+
+    df = FreewayVD.parse_vdlive_xml(io.BytesIO(xml))
+    assert df['Speed'].dtype == 'float32'
+
+    assert FreewayVD.vdlive_csv_frame(df).to_csv(index=False) == raw.to_csv(index=False)
+    assert df['Speed'].dtype == 'float32'  # 不修改傳入的資料